@@ -0,0 +1,62 @@
+"""Import-time benchmark for the CLI and the core rating modules.
+
+Run with `python benchmarks/bench_import.py`. Exits non-zero when a core
+module pulls in a heavy dependency or the median import time exceeds
+--max-seconds.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+CORE_MODULES = ["shipping.common", "shipping.usps", "shipping.ups", "shipping.main"]
+HEAVY_MODULES = ["pandas", "numpy", "PIL", "bs4", "tqdm"]
+
+
+def time_import(module: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def heavy_imports(module: str) -> list[str]:
+    code = (
+        f"import sys, json, {module}; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    interpreter = time_import("sys", args.repeat)
+    results = {"interpreter": round(interpreter, 4), "modules": {}}
+    failed = False
+    for module in CORE_MODULES:
+        seconds = time_import(module, args.repeat)
+        heavy = heavy_imports(module)
+        results["modules"][module] = {
+            "seconds": round(seconds, 4),
+            "over_interpreter": round(seconds - interpreter, 4),
+            "heavy_imports": heavy,
+        }
+        failed |= bool(heavy) or seconds > args.max_seconds
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Memory used by many rate requests and rates in each representation.
+
+Run with `python benchmarks/bench_memory.py [--count N]`. Compares plain
+dataclasses (the previous shipping.common), the slotted shipping.common
+classes and the columnar RequestBatch/RateTable containers.
+"""
+
+import argparse
+import datetime as dt
+import json
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+from shipping import common
+from shipping.columnar import RateTable, RequestBatch
+
+
+@dataclass
+class Location:
+    street: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    zip_code: str = ""
+    country: Optional[str] = None
+
+
+@dataclass
+class Weight:
+    pounds: int
+    ounces: int
+
+
+@dataclass
+class Dimensions:
+    length: int
+    width: int
+    height: int
+
+
+@dataclass
+class RateRequest:
+    origination: Location
+    destination: Location
+    weight: Weight
+    dimensions: Dimensions
+    ship_date: dt.date
+
+
+@dataclass
+class Rate:
+    price: float
+    service: str
+    arrival: Optional[dt.date] = None
+
+
+def rows(count: int):
+    for i in range(count):
+        yield {
+            "id": str(i),
+            "from_zip": f"{60000 + i % 1000}",
+            "to_zip": f"{90000 + i % 997}",
+            "to_state": "CA",
+            "ounces": 8 + i % 200,
+            "size": f"{6 + i % 12}x{4 + i % 6}x{2 + i % 4}",
+            "date": "2026-10-20",
+        }
+
+
+def build_dataclasses(count: int, module):
+    requests, rates = [], []
+    for row in rows(count):
+        requests.append(
+            module.RateRequest(
+                module.Location(zip_code=row["from_zip"]),
+                module.Location(zip_code=row["to_zip"], state=row["to_state"]),
+                module.Weight(0, row["ounces"]),
+                module.Dimensions(*(int(i) for i in row["size"].split("x"))),
+                dt.date(2026, 10, 20),
+            )
+        )
+        rates.append(
+            [
+                module.Rate(
+                    f"{9 + i}.{row['ounces'] % 100:02d}", s, dt.date(2026, 10, 23)
+                )
+                for i, s in enumerate(("03", "02", "01"))
+            ]
+        )
+    return requests, rates
+
+
+def build_columnar(count: int):
+    batch = RequestBatch.from_rows(rows(count))
+    table = RateTable.from_rates(
+        [
+            common.Rate(f"{9 + i}.{ounces % 100:02d}", s, dt.date(2026, 10, 23), "ups")
+            for i, s in enumerate(("03", "02", "01"))
+        ]
+        for ounces in batch.ounces.tolist()
+    )
+    return batch, table
+
+
+def measure(build, *args) -> int:
+    tracemalloc.start()
+    result = build(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = {
+        "plain_dataclasses": measure(
+            build_dataclasses, args.count, sys.modules[__name__]
+        ),
+        "slotted_dataclasses": measure(build_dataclasses, args.count, common),
+        "columnar": measure(build_columnar, args.count),
+    }
+    print(
+        json.dumps(
+            {
+                "count": args.count,
+                "bytes_per_shipment": {
+                    k: round(v / args.count, 1) for k, v in results.items()
+                },
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Cold start and private memory per worker: CSV/SQLite vs packed tables.
+
+Run with `python benchmarks/bench_packed.py --origins=5000`. Builds a
+synthetic ground table (origins x states) and zone store (every origin
+prefix x destination prefix) in a temp directory, then starts a fresh
+process per format that opens the data and runs lookups. Private memory is
+RssAnon from /proc (Linux); mapped pages are shared and not counted there.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from shipping.ups_ground import (
+    GROUND_PACKED,
+    GROUND_TABLE,
+    load_ground_table,
+    write_ground_packed,
+)
+from shipping.ups_ground_boxes import BOXES
+from shipping.zones import ZoneStore
+
+LOOKUPS = 10_000
+
+
+def rss_anon_kb() -> int:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def build(work_dir: str, origins: int):
+    rnd = random.Random(0)
+    zip_codes = sorted({f"{rnd.randrange(501, 99950):05d}" for _ in range(origins)})
+    rows = [
+        {"zip_code": i, "state": state, "days": rnd.randint(1, 5)}
+        for i in zip_codes
+        for state in BOXES
+    ]
+    with open(os.path.join(work_dir, "maps.csv"), "w") as f:
+        f.write("file_name,zip_code,downloaded_at\n")
+    with open(os.path.join(work_dir, GROUND_TABLE), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["zip_code", "state", "days"])
+        writer.writeheader()
+        writer.writerows(rows)
+    write_ground_packed(work_dir, rows)
+    store = ZoneStore(os.path.join(work_dir, "zones.db"))
+    for origin3 in range(5, 1000):
+        zones = {f"{i:03d}": 2 + abs(origin3 - i) // 120 for i in range(5, 1000)}
+        store.save("ups", f"{origin3:03d}", zones, complete=True)
+    store.export(os.path.join(work_dir, "zones.bin"))
+    return zip_codes
+
+
+def child(work_dir: str, kind: str, packed: bool) -> dict:
+    with open(f"{work_dir}/zips.csv", "r", newline="") as f:
+        zip_codes = [i["zip_code"] for i in csv.DictReader(f)]
+    rnd = random.Random(1)
+    states = list(BOXES)
+    before = rss_anon_kb()
+    start = time.perf_counter()
+    if kind == "ground":
+        if not packed:
+            os.remove(f"{work_dir}/{GROUND_PACKED}")
+        table = load_ground_table(work_dir)
+        opened = time.perf_counter()
+        for _ in range(LOOKUPS):
+            table.get((rnd.choice(zip_codes), rnd.choice(states)))
+    else:
+        if packed:
+            store = ZoneStore(snapshot=f"{work_dir}/zones.bin")
+        else:
+            store = ZoneStore(f"{work_dir}/zones.db")
+        opened = time.perf_counter()
+        for _ in range(LOOKUPS):
+            origin3 = f"{rnd.randrange(5, 1000):03d}"
+            store.table("ups", origin3)[rnd.randrange(5, 1000)]
+    done = time.perf_counter()
+    return {
+        "open_ms": round((opened - start) * 1000, 3),
+        "lookup_us": round((done - opened) / LOOKUPS * 1e6, 3),
+        "private_mb": round((rss_anon_kb() - before) / 1024, 2),
+    }
+
+
+def run_child(work_dir: str, kind: str, packed: bool) -> dict:
+    # Each run gets its own hard-linked copy so the CSV run can drop the
+    # packed file
+    copy = tempfile.mkdtemp(dir=work_dir)
+    for name in os.listdir(work_dir):
+        path = os.path.join(work_dir, name)
+        if os.path.isfile(path):
+            os.link(path, os.path.join(copy, name))
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", kind, copy]
+        + (["--packed"] if packed else []),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--origins", type=int, default=5000)
+    parser.add_argument("--child", nargs=2, default=None)
+    parser.add_argument("--packed", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        kind, work_dir = args.child
+        print(json.dumps(child(work_dir, kind, args.packed)))
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        zip_codes = build(work_dir, args.origins)
+        with open(os.path.join(work_dir, "zips.csv"), "w") as f:
+            f.write("zip_code\n" + "\n".join(zip_codes) + "\n")
+        sizes = {
+            name: round(os.path.getsize(os.path.join(work_dir, name)) / 2**20, 2)
+            for name in (GROUND_TABLE, GROUND_PACKED, "zones.db", "zones.bin")
+        }
+        results = {
+            "origins": len(zip_codes),
+            "file_mb": sizes,
+            "ground": {
+                "csv": run_child(work_dir, "ground", False),
+                "packed": run_child(work_dir, "ground", True),
+            },
+            "zones": {
+                "sqlite": run_child(work_dir, "zones", False),
+                "packed": run_child(work_dir, "zones", True),
+            },
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Carrier response parsing benchmark: current parsers vs the baseline ones.
+
+Run with `python benchmarks/bench_parse.py --packages=500`. The sample
+responses in benchmarks/fixtures are hand-written in the carriers' formats,
+not captured from the live APIs; they are scaled up to the given number of
+packages. The baseline parsers below are the response.json()/xmltodict
+versions that shipped before the USPS parser was made streaming.
+"""
+
+import argparse
+import copy
+import datetime as dt
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import xmltodict
+
+from shipping import ups, usps
+from shipping.business_days import arrival_date
+from shipping.common import Dimensions, Location, Package, Rate, RateRequest, Weight
+from shipping.ups import as_list
+from shipping.ups_ground import ups_ground_days
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def ups_payload(packages: int) -> bytes:
+    with open(os.path.join(FIXTURES, "ups_rate.json"), "r") as f:
+        data = json.load(f)
+    for shipment in data["RateResponse"]["RatedShipment"]:
+        rated = shipment["RatedPackage"][0]
+        shipment["RatedPackage"] = [copy.deepcopy(rated) for _ in range(packages)]
+    return json.dumps(data).encode()
+
+
+def usps_payload(packages: int) -> bytes:
+    with open(os.path.join(FIXTURES, "usps_rate.xml"), "r") as f:
+        xml = f.read()
+    start = xml.index('<Package ID="0">')
+    end = xml.index('<Package ID="1">')
+    package = xml[start:end]
+    body = "".join(package.replace('ID="0"', f'ID="{i}"', 1) for i in range(packages))
+    return (xml[:start] + body + "</RateV4Response>").encode()
+
+
+# The parsers as they were before streaming, copied unchanged apart from the
+# names so the comparison is against what shipped
+
+
+def baseline_ups_parse_rate_response(
+    response, rate_request: RateRequest, map_dir, ignore_ground
+) -> list[Rate]:
+    if response.status_code == 200:
+        output = []
+        data = response.json()
+        multi_package = len(rate_request.get_packages()) > 1
+        for rate in as_list(data["RateResponse"]["RatedShipment"]):
+            service = rate["Service"]["Code"]
+            price = rate["TotalCharges"]["MonetaryValue"]
+            if "GuaranteedDelivery" in rate:
+                transit_days = rate["GuaranteedDelivery"]["BusinessDaysInTransit"]
+                arrival = arrival_date("ups", rate_request.ship_date, transit_days)
+            else:
+                arrival = None
+            if not ignore_ground:
+                if int(service) == 3:  # UPS Ground
+                    days = ups_ground_days(
+                        rate_request.origination.zip_code,
+                        rate_request.destination.state,
+                        map_dir,
+                    )
+                    arrival = arrival_date("ups", rate_request.ship_date, days)
+            if not multi_package:
+                output.append(Rate(price, service, arrival, "ups", 0))
+                continue
+            # RatedPackage entries follow the order of the request's packages
+            for i, package in enumerate(as_list(rate.get("RatedPackage", []))):
+                package_price = package.get("TotalCharges", {}).get("MonetaryValue")
+                output.append(Rate(package_price, service, arrival, "ups", i))
+        return output
+    else:
+        raise ValueError(response.content)
+
+
+def baseline_usps_parse_rate_response(
+    response, rate_request: RateRequest = None
+) -> list[Rate]:
+    if response.status_code == 200:
+        output = []
+        errors = []
+        data = xmltodict.parse(response.content)
+        for package in as_list(data["RateV4Response"]["Package"]):
+            if "Error" in package:
+                errors.append(package["Error"].get("Description"))
+                continue
+            for temp_rate in as_list(package.get("Postage", [])):
+                if ";" in temp_rate["MailService"]:
+                    service = temp_rate["MailService"].split("&")[0]
+                    service_modifier = temp_rate["MailService"].split(";")[-1]
+                    service += service_modifier
+                else:
+                    service = temp_rate["MailService"]
+                arrival = None
+                commitment = (temp_rate.get("CommitmentName") or "").split("-")[0]
+                if temp_rate.get("CommitmentDate"):
+                    arrival = dt.datetime.strptime(
+                        temp_rate["CommitmentDate"], "%Y-%m-%d"
+                    )
+                elif commitment.isdigit() and rate_request is not None:
+                    # "2-Day" without a date: count service days from ship date
+                    arrival = arrival_date("usps", rate_request.ship_date, commitment)
+                rate = Rate(
+                    price=temp_rate["Rate"],
+                    service=service,
+                    arrival=arrival,
+                    carrier="usps",
+                    package=int(package["@ID"]),
+                )
+                output.append(rate)
+        if errors and not output:
+            raise ValueError(errors[0])
+        return output
+    else:
+        raise ValueError(response.content)
+
+
+def response(content: bytes):
+    return SimpleNamespace(
+        status_code=200, content=content, json=lambda: json.loads(content)
+    )
+
+
+def measure(func, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": round(statistics.median(timings), 5),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--packages", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    package = Package(Weight(0, 12), Dimensions(8, 4, 4))
+    rate_request = RateRequest(
+        origination=Location(zip_code="60602", state="IL"),
+        destination=Location(zip_code="10001", state="NY"),
+        weight=package.weight,
+        dimensions=package.dimensions,
+        ship_date=dt.datetime(2026, 10, 20),
+        packages=(package,) * args.packages,
+    )
+    ups_response = response(ups_payload(args.packages))
+    usps_response = response(usps_payload(args.packages))
+
+    def baseline_ups():
+        return baseline_ups_parse_rate_response(ups_response, rate_request, ".", True)
+
+    def current_ups():
+        return ups.parse_rate_response(ups_response, rate_request, ".", True)
+
+    def baseline_usps():
+        return baseline_usps_parse_rate_response(usps_response, rate_request)
+
+    def current_usps():
+        return usps.parse_rate_response(usps_response, rate_request)
+
+    # Same per-package prices; the current parsers also return shipment
+    # totals, and a single package's rates are the total
+    def per_package(rates):
+        return [
+            (i.price, i.service, i.package or 0)
+            for i in rates
+            if i.package is not None or args.packages == 1
+        ]
+
+    assert per_package(current_ups()) == per_package(baseline_ups())
+    assert per_package(current_usps()) == per_package(baseline_usps())
+    results = {"packages": args.packages}
+    for carrier, content, baseline, current in (
+        ("ups", ups_response.content, baseline_ups, current_ups),
+        ("usps", usps_response.content, baseline_usps, current_usps),
+    ):
+        results[carrier] = {
+            "bytes": len(content),
+            "baseline": measure(baseline, args.repeat),
+            "current": measure(current, args.repeat),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""End-to-end benchmark suite against the local carrier stand-in.
+
+Run with `python benchmarks/bench_suite.py --output=results.json` and compare
+two runs with `--compare=baseline.json`. Measures single-quote latency,
+upstream calls for a burst of identical quotes, batch throughput, zone
+lookup rate, ground-day classification time and CLI startup. No carrier
+credentials or network access are needed.
+"""
+
+import argparse
+import csv
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from standin import start, standin_rewrites
+
+from shipping import ups, ups_ground, usps
+from shipping.batch import rate_batch
+from shipping.common import Dimensions, Location, RateRequest, Weight
+from shipping.quote import quote
+from shipping.transport import Transport, set_transport
+from shipping.zones import ZoneStore
+
+ORIGINS = ["60602", "02134", "94107", "30301"]
+DESTINATIONS = [("10001", "NY"), ("90210", "CA"), ("73301", "TX"), ("98101", "WA")]
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def timings(values: list[float]) -> dict:
+    return {
+        "median_ms": round(statistics.median(values) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+    }
+
+
+def make_raters(map_dir: str, transport: Transport, token_path: str) -> dict:
+    tokens = ups.UPSTokenProvider("standin", "standin", token_path)
+    return {
+        "ups": lambda rate_request: ups.get_rate(
+            tokens.access_token(), rate_request, map_dir, False, transport
+        ),
+        "usps": lambda rate_request: usps.get_rate(
+            "standin", "standin", rate_request, transport
+        ),
+    }
+
+
+def rate_request(i: int) -> RateRequest:
+    to_zip, to_state = DESTINATIONS[i % len(DESTINATIONS)]
+    return RateRequest(
+        origination=Location(zip_code=ORIGINS[0], state="IL"),
+        destination=Location(zip_code=to_zip, state=to_state),
+        weight=Weight(0, 12 + i % 40),
+        dimensions=Dimensions(8, 4, 4),
+        ship_date=dt.datetime(2026, 10, 20),
+    )
+
+
+def bench_quote(raters: dict, repeat: int) -> dict:
+    values = []
+    errors = 0
+    for i in range(repeat):
+        start_time = time.perf_counter()
+        result = quote(rate_request(i), raters)
+        values.append(time.perf_counter() - start_time)
+        errors += sum(1 for i in result.carriers if i.error)
+    return {**timings(values), "carrier_errors": errors}
+
+
+def bench_burst(server, raters: dict, callers: int) -> dict:
+    # Identical quotes arriving together; in-flight duplicates are coalesced
+    before = server.stats()["requests"]
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        list(executor.map(lambda _: quote(rate_request(0), raters), range(callers)))
+    elapsed = time.perf_counter() - start_time
+    after = server.stats()["requests"]
+    upstream = sum(after.get(i, 0) - before.get(i, 0) for i in ("rating", "rate_v4"))
+    return {
+        "callers": callers,
+        "upstream_requests": upstream,
+        "seconds": round(elapsed, 3),
+    }
+
+
+def bench_batch(raters: dict, rows: int, concurrency: int, work_dir: str) -> dict:
+    input_path = os.path.join(work_dir, "shipments.csv")
+    output_path = os.path.join(work_dir, "rates.jsonl")
+    with open(input_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["from_zip", "from_state", "to_zip", "to_state", "ounces", "size"]
+        )
+        for i in range(rows):
+            to_zip, to_state = DESTINATIONS[i % len(DESTINATIONS)]
+            writer.writerow([ORIGINS[0], "IL", to_zip, to_state, 12 + i % 40, "8x4x4"])
+    summary = rate_batch(input_path, output_path, raters, concurrency=concurrency)
+    return {
+        "rows": summary.rows,
+        "failed": summary.failed,
+        "seconds": round(summary.elapsed, 3),
+        "rows_per_second": round(summary.throughput, 2),
+    }
+
+
+def bench_zones(transport: Transport, lookups: int) -> dict:
+    store = ZoneStore()
+    destinations = [f"{i:03d}01" for i in range(5, 1000)]
+    start_time = time.perf_counter()
+    for origin in ORIGINS:
+        store.ups_zones(origin, destinations[:1], "standin", transport)
+    cold = (time.perf_counter() - start_time) / len(ORIGINS)
+    start_time = time.perf_counter()
+    done = 0
+    while done < lookups:
+        for origin in ORIGINS:
+            store.lookup("ups", origin, destinations)
+            done += len(destinations)
+    warm = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    usps.get_usps_zones(ORIGINS[0], destinations[:50], "standin", transport)
+    usps_seconds = time.perf_counter() - start_time
+    return {
+        "ups_sheet_fetch_ms": round(cold * 1000, 3),
+        "cached_lookups_per_second": round(done / warm),
+        "usps_zones_per_second": round(50 / usps_seconds, 2),
+    }
+
+
+def bench_ground(transport: Transport, map_dir: str, repeat: int) -> dict:
+    from PIL import Image
+
+    errors = ups_ground.download_maps(ORIGINS, "standin", map_dir, transport=transport)
+    if errors:
+        raise RuntimeError(errors)
+    maps = ups_ground.read_maps(map_dir)
+    img = Image.open(os.path.join(map_dir, maps[0]["file_name"]))
+    img.load()
+    values = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        ups_ground.classify_map(img)
+        values.append(time.perf_counter() - start_time)
+    start_time = time.perf_counter()
+    ups_ground.index_maps(map_dir, workers=1)
+    build = time.perf_counter() - start_time
+    return {
+        "classify_map": timings(values),
+        "build_table_ms": round(build * 1000, 3),
+        "origins": len(maps),
+    }
+
+
+def bench_cli(repeat: int) -> dict:
+    values = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "shipping.main", "--help"],
+            check=True,
+            capture_output=True,
+        )
+        values.append(time.perf_counter() - start_time)
+    return timings(values)
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        )
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def flatten(data: dict, prefix: str = "") -> dict:
+    output = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            output.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            output[f"{prefix}{key}"] = value
+    return output
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    # Ratio of this run to the baseline for every shared numeric metric
+    current = flatten(results["benchmarks"])
+    previous = flatten(baseline["benchmarks"])
+    return {
+        k: round(v / previous[k], 3)
+        for k, v in current.items()
+        if previous.get(k) not in (None, 0)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--compare", type=str, default=None)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--lookups", type=int, default=1_000_000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = start(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    transport = Transport(
+        rewrites=standin_rewrites(server.base_url),
+        pool_maxsize=args.concurrency * 2,
+        backoff_factor=0,
+    )
+    set_transport(transport)
+    with tempfile.TemporaryDirectory() as work_dir:
+        map_dir = os.path.join(work_dir, "maps")
+        ground = bench_ground(transport, map_dir, args.repeat)
+        raters = make_raters(map_dir, transport, os.path.join(work_dir, ".ups_token"))
+        benchmarks = {
+            "quote": bench_quote(raters, args.repeat),
+            "burst": bench_burst(server, raters, args.concurrency * 4),
+            "batch": bench_batch(raters, args.rows, args.concurrency, work_dir),
+            "zones": bench_zones(transport, args.lookups),
+            "ground": ground,
+            "cli_startup": bench_cli(max(args.repeat // 4, 3)),
+        }
+    server.shutdown()
+    results = {
+        "commit": git_commit(),
+        "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "standin": {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "stats": server.stats(),
+        },
+        "benchmarks": benchmarks,
+    }
+    if args.compare:
+        with open(args.compare, "r") as f:
+            results["compared_to"] = {
+                "path": args.compare,
+                "ratios": compare(results, json.load(f)),
+            }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Local stand-in for the UPS and USPS endpoints the package calls.
+
+Run with `python benchmarks/standin.py --port=8089 --latency=0.05` and point
+a Transport at it with standin_rewrites("http://127.0.0.1:8089"). Responses
+are built from the fixtures in benchmarks/fixtures; zone sheets and map
+images are generated per origin. --error-rate answers that share of
+requests with --error-status instead.
+"""
+
+import argparse
+import copy
+import io
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.etree import ElementTree
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CARRIER_HOSTS = [
+    "https://wwwcie.ups.com",
+    "https://www.ups.com",
+    "https://secure.shippingapis.com",
+    "https://postcalc.usps.com",
+]
+
+
+def standin_rewrites(base_url: str) -> dict[str, str]:
+    return {i: base_url for i in CARRIER_HOSTS}
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), "r") as f:
+        return f.read()
+
+
+def zone_for(origin: str, destination: str) -> int:
+    # Stable stand-in for distance: 2 to 8 by prefix difference
+    return 2 + min(6, abs(int(origin[:3]) - int(destination[:3])) // 120)
+
+
+def days_for(origin: str, state: str) -> int:
+    return 1 + (int(origin[:3]) + sum(map(ord, state))) % 5
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int = 0,
+    ):
+        super().__init__(address, StandinHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+        self._generated = {}
+        self.ups_rate = json.loads(read_fixture("ups_rate.json"))
+        self.usps_rate = read_fixture("usps_rate.xml")
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self.random.uniform(-1, 1) * self.jitter)
+
+    def inject_error(self, route: str) -> bool:
+        with self._lock:
+            self.requests[route] += 1
+            if self.random.random() < self.error_rate:
+                self.errors[route] += 1
+                return True
+            return False
+
+    def generated(self, key, build):
+        # Zone sheets and map images are built once per origin
+        with self._lock:
+            if key not in self._generated:
+                self._generated[key] = build()
+            return self._generated[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": dict(self.requests), "errors": dict(self.errors)}
+
+
+def ups_token() -> dict:
+    token = json.loads(read_fixture("ups_token.json"))
+    token["issued_at"] = str(int(time.time() * 1000))
+    return token
+
+
+def ups_rate(template: dict, payload: dict) -> dict:
+    packages = payload["RateRequest"]["Shipment"]["Package"]
+    count = len(packages) if isinstance(packages, list) else 1
+    data = copy.deepcopy(template)
+    for shipment in data["RateResponse"]["RatedShipment"]:
+        rated = shipment["RatedPackage"][0]
+        shipment["RatedPackage"] = [rated] * count
+    return data
+
+
+def usps_rate(template: str, xml: str) -> str:
+    # Every requested Package gets the rates of the fixture's first Package
+    start = template.index('<Package ID="0">')
+    end = template.index('<Package ID="1">')
+    package = template[start:end]
+    ids = [i.get("ID") for i in ElementTree.fromstring(xml).iter("Package")]
+    body = "".join(package.replace('ID="0"', f'ID="{i}"', 1) for i in ids)
+    return template[:start] + body + "</RateV4Response>"
+
+
+def ups_zone_sheet(origin3: str) -> bytes:
+    import pandas as pd
+
+    rows = []
+    for start in range(4, 1000, 5):
+        dest = f"{start:03d}-{min(start + 4, 999):03d}"
+        zone = zone_for(origin3, f"{start:03d}")
+        rows.append(
+            {
+                "Dest. ZIP": dest,
+                "Ground": f"{zone:03d}",
+                "3 Day Select": f"{zone + 300:03d}",
+                "2nd Day Air": f"{zone + 200:03d}",
+                "Next Day Air": f"{zone + 100:03d}",
+            }
+        )
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        pd.DataFrame(rows).to_excel(writer, sheet_name=origin3, startrow=8, index=False)
+    return buffer.getvalue()
+
+
+def ups_map(zip_code: str) -> bytes:
+    from PIL import Image, ImageDraw
+
+    from shipping.ups_ground_boxes import BOXES, COLORS
+
+    img = Image.new("RGB", (560, 360), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for state, (x, y, x_offset, y_offset) in BOXES.items():
+        color = COLORS[days_for(zip_code, state)]
+        draw.rectangle((x, y, x + x_offset - 1, y + y_offset - 1), fill=color)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+    def send_body(self, status: int, body, content_type: str):
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, data):
+        self.send_body(status, json.dumps(data), "application/json")
+
+    def handle_route(self, method: str):
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        route = self.route(method, url.path)
+        if route is None:
+            self.send_json(404, {"error": f"Unknown path {url.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)  # Read even when failing, for keep-alive
+        time.sleep(self.server.delay())
+        if self.server.inject_error(route.__name__):
+            self.send_json(self.server.error_status, {"error": "Injected error"})
+            return
+        route(url.path, query, body)
+
+    def route(self, method: str, path: str):
+        if method == "POST" and path == "/security/v1/oauth/token":
+            return self.oauth
+        if method == "POST" and path.startswith("/api/rating/"):
+            return self.rating
+        if method == "GET" and path.startswith("/media/us/currentrates/zone-csv/"):
+            return self.zone_sheet
+        if method == "GET" and path == "/maps/printerfriendly":
+            return self.map_page
+        if method == "GET" and path.startswith("/maps/images/"):
+            return self.map_image
+        if method == "GET" and path == "/ShippingAPI.dll":
+            return self.rate_v4
+        if method == "GET" and path == "/DomesticZoneChart/GetZone":
+            return self.usps_zone
+        return None
+
+    def oauth(self, path, query, body):
+        self.send_json(200, ups_token())
+
+    def rating(self, path, query, body):
+        self.send_json(200, ups_rate(self.server.ups_rate, json.loads(body)))
+
+    def zone_sheet(self, path, query, body):
+        origin3 = os.path.splitext(path.split("/")[-1])[0]
+        sheet = self.server.generated(
+            ("zones", origin3), lambda: ups_zone_sheet(origin3)
+        )
+        self.send_body(200, sheet, "application/vnd.ms-excel")
+
+    def map_page(self, path, query, body):
+        page = read_fixture("ups_map.html").replace("{zip_code}", query["zip"])
+        self.send_body(200, page, "text/html")
+
+    def map_image(self, path, query, body):
+        zip_code = os.path.splitext(path.split("/")[-1])[0]
+        image = self.server.generated(("map", zip_code), lambda: ups_map(zip_code))
+        self.send_body(200, image, "image/png")
+
+    def rate_v4(self, path, query, body):
+        xml = usps_rate(self.server.usps_rate, query["XML"])
+        self.send_body(200, xml, "text/xml")
+
+    def usps_zone(self, path, query, body):
+        origin, destination = query["origin"], query["destination"]
+        data = (
+            read_fixture("usps_zone.json")
+            .replace("{origin}", origin)
+            .replace("{destination}", destination)
+            .replace("{zone}", str(zone_for(origin, destination)))
+        )
+        self.send_body(200, data, "application/json")
+
+    def do_GET(self):
+        self.handle_route("GET")
+
+    def do_POST(self):
+        self.handle_route("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(host: str = "127.0.0.1", port: int = 0, **options) -> StandinServer:
+    # Serves on a background thread; port 0 picks a free port
+    server = StandinServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandinServer(
+        (args.host, args.port),
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    print(f"Serving carrier stand-in on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    main()
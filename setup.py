@@ -13,6 +13,9 @@ setup(
     py_modules=["shipping"],
     packages=find_packages(),
     install_requires=get_requirements(),
+    extras_require={
+        "parquet": ["pyarrow==16.1.0"],  # zones-matrix .parquet output
+    },
     entry_points={
         "console_scripts": [
             "shipping = shipping.main:cli",
@@ -1 +1,22 @@
-__all__ = ["common", "rates", "ups", "usps", "ups_ground"]
+__all__ = [
+    "batch",
+    "boxes",
+    "business_days",
+    "cache",
+    "columnar",
+    "common",
+    "metrics",
+    "packed",
+    "quote",
+    "ratecard",
+    "rates",
+    "selection",
+    "server",
+    "singleflight",
+    "transport",
+    "ups",
+    "usps",
+    "ups_ground",
+    "warehouses",
+    "zones",
+]
@@ -0,0 +1,261 @@
+import asyncio
+import csv
+import datetime as dt
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, Union
+
+from shipping.common import Dimensions, Location, Package, RateRequest, Weight
+from shipping.quote import DEFAULT_DEADLINE, Rater, carrier_deadline, quote_carrier
+
+
+@dataclass
+class BatchSummary:
+    rows: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    errors: Counter = field(default_factory=Counter)
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "skipped": self.skipped,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "errors": dict(self.errors),
+            "elapsed": round(self.elapsed, 3),
+            "rows_per_second": round(self.throughput, 2),
+        }
+
+
+class RateLimiter:
+    def __init__(self, per_second: float):
+        self.interval = 1 / per_second
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def read_shipments(path: str) -> Iterator[dict]:
+    with open(path, "r", newline="") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for i, row in enumerate(rows):
+            if not row.get("id"):
+                row["id"] = str(i)
+            yield row
+
+
+def completed_ids(path: str) -> set[str]:
+    # Rows that got rates from every carrier; failed rows are rated again.
+    # Unparseable lines (a run killed mid-write) are skipped.
+    if not os.path.exists(path):
+        return set()
+    output = set()
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(result, dict) and "id" in result:
+                if result.get("errors"):
+                    output.discard(str(result["id"]))
+                else:
+                    output.add(str(result["id"]))
+    return output
+
+
+def trim_partial_line(path: str):
+    # Drops an unterminated last line so appended results start on their own
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if not size:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        position = size
+        while position > 0:
+            step = min(8192, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+
+def row_to_rate_request(row: dict, origin: bool = True) -> RateRequest:
+    # Without origin the request has no origination, for orders that ship
+    # from whichever warehouse is chosen later
+    country = row.get("country") or "US"
+    # JSON rows may list several packages: [{"ounces": 12, "size": "8x4x4"}, ...]
+    packages = [
+        Package(Weight(0, int(i["ounces"])), Dimensions.from_str(i["size"]))
+        for i in row.get("packages") or []
+    ]
+    if packages:
+        weight, dimensions = packages[0].weight, packages[0].dimensions
+    else:
+        weight = Weight(0, int(row["ounces"]))
+        dimensions = Dimensions.from_str(row["size"])
+    return RateRequest(
+        origination=(
+            Location(
+                zip_code=str(row["from_zip"]),
+                state=row.get("from_state"),
+                country=country,
+            )
+            if origin
+            else None
+        ),
+        destination=Location(
+            zip_code=str(row["to_zip"]), state=row.get("to_state"), country=country
+        ),
+        weight=weight,
+        dimensions=dimensions,
+        ship_date=(
+            dt.datetime.strptime(row["date"], "%Y-%m-%d")
+            if row.get("date")
+            else dt.datetime.today()
+        ),
+        packages=tuple(packages),
+    )
+
+
+async def rate_row(
+    row: dict,
+    raters: dict[str, Rater],
+    limiters: dict[str, RateLimiter],
+    deadline: Union[float, dict[str, float]],
+    executor: ThreadPoolExecutor,
+) -> dict:
+    try:
+        rate_request = row_to_rate_request(row)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        return {"id": row["id"], "rates": [], "errors": {"request": error}}
+
+    async def rate_carrier(carrier, rater):
+        if carrier in limiters:
+            await limiters[carrier].wait()
+        return await quote_carrier(
+            carrier, rater, rate_request, carrier_deadline(deadline, carrier), executor
+        )
+
+    results = await asyncio.gather(*(rate_carrier(*i) for i in raters.items()))
+    return {
+        "id": row["id"],
+        "rates": [rate.to_dict() for result in results for rate in result.rates],
+        "errors": {i.carrier: i.error for i in results if i.error},
+    }
+
+
+async def rate_batch_async(
+    shipments: Iterator[dict],
+    output,
+    raters: dict[str, Rater],
+    concurrency: int = 8,
+    rate_limits: Optional[dict[str, float]] = None,
+    deadline: Union[float, dict[str, float]] = DEFAULT_DEADLINE,
+    skip_ids: Optional[set[str]] = None,
+) -> BatchSummary:
+    summary = BatchSummary()
+    limiters = {k: RateLimiter(v) for k, v in (rate_limits or {}).items()}
+    skip_ids = skip_ids or set()
+    queue = asyncio.Queue(maxsize=concurrency * 2)  # Keeps memory flat
+    executor = ThreadPoolExecutor(max_workers=concurrency * max(len(raters), 1))
+    start = time.perf_counter()
+
+    async def worker():
+        while True:
+            row = await queue.get()
+            if row is None:
+                return
+            result = await rate_row(row, raters, limiters, deadline, executor)
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            summary.rows += 1
+            summary.errors.update(result["errors"].keys())
+            if result["errors"]:
+                summary.failed += 1
+            else:
+                summary.succeeded += 1
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+
+    async def put(row):
+        # Raises a worker's error instead of waiting on a queue nobody drains
+        put_task = asyncio.ensure_future(queue.put(row))
+        done, _ = await asyncio.wait(
+            [put_task, *workers], return_when=asyncio.FIRST_COMPLETED
+        )
+        if put_task not in done:
+            put_task.cancel()
+            for task in done:
+                task.result()
+            raise ValueError("Batch worker stopped early")
+
+    try:
+        for row in shipments:
+            if str(row["id"]) in skip_ids:
+                summary.skipped += 1
+                continue
+            await put(row)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        executor.shutdown(wait=False)
+        summary.elapsed = time.perf_counter() - start
+    return summary
+
+
+def rate_batch(
+    input_path: str,
+    output_path: str,
+    raters: dict[str, Rater],
+    concurrency: int = 8,
+    rate_limits: Optional[dict[str, float]] = None,
+    deadline: Union[float, dict[str, float]] = DEFAULT_DEADLINE,
+    resume: bool = False,
+) -> BatchSummary:
+    skip_ids = completed_ids(output_path) if resume else set()
+    if resume and os.path.exists(output_path):
+        trim_partial_line(output_path)
+    with open(output_path, "a" if resume else "w") as output:
+        return asyncio.run(
+            rate_batch_async(
+                read_shipments(input_path),
+                output,
+                raters,
+                concurrency,
+                rate_limits,
+                deadline,
+                skip_ids,
+            )
+        )
@@ -0,0 +1,140 @@
+import csv
+from dataclasses import dataclass, field
+from typing import Optional
+
+from shipping import metrics
+from shipping.common import Dimensions, Package, Rate, RateRequest, Weight
+from shipping.quote import Rater
+from shipping.ratecard import billable_pounds
+from shipping.rates import get_best_rate
+from shipping.usps import MAX_PACKAGES
+
+
+@dataclass
+class Box:
+    name: str
+    dimensions: Dimensions
+    tare: Weight = field(default_factory=lambda: Weight(0, 0))
+
+    def volume(self) -> int:
+        return self.dimensions.length * self.dimensions.width * self.dimensions.height
+
+
+@dataclass
+class BoxRate:
+    box: Box
+    rate: Rate
+
+
+def load_boxes(path: str) -> list[Box]:
+    # CSV with name, size (LxWxH) and an optional tare_ounces column
+    with open(path, "r", newline="") as f:
+        return [
+            Box(
+                row["name"],
+                Dimensions.from_str(row["size"]),
+                Weight(0, int(row.get("tare_ounces") or 0)),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def fits(item: Dimensions, box: Dimensions) -> bool:
+    item_sides = sorted((item.length, item.width, item.height))
+    box_sides = sorted((box.length, box.width, box.height))
+    return all(i <= j for i, j in zip(item_sides, box_sides))
+
+
+def candidate_boxes(
+    carrier: str, item: Dimensions, weight: Weight, boxes: list[Box]
+) -> list[tuple[Box, Weight]]:
+    # One box per billable weight (the smallest), lightest billable weight first
+    by_pounds = {}
+    for box in sorted(boxes, key=Box.volume):
+        if not fits(item, box.dimensions):
+            continue
+        total = Weight(0, weight.to_ounces() + box.tare.to_ounces())
+        dims = box.dimensions
+        pounds = int(
+            billable_pounds(
+                carrier, total.to_ounces(), dims.length, dims.width, dims.height
+            )
+        )
+        by_pounds.setdefault(pounds, (box, total))
+    return [by_pounds[i] for i in sorted(by_pounds)]
+
+
+def cheapest_box(
+    carrier: str,
+    rater: Rater,
+    rate_request: RateRequest,
+    item: Dimensions,
+    weight: Weight,
+    boxes: list[Box],
+    arrive_by,
+) -> Optional[BoxRate]:
+    candidates = candidate_boxes(carrier, item, weight, boxes)
+    for start in range(0, len(candidates), MAX_PACKAGES):
+        chunk = candidates[start : start + MAX_PACKAGES]
+        request = RateRequest(
+            rate_request.origination,
+            rate_request.destination,
+            chunk[0][1],
+            chunk[0][0].dimensions,
+            rate_request.ship_date,
+            tuple(Package(total, box.dimensions) for box, total in chunk),
+        )
+        rates = rater(request)
+        best = None
+        for i, (box, _) in enumerate(chunk):
+            # A one-package request is priced as the whole shipment
+            package = i if len(chunk) > 1 else None
+            try:
+                rate = get_best_rate(
+                    [j for j in rates if j.package == package], arrive_by
+                )
+            except ValueError:
+                continue
+            if best is None or float(rate.price) < float(best.rate.price):
+                best = BoxRate(box, rate)
+        # Prices don't fall as billable weight rises, so every later candidate
+        # is bounded below by this chunk's best price. The bound only holds
+        # for this carrier's prices; pick_box compares across carriers.
+        if best is not None:
+            return best
+    return None
+
+
+def pick_box(
+    rate_request: RateRequest,
+    item: Dimensions,
+    weight: Weight,
+    boxes: list[Box],
+    raters: dict[str, Rater],
+    arrive_by,
+) -> BoxRate:
+    # Every carrier is evaluated; one that fails is skipped like in quote
+    best = None
+    errors = {}
+    for carrier, rater in raters.items():
+        try:
+            box_rate = cheapest_box(
+                carrier, rater, rate_request, item, weight, boxes, arrive_by
+            )
+        except Exception as e:
+            errors[carrier] = str(e) or type(e).__name__
+            metrics.inc(
+                "shipping_carrier_errors_total",
+                carrier=carrier,
+                reason=type(e).__name__,
+            )
+            continue
+        if box_rate is None:
+            continue
+        if best is None or float(box_rate.rate.price) < float(best.rate.price):
+            best = box_rate
+    if best is None:
+        if errors:
+            raise ValueError(f"No box meets the deadline (errors: {errors})")
+        raise ValueError("No box meets the deadline")
+    return best
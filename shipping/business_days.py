@@ -0,0 +1,181 @@
+import datetime as dt
+from typing import Iterable
+
+WEEKDAYS = (0, 1, 2, 3, 4)  # Monday to Friday
+SERVICE_DAYS = {
+    "ups": WEEKDAYS,
+    "usps": WEEKDAYS + (5,),  # USPS delivers on Saturday
+}
+
+_calendars = {}
+
+
+def as_date(value) -> dt.date:
+    if isinstance(value, str):
+        return dt.date.fromisoformat(value[:10])
+    if isinstance(value, dt.datetime):
+        return value.date()
+    return value
+
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> dt.date:
+    # n-th weekday of the month, or the last one when n is -1
+    if n < 0:
+        last = dt.date(year + month // 12, month % 12 + 1, 1) - dt.timedelta(days=1)
+        return last - dt.timedelta(days=(last.weekday() - weekday) % 7)
+    first = dt.date(year, month, 1)
+    return first + dt.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def observed(day: dt.date, saturday_to_friday: bool) -> dt.date:
+    if day.weekday() == 6:
+        return day + dt.timedelta(days=1)
+    if day.weekday() == 5 and saturday_to_friday:
+        return day - dt.timedelta(days=1)
+    return day
+
+
+def carrier_holidays(carrier: str, year: int) -> set[dt.date]:
+    if carrier == "ups":
+        days = [
+            dt.date(year, 1, 1),
+            nth_weekday(year, 5, 0, -1),  # Memorial Day
+            dt.date(year, 7, 4),
+            nth_weekday(year, 9, 0, 1),  # Labor Day
+            nth_weekday(year, 11, 3, 4),  # Thanksgiving
+            dt.date(year, 12, 25),
+        ]
+        return {observed(i, saturday_to_friday=True) for i in days}
+    if carrier == "usps":
+        # Federal holidays; USPS still delivers on the Friday before one
+        # that falls on a Saturday
+        days = [
+            dt.date(year, 1, 1),
+            nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+            nth_weekday(year, 2, 0, 3),  # Presidents' Day
+            nth_weekday(year, 5, 0, -1),  # Memorial Day
+            dt.date(year, 7, 4),
+            nth_weekday(year, 9, 0, 1),  # Labor Day
+            nth_weekday(year, 10, 0, 2),  # Columbus Day
+            dt.date(year, 11, 11),
+            nth_weekday(year, 11, 3, 4),  # Thanksgiving
+            dt.date(year, 12, 25),
+        ]
+        if year >= 2021:
+            days.append(dt.date(year, 6, 19))  # Juneteenth
+        return {observed(i, saturday_to_friday=False) for i in days}
+    return set()
+
+
+class BusinessCalendar:
+    # Service days between start and end as a bitmap over day offsets, with
+    # the number of service days before each offset and the offset of every
+    # service day, so adding business days is two list lookups.
+    def __init__(
+        self,
+        service_days: Iterable[int],
+        holidays: Iterable[dt.date],
+        start: dt.date,
+        end: dt.date,
+    ):
+        self.start = start.toordinal()
+        self.end = end.toordinal()
+        service_days = set(service_days)
+        holidays = {i.toordinal() for i in holidays}
+        self.is_open = bytearray(
+            dt.date.fromordinal(i).weekday() in service_days and i not in holidays
+            for i in range(self.start, self.end + 1)
+        )
+        self.before = [0]
+        for i in self.is_open:
+            self.before.append(self.before[-1] + i)
+        self.open_days = [i for i, is_open in enumerate(self.is_open) if is_open]
+        self._arrays = None
+
+    def covers(self, first: int, last: int) -> bool:
+        return self.start <= first and last <= self.end
+
+    def is_service_day(self, day) -> bool:
+        return bool(self.is_open[as_date(day).toordinal() - self.start])
+
+    def add_business_days(self, ship_date, days: int) -> dt.date:
+        # Pickup is the first service day on or after ship_date; the package
+        # arrives on the days-th service day after pickup
+        offset = as_date(ship_date).toordinal() - self.start
+        if offset < 0:
+            raise ValueError(f"{ship_date} is before the calendar start")
+        index = self.before[offset] + int(days)
+        if index >= len(self.open_days):
+            raise ValueError(f"{ship_date} + {days} days is past the calendar end")
+        return dt.date.fromordinal(self.start + self.open_days[index])
+
+    def add_business_days_batch(self, ship_ordinals, days):
+        # Vectorized add_business_days over day ordinals, as RateSet stores them
+        import numpy as np
+
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self.before, dtype=np.int64),
+                np.array(self.open_days, dtype=np.int64),
+            )
+        before, open_days = self._arrays
+        offsets = np.asarray(ship_ordinals, dtype=np.int64) - self.start
+        if offsets.size and (offsets.min() < 0 or offsets.max() >= len(self.is_open)):
+            raise ValueError("Ship dates outside the calendar range")
+        index = before[offsets] + np.asarray(days, dtype=np.int64)
+        if index.size and index.max() >= len(open_days):
+            raise ValueError("Arrival dates past the calendar end")
+        return open_days[index] + self.start
+
+
+def get_calendar(carrier: str, first=None, last=None) -> BusinessCalendar:
+    # Cached per carrier; rebuilt over a wider range of years when a date
+    # falls outside the current one
+    first = as_date(first).toordinal() if first else dt.date.today().toordinal()
+    last = max(as_date(last).toordinal() if last else first, first)
+    calendar = _calendars.get(carrier)
+    if calendar is None or not calendar.covers(first, last):
+        today = dt.date.today()
+        years = [dt.date.fromordinal(i).year for i in (first, last)]
+        if calendar is not None:
+            years += [dt.date.fromordinal(calendar.start).year]
+            years += [dt.date.fromordinal(calendar.end).year]
+        start_year = min(years + [today.year - 1])
+        end_year = max(years + [today.year + 2])
+        holidays = set()
+        for year in range(start_year, end_year + 1):
+            holidays |= carrier_holidays(carrier, year)
+        calendar = BusinessCalendar(
+            SERVICE_DAYS.get(carrier, WEEKDAYS),
+            holidays,
+            dt.date(start_year, 1, 1),
+            dt.date(end_year, 12, 31),
+        )
+        _calendars[carrier] = calendar
+    return calendar
+
+
+def transit_span(days) -> int:
+    # Calendar days that always contain `days` business days
+    return int(days) * 2 + 21
+
+
+def arrival_date(carrier: str, ship_date, days: int) -> dt.date:
+    ship_date = as_date(ship_date)
+    last = ship_date + dt.timedelta(days=transit_span(days))
+    return get_calendar(carrier, ship_date, last).add_business_days(ship_date, days)
+
+
+def arrival_ordinals(carrier: str, ship_ordinals, days):
+    import numpy as np
+
+    ship_ordinals = np.asarray(ship_ordinals, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    if not ship_ordinals.size:
+        return ship_ordinals
+    first = dt.date.fromordinal(int(ship_ordinals.min()))
+    last = dt.date.fromordinal(
+        int(ship_ordinals.max()) + transit_span(days.max(initial=0))
+    )
+    calendar = get_calendar(carrier, first, last)
+    return calendar.add_business_days_batch(ship_ordinals, days)
@@ -0,0 +1,227 @@
+import datetime as dt
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from shipping import metrics
+from shipping.business_days import as_date
+from shipping.common import Rate, RateRequest
+from shipping.quote import Rater
+
+
+def cache_key(carrier: str, rate_request: RateRequest, options: tuple = ()) -> str:
+    # options: rater settings that change the answer (UPS map_dir,
+    # ignore_ground), so differently configured raters don't share entries
+    origination = rate_request.origination
+    destination = rate_request.destination
+    packages = [
+        [
+            i.weight.to_ounces(),
+            sorted(
+                (i.dimensions.length, i.dimensions.width, i.dimensions.height),
+                reverse=True,
+            ),
+        ]
+        for i in rate_request.get_packages()
+    ]
+    return json.dumps(
+        [
+            carrier,
+            origination.zip_code,
+            origination.state or "",
+            origination.country or "",
+            destination.zip_code,
+            destination.state or "",
+            destination.country or "",
+            packages,
+            rate_request.ship_date.strftime("%Y-%m-%d"),
+            list(options),
+        ],
+        separators=(",", ":"),
+    )
+
+
+def expires_at(rate_request: RateRequest, ttl: float) -> float:
+    # Quotes also go stale once their ship date has passed
+    ship_date = rate_request.ship_date
+    stale_at = dt.datetime(ship_date.year, ship_date.month, ship_date.day)
+    stale_at += dt.timedelta(days=1)
+    return min(time.time() + ttl, stale_at.timestamp())
+
+
+def rates_to_json(rates: list[Rate]) -> str:
+    return json.dumps(
+        [
+            [
+                i.price,
+                i.service,
+                i.arrival.isoformat() if i.arrival else None,
+                i.carrier,
+                i.package,
+            ]
+            for i in rates
+        ]
+    )
+
+
+def rates_from_json(data: str) -> list[Rate]:
+    # Rows written before package was stored have four fields
+    return [
+        Rate(
+            price,
+            service,
+            as_date(arrival) if arrival else None,
+            carrier,
+            package[0] if package else None,
+        )
+        for price, service, arrival, carrier, *package in json.loads(data)
+    ]
+
+
+class MemoryCache:
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[list[Rate]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.time():
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return list(item[1])
+
+    def set(self, key: str, rates: list[Rate], expires: float):
+        with self._lock:
+            self._data[key] = (expires, tuple(rates))  # Rates are immutable
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class SQLiteCache:
+    PRUNE_EVERY = 100
+    TOUCH_EVERY = 100  # Hits between access-time writes
+
+    def __init__(self, path: str, maxsize: int = 100000):
+        self.path = path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._used = {}  # Access times not yet written, so reads don't write
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rates "
+                "(key TEXT PRIMARY KEY, rates TEXT, expires REAL, used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS rates_used ON rates (used)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")  # Shared between processes
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[list[Rate]]:
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT rates FROM rates WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._used[key] = now
+            flush = self.hits % self.TOUCH_EVERY == 0
+        if flush:
+            self._touch()
+        return rates_from_json(row[0])
+
+    def _touch(self):
+        with self._lock:
+            used, self._used = self._used, {}
+        if used:
+            with self._connection() as conn:
+                conn.executemany(
+                    "UPDATE rates SET used = ? WHERE key = ?",
+                    [(v, k) for k, v in used.items()],
+                )
+
+    def set(self, key: str, rates: list[Rate], expires: float):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO rates VALUES (?, ?, ?, ?)",
+                (key, rates_to_json(rates), expires, now),
+            )
+        with self._lock:
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY:
+                return
+        self._touch()  # Recent hits count when picking what to evict
+        with self._connection() as conn:
+            conn.execute("DELETE FROM rates WHERE expires <= ?", (now,))
+            conn.execute(
+                "DELETE FROM rates WHERE key IN (SELECT key FROM rates "
+                "ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+    def stats(self) -> dict:
+        size = self._connection().execute("SELECT COUNT(*) FROM rates").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+def open_cache(spec: str):
+    if spec == ":memory:":
+        return MemoryCache()
+    return SQLiteCache(spec)
+
+
+class CachedRater:
+    def __init__(
+        self,
+        carrier: str,
+        rater: Rater,
+        cache,
+        ttl: float = 3600,
+        options: tuple = (),
+    ):
+        self.carrier = carrier
+        self.rater = rater
+        self.cache = cache
+        self.ttl = ttl
+        self.options = options
+
+    def __call__(self, rate_request: RateRequest) -> list[Rate]:
+        key = cache_key(self.carrier, rate_request, self.options)
+        rates = self.cache.get(key)
+        metrics.inc(
+            "shipping_cache_requests_total",
+            carrier=self.carrier,
+            result="miss" if rates is None else "hit",
+        )
+        if rates is None:
+            rates = self.rater(rate_request)
+            self.cache.set(key, rates, expires_at(rate_request, self.ttl))
+        return rates
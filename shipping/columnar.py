@@ -0,0 +1,241 @@
+import datetime as dt
+import json
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from shipping.common import Dimensions, Location, Rate, RateRequest, Weight
+from shipping.selection import NO_ARRIVAL, RateSet
+
+EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+
+def to_day(value) -> np.datetime64:
+    if value is None or value == "":
+        return np.datetime64("NaT", "D")
+    if isinstance(value, dt.datetime):
+        value = value.date()
+    return np.datetime64(value, "D")
+
+
+class RequestBatch:
+    # ids are free-form, so they stay Python strings; zips fit ZIP+4
+    COLUMNS = {
+        "id": object,
+        "from_zip": "U10",
+        "from_state": "U2",
+        "to_zip": "U10",
+        "to_state": "U2",
+        "ounces": np.int32,
+        "length": np.int32,
+        "width": np.int32,
+        "height": np.int32,
+        "ship_date": "datetime64[D]",
+    }
+
+    def __init__(self, columns: dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["ounces"])
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["columns"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "RequestBatch":
+        values = {k: [] for k in cls.COLUMNS}
+        for i, row in enumerate(rows):
+            length, width, height = (int(j) for j in row["size"].split("x"))
+            values["id"].append(str(row.get("id") or i))
+            values["from_zip"].append(str(row["from_zip"]))
+            values["from_state"].append(row.get("from_state") or "")
+            values["to_zip"].append(str(row["to_zip"]))
+            values["to_state"].append(row.get("to_state") or "")
+            values["ounces"].append(int(row["ounces"]))
+            values["length"].append(length)
+            values["width"].append(width)
+            values["height"].append(height)
+            values["ship_date"].append(row.get("date") or dt.date.today().isoformat())
+        return cls({k: np.array(v, dtype=cls.COLUMNS[k]) for k, v in values.items()})
+
+    @classmethod
+    def from_file(cls, path: str) -> "RequestBatch":
+        # CSV or JSONL in the `shipping batch` input format
+        from shipping.batch import read_shipments
+
+        return cls.from_rows(read_shipments(path))
+
+    @classmethod
+    def from_dataframe(cls, df) -> "RequestBatch":
+        return cls({k: df[k].to_numpy(dtype=dtype) for k, dtype in cls.COLUMNS.items()})
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.columns, copy=False)
+
+    def request(self, i: int) -> RateRequest:
+        c = self.columns
+        return RateRequest(
+            origination=Location(
+                zip_code=str(c["from_zip"][i]), state=str(c["from_state"][i])
+            ),
+            destination=Location(
+                zip_code=str(c["to_zip"][i]), state=str(c["to_state"][i])
+            ),
+            weight=Weight(0, int(c["ounces"][i])),
+            dimensions=Dimensions(
+                int(c["length"][i]), int(c["width"][i]), int(c["height"][i])
+            ),
+            ship_date=c["ship_date"][i].astype(dt.date),
+        )
+
+    def __iter__(self) -> Iterator[RateRequest]:
+        return (self.request(i) for i in range(len(self)))
+
+    def to_jsonl(self, path: str):
+        c = self.columns
+        with open(path, "w") as f:
+            for i in range(len(self)):
+                row = {
+                    "id": str(c["id"][i]),
+                    "from_zip": str(c["from_zip"][i]),
+                    "from_state": str(c["from_state"][i]),
+                    "to_zip": str(c["to_zip"][i]),
+                    "to_state": str(c["to_state"][i]),
+                    "ounces": int(c["ounces"][i]),
+                    "size": f"{c['length'][i]}x{c['width'][i]}x{c['height'][i]}",
+                    "date": str(c["ship_date"][i]),
+                }
+                f.write(json.dumps(row) + "\n")
+
+
+class RateTable:
+    # Rates for many shipments as typed columns; carrier and service are codes
+    # into the carriers and services lists, package is -1 when unset.
+    def __init__(
+        self,
+        shipment: np.ndarray,
+        carrier: np.ndarray,
+        service: np.ndarray,
+        price: np.ndarray,
+        arrival: np.ndarray,
+        package: np.ndarray,
+        carriers: list[str],
+        services: list[str],
+    ):
+        self.shipment = shipment
+        self.carrier = carrier
+        self.service = service
+        self.price = price
+        self.arrival = arrival
+        self.package = package
+        self.carriers = carriers
+        self.services = services
+
+    def __len__(self):
+        return len(self.price)
+
+    @classmethod
+    def from_rates(cls, rate_lists: Iterable[list[Rate]]) -> "RateTable":
+        carriers, services = {}, {}
+        columns = ([], [], [], [], [], [])
+        for i, rates in enumerate(rate_lists):
+            for rate in rates:
+                columns[0].append(i)
+                columns[1].append(
+                    carriers.setdefault(rate.carrier or "", len(carriers))
+                )
+                columns[2].append(services.setdefault(rate.service, len(services)))
+                columns[3].append(float(rate.price))
+                columns[4].append(to_day(rate.arrival))
+                columns[5].append(-1 if rate.package is None else rate.package)
+        return cls(
+            np.array(columns[0], dtype=np.int64),
+            np.array(columns[1], dtype=np.int16),
+            np.array(columns[2], dtype=np.int32),
+            np.array(columns[3], dtype=np.float64),
+            np.array(columns[4], dtype="datetime64[D]"),
+            np.array(columns[5], dtype=np.int16),
+            list(carriers),
+            list(services),
+        )
+
+    @classmethod
+    def from_dataframe(cls, df) -> "RateTable":
+        carrier = df["carrier"].astype("category")
+        service = df["service"].astype("category")
+        return cls(
+            df["shipment"].to_numpy(dtype=np.int64),
+            carrier.cat.codes.to_numpy(dtype=np.int16),
+            service.cat.codes.to_numpy(dtype=np.int32),
+            df["price"].to_numpy(dtype=np.float64),
+            df["arrival"].to_numpy(dtype="datetime64[D]"),
+            df["package"].to_numpy(dtype=np.int16),
+            [str(i) for i in carrier.cat.categories],
+            [str(i) for i in service.cat.categories],
+        )
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.DataFrame(
+            {
+                "shipment": self.shipment,
+                "carrier": pd.Categorical.from_codes(self.carrier, self.carriers),
+                "service": pd.Categorical.from_codes(self.service, self.services),
+                "price": self.price,
+                "arrival": self.arrival,
+                "package": self.package,
+            },
+            copy=False,
+        )
+
+    def records(self, ids: Optional[list[str]] = None) -> Iterator[dict]:
+        # Fresh dicts every time; the table itself is never modified
+        arrival = np.datetime_as_string(self.arrival)
+        for i in range(len(self)):
+            shipment = int(self.shipment[i])
+            yield {
+                "shipment": ids[shipment] if ids else shipment,
+                "carrier": self.carriers[self.carrier[i]],
+                "service": self.services[self.service[i]],
+                "price": float(self.price[i]),
+                "arrival": None if arrival[i] == "NaT" else str(arrival[i]),
+                "package": None if self.package[i] < 0 else int(self.package[i]),
+            }
+
+    def to_jsonl(self, path: str, ids: Optional[list[str]] = None):
+        with open(path, "w") as f:
+            for record in self.records(ids):
+                f.write(json.dumps(record) + "\n")
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "RateTable":
+        import pandas as pd
+
+        df = pd.read_json(path, lines=True, convert_dates=False)
+        df["arrival"] = pd.to_datetime(df["arrival"])
+        df["package"] = df["package"].fillna(-1)
+        df["carrier"] = df["carrier"].fillna("")
+        return cls.from_dataframe(df)
+
+    def to_rate_set(self) -> RateSet:
+        # Whole-shipment rates only; per-package rows price a single box
+        rows = self.package < 0
+        code = self.carrier.astype(np.int32) * len(self.services) + self.service
+        names = [f"{c}:{s}" for c in self.carriers for s in self.services]
+        days = self.arrival.astype(np.int64) + EPOCH_ORDINAL
+        arrival = np.where(np.isnat(self.arrival), NO_ARRIVAL, days)
+        return RateSet(
+            self.shipment[rows],
+            self.price[rows],
+            arrival[rows].astype(np.int32),
+            code[rows],
+            names,
+            int(self.shipment.max(initial=-1)) + 1,
+        )
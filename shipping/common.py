@@ -3,7 +3,7 @@ from dataclasses import dataclass
 from typing import Optional
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Location:
     street: Optional[str] = None
     city: Optional[str] = None
@@ -12,7 +12,7 @@ class Location:
     country: Optional[str] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Weight:
     pounds: int
     ounces: int
@@ -29,7 +29,7 @@ class Weight:
         return self.pounds * 16 + self.ounces
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Dimensions:
     length: int  # Always the longest
     width: int
@@ -47,23 +47,41 @@ class Dimensions:
         return cls(length, width, height)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
+class Package:
+    weight: Weight
+    dimensions: Dimensions
+
+
+@dataclass(frozen=True, slots=True)
 class RateRequest:
-    origination: Location
+    origination: Optional[Location]  # None until a warehouse is chosen
     destination: Location
     weight: Weight
     dimensions: Dimensions
     ship_date: dt.date
+    packages: tuple[Package, ...] = ()
+
+    def get_packages(self) -> list[Package]:
+        # weight and dimensions describe the only package unless packages is set
+        return list(self.packages) or [Package(self.weight, self.dimensions)]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Rate:
     price: float
     service: str
     arrival: Optional[dt.date] = None
+    carrier: Optional[str] = None
+    # Index into RateRequest.get_packages() for one package of a multi-package
+    # quote; None when the rate covers the whole shipment
+    package: Optional[int] = None
 
     def to_dict(self):
-        out = self.__dict__
-        if out["arrival"]:
-            out["arrival"] = out["arrival"].strftime("%Y-%m-%d")
-        return out
+        return {
+            "price": self.price,
+            "service": self.service,
+            "arrival": self.arrival.strftime("%Y-%m-%d") if self.arrival else None,
+            "carrier": self.carrier,
+            "package": self.package,
+        }
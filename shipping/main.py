@@ -2,19 +2,21 @@ import datetime as dt
 import json
 import os
 import click
-import pandas as pd
 from dotenv import load_dotenv
-from tqdm import tqdm
 
+from shipping import metrics
 from shipping.common import Dimensions, Location, Rate, RateRequest, Weight
+from shipping.batch import rate_batch, row_to_rate_request
+from shipping.cache import CachedRater, open_cache
+from shipping.quote import Quote, quote as quote_rates
+from shipping.rates import get_best_rate, shipment_rates
 from shipping.ups import (
     get_rate as get_ups_rates,
-    create_ups_token,
-    get_ups_token,
     get_ups_zones,
+    UPSTokenProvider,
 )
 from shipping.usps import get_rate as get_usps_rates, get_usps_zones
-from shipping.ups_ground import download_map
+from shipping.transport import Transport, set_transport
 
 load_dotenv()
 
@@ -23,6 +25,16 @@ USPS_PASSWORD = os.getenv("USPS_PASSWORD")
 UPS_CLIENT_ID = os.getenv("UPS_CLIENT_ID")
 UPS_CLIENT_SECRET = os.getenv("UPS_CLIENT_SECRET")
 USER_AGENT = os.getenv("USER_AGENT")
+UPS_TOKEN_FILE = os.getenv("UPS_TOKEN_FILE") or ".ups_token"
+
+set_transport(
+    Transport(
+        connect_timeout=float(os.getenv("SHIPPING_CONNECT_TIMEOUT") or 5),
+        read_timeout=float(os.getenv("SHIPPING_READ_TIMEOUT") or 30),
+        retries=int(os.getenv("SHIPPING_RETRIES") or 3),
+    )
+)
+ups_tokens = UPSTokenProvider(UPS_CLIENT_ID, UPS_CLIENT_SECRET, UPS_TOKEN_FILE)
 
 
 def get_rate_request(
@@ -53,9 +65,8 @@ def get_ups(
         from_zip, from_state, to_zip, to_state, ounces, size, date
     )
     if new_token:
-        create_ups_token(UPS_CLIENT_ID, UPS_CLIENT_SECRET)
-    token = get_ups_token()
-    access_token = token["access_token"]
+        ups_tokens.refresh()
+    access_token = ups_tokens.access_token()
     return [
         i.to_dict()
         for i in get_ups_rates(access_token, rate_request, map_dir, ignore_ground)
@@ -71,9 +82,75 @@ def get_usps(from_zip, from_state, to_zip, to_state, ounces, size, date):
     ]
 
 
+def get_raters(
+    carriers: list[str],
+    map_dir: str = ".",
+    ignore_ground: bool = False,
+    cache=None,
+    cache_ttl: float = 3600,
+):
+    raters = {
+        "ups": lambda rate_request: get_ups_rates(
+            ups_tokens.access_token(), rate_request, map_dir, ignore_ground
+        ),
+        "usps": lambda rate_request: get_usps_rates(
+            USPS_USER_ID, USPS_PASSWORD, rate_request
+        ),
+    }
+    if cache is not None:
+        options = {"ups": (os.path.abspath(map_dir), ignore_ground)}
+        return {
+            i: CachedRater(i, raters[i], cache, cache_ttl, options.get(i, ()))
+            for i in carriers
+        }
+    return {i: raters[i] for i in carriers}
+
+
+def get_quote(
+    from_zip,
+    from_state,
+    to_zip,
+    to_state,
+    ounces,
+    size,
+    date,
+    carriers,
+    deadline,
+    map_dir,
+    ignore_ground,
+    cache=None,
+    cache_ttl=3600,
+) -> Quote:
+    rate_request = get_rate_request(
+        from_zip, from_state, to_zip, to_state, ounces, size, date
+    )
+    raters = get_raters(carriers, map_dir, ignore_ground, cache, cache_ttl)
+    return quote_rates(rate_request, raters, deadline)
+
+
+def print_profile():
+    click.echo(
+        f"{'stage':<12} {'carrier':<8} {'count':>6} {'total ms':>10} {'mean ms':>9}",
+        err=True,
+    )
+    for row in metrics.registry.profile():
+        click.echo(
+            f"{row['stage']:<12} {row.get('carrier', ''):<8} {row['count']:>6} "
+            f"{row['total_ms']:>10.1f} {row['mean_ms']:>9.1f}",
+            err=True,
+        )
+    for row in metrics.registry.snapshot()["counters"]:
+        labels = ",".join(f"{k}={v}" for k, v in row["labels"].items())
+        click.echo(f"{row['name']}{{{labels}}} {row['value']}", err=True)
+
+
 @click.group()
-def cli():
-    pass
+@click.option("--profile", is_flag=True, help="Print a per-stage timing breakdown")
+@click.pass_context
+def cli(ctx, profile):
+    if profile:
+        metrics.enable()
+        ctx.call_on_close(print_profile)
 
 
 @cli.command()
@@ -102,7 +179,7 @@ def ups(
     to_state, to_zip = to_loc.split(",")
     date = dt.datetime.strptime(date, "%Y-%m-%d")
     if download_maps:
-        download_ups_maps(from_zip, map_dir)
+        download_ups_maps([from_zip], map_dir)
     rates = get_ups(
         from_zip,
         "",
@@ -120,8 +197,7 @@ def ups(
 
 @cli.command()
 def ups_token():
-    create_ups_token(UPS_CLIENT_ID, UPS_CLIENT_SECRET)
-    click.echo(json.dumps(get_ups_token()))
+    click.echo(json.dumps(ups_tokens.refresh()))
 
 
 @cli.command()
@@ -138,27 +214,271 @@ def usps(from_zip, to_zip, ounces, size, date):
     click.echo(json.dumps(rates))
 
 
-def download_ups_maps(zip_codes: list[str], map_dir: str):
-    os.chdir(map_dir)
-    maps = {"file_name": [], "zip_code": []}
-    for zip_code in tqdm(zip_codes):
-        file_name = download_map(zip_code, USER_AGENT)
-        maps["file_name"].append(file_name)
-        maps["zip_code"].append(str(zip_code))
-    pd.DataFrame(maps).to_csv(f"maps.csv", index=False)
+@cli.command()
+@click.option("-f", "--from-zip", type=str)
+@click.option("-t", "--to-loc", type=str, help="state,zip_code")
+@click.option("-z", "--ounces", type=int)
+@click.option("-s", "--size", type=str)
+@click.option(
+    "-d", "--date", type=str, default=dt.datetime.today().strftime("%Y-%m-%d")
+)
+@click.option("-c", "--carriers", type=str, default="ups,usps")
+@click.option("--deadline", type=float, default=10.0, help="Seconds per carrier")
+@click.option("--map-dir", type=str, default=".")
+@click.option("--ignore-ground", is_flag=True)
+@click.option("--cache", type=str, default=None, help="SQLite path or :memory:")
+@click.option("--cache-ttl", type=float, default=3600, help="Seconds")
+def quote(
+    from_zip,
+    to_loc,
+    ounces,
+    size,
+    date,
+    carriers,
+    deadline,
+    map_dir,
+    ignore_ground,
+    cache,
+    cache_ttl,
+):
+    to_state, to_zip = to_loc.split(",")
+    date = dt.datetime.strptime(date, "%Y-%m-%d")
+    result = get_quote(
+        from_zip,
+        "",
+        to_zip,
+        to_state,
+        ounces,
+        size,
+        date,
+        carriers.split(","),
+        deadline,
+        map_dir,
+        ignore_ground,
+        open_cache(cache) if cache else None,
+        cache_ttl,
+    )
+    click.echo(json.dumps(result.to_dict()))
+
+
+@cli.command()
+@click.argument("input-path", type=str)
+@click.option("-o", "--output", type=str, required=True, help="JSONL results")
+@click.option("-c", "--carriers", type=str, default="ups,usps")
+@click.option("-n", "--concurrency", type=int, default=8)
+@click.option(
+    "--rate-limit", type=str, multiple=True, help="carrier=requests_per_second"
+)
+@click.option("--deadline", type=float, default=10.0, help="Seconds per carrier")
+@click.option("--map-dir", type=str, default=".")
+@click.option("--ignore-ground", is_flag=True)
+@click.option("--resume", is_flag=True, help="Skip ids already rated without errors")
+@click.option("--cache", type=str, default=None, help="SQLite path or :memory:")
+@click.option("--cache-ttl", type=float, default=3600, help="Seconds")
+def batch(
+    input_path,
+    output,
+    carriers,
+    concurrency,
+    rate_limit,
+    deadline,
+    map_dir,
+    ignore_ground,
+    resume,
+    cache,
+    cache_ttl,
+):
+    rate_limits = {k: float(v) for k, v in (i.split("=") for i in rate_limit)}
+    cache = open_cache(cache) if cache else None
+    summary = rate_batch(
+        input_path,
+        output,
+        get_raters(carriers.split(","), map_dir, ignore_ground, cache, cache_ttl),
+        concurrency,
+        rate_limits,
+        deadline,
+        resume,
+    )
+    stats = summary.to_dict()
+    if cache is not None:
+        stats["cache"] = cache.stats()
+    click.echo(json.dumps(stats), err=True)
+
+
+@cli.command()
+@click.option("-f", "--from-zip", type=str)
+@click.option("-t", "--to-loc", type=str, help="state,zip_code")
+@click.option("-z", "--ounces", type=int, help="Item weight")
+@click.option("-s", "--size", type=str, help="Item dimensions")
+@click.option("-b", "--boxes", type=str, help="CSV with name,size,tare_ounces")
+@click.option("-a", "--arrive-by", type=str, help="%Y-%m-%d")
+@click.option(
+    "-d", "--date", type=str, default=dt.datetime.today().strftime("%Y-%m-%d")
+)
+@click.option("-c", "--carriers", type=str, default="ups,usps")
+@click.option("--map-dir", type=str, default=".")
+@click.option("--ignore-ground", is_flag=True)
+def box(
+    from_zip,
+    to_loc,
+    ounces,
+    size,
+    boxes,
+    arrive_by,
+    date,
+    carriers,
+    map_dir,
+    ignore_ground,
+):
+    from shipping.boxes import load_boxes, pick_box
+
+    to_state, to_zip = to_loc.split(",")
+    date = dt.datetime.strptime(date, "%Y-%m-%d")
+    rate_request = get_rate_request(from_zip, "", to_zip, to_state, ounces, size, date)
+    box_rate = pick_box(
+        rate_request,
+        rate_request.dimensions,
+        rate_request.weight,
+        load_boxes(boxes),
+        get_raters(carriers.split(","), map_dir, ignore_ground),
+        dt.datetime.strptime(arrive_by, "%Y-%m-%d").date(),
+    )
+    click.echo(
+        json.dumps(
+            {
+                "box": box_rate.box.name,
+                "size": str(box_rate.box.dimensions),
+                **box_rate.rate.to_dict(),
+            }
+        )
+    )
+
+
+@cli.command()
+@click.option("--host", type=str, default="127.0.0.1")
+@click.option("-p", "--port", type=int, default=8080)
+@click.option("--deadline", type=float, default=10.0, help="Seconds per carrier")
+@click.option("--map-dir", type=str, default=".")
+@click.option("--ignore-ground", is_flag=True)
+@click.option("--cache", type=str, default=":memory:", help="SQLite path or :memory:")
+@click.option("--cache-ttl", type=float, default=3600, help="Seconds")
+@click.option("--zone-db", type=str, default=":memory:", help="SQLite zone store")
+@click.option("--zone-snapshot", type=str, default=None, help="Packed zone file")
+def serve(
+    host,
+    port,
+    deadline,
+    map_dir,
+    ignore_ground,
+    cache,
+    cache_ttl,
+    zone_db,
+    zone_snapshot,
+):
+    from shipping.server import serve as serve_routes
+    from shipping.ups_ground import load_ground_table
+    from shipping.zones import ZoneStore
+
+    raters = get_raters(
+        ["ups", "usps"], map_dir, ignore_ground, open_cache(cache), cache_ttl
+    )
+    store = ZoneStore(zone_db, snapshot=zone_snapshot)
+    load_ground_table(map_dir)  # Warm the ground transit table
+    metrics.enable()  # Served on /metrics and /metrics/prometheus
+
+    def quote_route(data):
+        carriers = data.get("carriers") or list(raters)
+        rate_request = row_to_rate_request(data)
+        carrier_raters = {i: raters[i] for i in carriers}
+        return quote_rates(rate_request, carrier_raters, deadline)
+
+    def best_rate_route(data):
+        arrive_by = dt.datetime.strptime(data["arrive_by"], "%Y-%m-%d").date()
+        rates = shipment_rates(quote_route(data).rates)
+        return get_best_rate(rates, arrive_by).to_dict()
+
+    def zones_route(data):
+        to_zips = data["to_zips"]
+        if not isinstance(to_zips, list) or not all(
+            isinstance(i, str) for i in to_zips
+        ):
+            raise ValueError("to_zips must be a list of ZIP code strings")
+        zone_df = get_zones(data["from_zip"], to_zips, store)
+        return zone_df.to_dict(orient="records")
+
+    click.echo(f"Listening on http://{host}:{port}", err=True)
+    serve_routes(
+        {
+            "/quote": lambda data: quote_route(data).to_dict(),
+            "/best-rate": best_rate_route,
+            "/zones": zones_route,
+        },
+        host,
+        port,
+    )
+
+
+def download_ups_maps(
+    zip_codes: list[str], map_dir: str, max_age_days: float = 7, concurrency: int = 8
+):
+    from tqdm import tqdm
+
+    from shipping.ups_ground import download_maps, index_maps
+
+    with tqdm(unit="map") as bar:
+
+        def total(count):
+            bar.total = count
+            bar.refresh()
+
+        errors = download_maps(
+            zip_codes,
+            USER_AGENT,
+            map_dir,
+            max_age_days,
+            concurrency,
+            progress=lambda: bar.update(),
+            total=total,
+        )
+    for zip_code, error in errors.items():
+        click.echo(f"{zip_code}: {error}", err=True)
+    index_maps(map_dir)
 
 
 @cli.command()
 @click.argument("from-zips", type=str)
 @click.option("-d", "--map-dir", type=str, default=".")
-def ups_maps(from_zips, map_dir):
+@click.option("--max-age", type=float, default=7, help="Refresh maps older than (days)")
+@click.option("-n", "--concurrency", type=int, default=8)
+def ups_maps(from_zips, map_dir, max_age, concurrency):
     from_zips = from_zips.split(",")
-    download_ups_maps(from_zips, map_dir)
+    download_ups_maps(from_zips, map_dir, max_age, concurrency)
 
 
-def get_zones(from_zip, to_zips):
-    ups_zones = get_ups_zones(from_zip, to_zips, USER_AGENT)
-    usps_zones = get_usps_zones(from_zip, to_zips, USER_AGENT)
+@cli.command()
+@click.option("-d", "--map-dir", type=str, default=".")
+@click.option("-n", "--workers", type=int, default=None, help="Processes (all cores)")
+def ups_maps_index(map_dir, workers):
+    from tqdm import tqdm
+
+    from shipping.ups_ground import index_maps
+
+    with tqdm(unit="map") as bar:
+        stats = index_maps(map_dir, workers, progress=lambda: bar.update())
+    click.echo(json.dumps(stats))
+
+
+cli.add_command(ups_maps_index, "ups-ground-table")  # Older name, same command
+
+
+def get_zones(from_zip, to_zips, store=None):
+    import pandas as pd
+
+    from shipping.zones import ZoneStore
+
+    store = store or ZoneStore()
+    ups_zones = get_ups_zones(from_zip, to_zips, USER_AGENT, store=store)
+    usps_zones = get_usps_zones(from_zip, to_zips, USER_AGENT, store=store)
     return pd.DataFrame(
         {
             "from_zip": [from_zip] * len(to_zips),
@@ -172,11 +492,162 @@ def get_zones(from_zip, to_zips):
 @cli.command()
 @click.argument("from-zip", type=str)
 @click.argument("to-zips", type=str)
-def zones(from_zip, to_zips):
+@click.option("--zone-db", type=str, default=":memory:", help="SQLite zone store")
+def zones(from_zip, to_zips, zone_db):
+    from shipping.zones import ZoneStore
+
     to_zips = to_zips.split(",")
-    zone_df = get_zones(from_zip, to_zips)
+    zone_df = get_zones(from_zip, to_zips, ZoneStore(zone_db))
     click.echo(zone_df.to_csv(index=False))
 
 
+@cli.command()
+@click.argument("origins-path", type=str)
+@click.argument("destinations-path", type=str)
+@click.option("-o", "--output", type=str, required=True, help=".csv or .parquet")
+@click.option("-c", "--carriers", type=str, default="ups,usps")
+@click.option("-n", "--concurrency", type=int, default=8)
+@click.option("--zone-db", type=str, default=":memory:", help="SQLite zone store")
+@click.option(
+    "--snapshot", type=str, default=None, help="Also write a packed zone file"
+)
+def zones_matrix(
+    origins_path, destinations_path, output, carriers, concurrency, zone_db, snapshot
+):
+    from shipping.zones import (
+        ZoneStore,
+        open_matrix_writer,
+        read_zip_codes,
+        representatives,
+        zone_matrix,
+    )
+
+    carriers = carriers.split(",")
+    origins = read_zip_codes(origins_path)
+    destinations = read_zip_codes(destinations_path)
+    store = ZoneStore(zone_db)
+    writer = open_matrix_writer(output, carriers)
+    try:
+        errors = zone_matrix(
+            origins,
+            destinations,
+            USER_AGENT,
+            store,
+            writer.write,
+            carriers,
+            concurrency,
+        )
+    finally:
+        writer.close()
+    for key, error in errors.items():
+        click.echo(f"{key}: {error}", err=True)
+    origin3, dest3 = len(representatives(origins)), len(representatives(destinations))
+    click.echo(f"{origin3} origin x {dest3} destination prefixes", err=True)
+    if snapshot:
+        click.echo(f"{store.export(snapshot)} origin prefixes in {snapshot}", err=True)
+
+
+@cli.command()
+@click.argument("input-path", type=str)
+@click.option(
+    "-w", "--warehouses", type=str, required=True, help="CSV with name,zip_code,state"
+)
+@click.option("-o", "--output", type=str, required=True, help="JSONL assignments")
+@click.option(
+    "--rate-card",
+    type=str,
+    default=None,
+    help="CSV with carrier,service,zone,weight,price",
+)
+@click.option("--live", is_flag=True, help="Confirm with carrier quotes")
+@click.option(
+    "--top", type=int, default=None, help="Warehouses quoted per order with --live"
+)
+@click.option("-a", "--arrive-by", type=str, default=None, help="%Y-%m-%d")
+@click.option("-c", "--carriers", type=str, default="ups,usps")
+@click.option("-n", "--concurrency", type=int, default=8)
+@click.option("--deadline", type=float, default=10.0, help="Seconds per carrier")
+@click.option("--map-dir", type=str, default=".")
+@click.option("--ignore-ground", is_flag=True)
+@click.option("--zone-db", type=str, default=":memory:", help="SQLite zone store")
+@click.option("--zone-snapshot", type=str, default=None, help="Packed zone file")
+def warehouses(
+    input_path,
+    warehouses,
+    output,
+    rate_card,
+    live,
+    top,
+    arrive_by,
+    carriers,
+    concurrency,
+    deadline,
+    map_dir,
+    ignore_ground,
+    zone_db,
+    zone_snapshot,
+):
+    from shipping.batch import read_shipments
+    from shipping.ratecard import RateCard
+    from shipping.selection import NO_ARRIVAL, to_ordinal
+    from shipping.warehouses import WarehouseSelector, load_warehouses
+    from shipping.zones import ZoneStore
+
+    carriers = carriers.split(",")
+    sites = load_warehouses(warehouses)
+    selector = WarehouseSelector(
+        sites,
+        ZoneStore(zone_db, snapshot=zone_snapshot),
+        USER_AGENT,
+        carriers,
+        map_dir,
+        RateCard.from_csv(rate_card) if rate_card else None,
+        concurrency,
+    )
+    # Orders have no origin; a row's arrive_by column overrides --arrive-by.
+    # Results keep input order; a repeated id gets an error row of its own.
+    slots, rate_requests, limits, results, seen = [], [], [], [], set()
+    for row in read_shipments(input_path):
+        results.append({"id": row["id"]})
+        if row["id"] in seen:
+            results[-1]["error"] = "Duplicate order id"
+            continue
+        seen.add(row["id"])
+        try:
+            rate_request = row_to_rate_request(row, origin=False)
+            date = row.get("arrive_by") or arrive_by
+            limit = (
+                to_ordinal(dt.datetime.strptime(date, "%Y-%m-%d"))
+                if date
+                else NO_ARRIVAL
+            )
+        except Exception as e:
+            results[-1]["error"] = str(e) or type(e).__name__
+            continue
+        slots.append(results[-1])
+        rate_requests.append(rate_request)
+        limits.append(limit)
+    selector.load([i.destination.zip_code for i in rate_requests])
+    raters = get_raters(carriers, map_dir, ignore_ground) if live else None
+    assignments = selector.select(
+        rate_requests,
+        limits,
+        raters,
+        deadline,
+        top,
+    )
+    for result, assignment in zip(slots, assignments):
+        if assignment is None:
+            result["error"] = "No rate meets the deadline"
+        else:
+            result.update(assignment.to_dict())
+    with open(output, "w") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    for key, error in selector.errors.items():
+        click.echo(f"{key}: {error}", err=True)
+    click.echo(json.dumps(selector.stats), err=True)
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,200 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_SECONDS = "shipping_stage_seconds"
+
+_disabled = nullcontext()
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+def label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = [
+        '{}="{}"'.format(
+            k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for k, v in key + extra
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Timer:
+    def __init__(self, registry: "Registry", name: str, labels: dict):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(
+            self.name, time.perf_counter() - self.start, **self.labels
+        )
+        return False
+
+
+class Stage(Timer):
+    # Records self time: time spent in stages entered inside this one is left
+    # out, so the stages in a profile are disjoint and add up to the total
+    def __enter__(self):
+        self.nested = 0.0
+        self.parent = _current_stage.get()
+        self.token = _current_stage.set(self)
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _current_stage.reset(self.token)
+        if self.parent is not None:
+            self.parent.nested += elapsed
+        self.registry.observe(self.name, elapsed - self.nested, **self.labels)
+        return False
+
+
+class Registry:
+    # Counters and histograms keyed by name and sorted label pairs. Disabled
+    # registries skip all bookkeeping, so hooks cost one attribute check.
+    def __init__(self, enabled: bool = False, buckets: tuple = BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels):
+        if not self.enabled:
+            return _disabled
+        return Timer(self, name, labels)
+
+    def stage(self, name: str, **labels):
+        if not self.enabled:
+            return _disabled
+        return Stage(self, STAGE_SECONDS, {"stage": name, **labels})
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(key), "value": value}
+                    for (name, key), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(key),
+                        "count": i.count,
+                        "sum": round(i.sum, 6),
+                    }
+                    for (name, key), i in sorted(self.histograms.items())
+                ],
+            }
+
+    def profile(self) -> list[dict]:
+        # Per-stage totals, slowest first
+        with self._lock:
+            rows = [
+                {
+                    **dict(key),
+                    "count": i.count,
+                    "total_ms": round(i.sum * 1000, 3),
+                    "mean_ms": round(i.sum * 1000 / i.count, 3),
+                }
+                for (name, key), i in self.histograms.items()
+                if name == STAGE_SECONDS and i.count
+            ]
+        return sorted(rows, key=lambda x: x["total_ms"], reverse=True)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE {name} counter")
+                for (other, key), value in sorted(self.counters.items()):
+                    if other == name:
+                        lines.append(f"{name}{format_labels(key)} {value}")
+            names = sorted({name for name, _ in self.histograms})
+            for name in names:
+                lines.append(f"# TYPE {name} histogram")
+                for (other, key), i in sorted(self.histograms.items()):
+                    if other != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + ("+Inf",), i.counts):
+                        cumulative += count
+                        labels = format_labels(key, (("le", str(bound)),))
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(key)} {i.sum}")
+                    lines.append(f"{name}_count{format_labels(key)} {i.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def enable():
+    registry.enabled = True
+
+
+# Module-level hooks check the flag before doing anything else, so
+# disabled instrumentation costs one attribute lookup per call
+
+
+def inc(name: str, value: float = 1, **labels):
+    if registry.enabled:
+        registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    if registry.enabled:
+        registry.observe(name, value, **labels)
+
+
+def stage(name: str, **labels):
+    if not registry.enabled:
+        return _disabled
+    return registry.stage(name, **labels)
@@ -0,0 +1,162 @@
+import mmap
+import os
+import struct
+import time
+from collections.abc import Mapping
+from typing import Iterable, Optional
+
+import numpy as np
+
+MAGIC = b"SHPK"
+VERSION = 1
+GROUND_DAYS = 1  # Layer "ups": origin ZIP x destination state
+ZONES = 2  # One layer per carrier: origin prefix x destination prefix
+
+# magic, version, kind, layers, rows, columns, row key width, column key
+# width, data dtype (numpy str), created (unix seconds)
+HEADER = struct.Struct("<4sHHHIIHH4sq")
+LAYER_WIDTH = 8
+ALIGN = 8
+
+
+def pack_keys(keys: Iterable[str], width: int) -> bytes:
+    return b"".join(i.encode("ascii").ljust(width, b"\0") for i in keys)
+
+
+def write_packed(
+    path: str,
+    kind: int,
+    layers: list[str],
+    rows: list[str],
+    columns: list[str],
+    data: np.ndarray,
+    created: Optional[float] = None,
+):
+    # Header, layer names, sorted row and column keys, then a
+    # [layer, row, column] array. Written to a temp file and renamed, so
+    # processes that have the old file mapped keep reading it unchanged.
+    if list(rows) != sorted(rows) or list(columns) != sorted(columns):
+        raise ValueError("Row and column keys must be sorted")
+    if data.shape != (len(layers), len(rows), len(columns)):
+        raise ValueError(
+            f"Data shape {data.shape} doesn't match "
+            f"{(len(layers), len(rows), len(columns))}"
+        )
+    data = np.ascontiguousarray(data, dtype=data.dtype.newbyteorder("<"))
+    row_width = max((len(i) for i in rows), default=1)
+    column_width = max((len(i) for i in columns), default=1)
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        kind,
+        len(layers),
+        len(rows),
+        len(columns),
+        row_width,
+        column_width,
+        data.dtype.str.encode(),
+        int(time.time() if created is None else created),
+    )
+    body = (
+        header
+        + pack_keys(layers, LAYER_WIDTH)
+        + pack_keys(rows, row_width)
+        + pack_keys(columns, column_width)
+    )
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(body + b"\0" * (-len(body) % ALIGN))
+        f.write(data.tobytes())
+    os.replace(f"{path}.tmp", path)
+
+
+class PackedTable:
+    # Read-only view over a packed file. Nothing is parsed beyond the header:
+    # keys and data are numpy views into the mapping, so every process
+    # opening the same file shares one page-cache copy.
+    def __init__(self, path: str, kind: Optional[int] = None):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            raise ValueError(f"{path} is not a packed table")
+        (
+            magic,
+            version,
+            self.kind,
+            layers,
+            rows,
+            columns,
+            row_width,
+            column_width,
+            dtype,
+            self.created,
+        ) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a packed table")
+        if version != VERSION:
+            raise ValueError(f"{path} is version {version}, expected {VERSION}")
+        if kind is not None and self.kind != kind:
+            raise ValueError(f"{path} holds kind {self.kind}, expected {kind}")
+        offset = HEADER.size
+        names = np.frombuffer(self._mmap, f"S{LAYER_WIDTH}", layers, offset)
+        self.layers = {name.decode(): i for i, name in enumerate(names)}
+        offset += layers * LAYER_WIDTH
+        self.rows = np.frombuffer(self._mmap, f"S{row_width}", rows, offset)
+        offset += rows * row_width
+        self.columns = np.frombuffer(self._mmap, f"S{column_width}", columns, offset)
+        offset += columns * column_width
+        offset += -offset % ALIGN
+        dtype = np.dtype(dtype.rstrip(b"\0").decode())
+        size = layers * rows * columns
+        if len(self._mmap) < offset + size * dtype.itemsize:
+            raise ValueError(f"{path} is truncated")
+        self.data = np.frombuffer(self._mmap, dtype, size, offset).reshape(
+            layers, rows, columns
+        )
+
+    @staticmethod
+    def _find(keys: np.ndarray, key: str) -> int:
+        key = key.encode()
+        i = int(np.searchsorted(keys, key))
+        return i if i < len(keys) and keys[i] == key else -1
+
+    def row(self, layer: str, key: str) -> Optional[np.ndarray]:
+        if layer not in self.layers:
+            return None
+        i = self._find(self.rows, key)
+        return None if i < 0 else self.data[self.layers[layer], i]
+
+    def get(self, layer: str, row: str, column: str):
+        # 0 when the layer, row or column is missing
+        values = self.row(layer, row)
+        j = self._find(self.columns, column)
+        return 0 if values is None or j < 0 else values[j]
+
+    def keys(self) -> list[tuple[str, str]]:
+        # (layer, row) for every row of every layer
+        return [(k, i.decode()) for k in self.layers for i in self.rows]
+
+
+class PackedMapping(Mapping):
+    # (row, column) -> value for one layer, with 0 meaning missing; stands in
+    # for the dict the CSV tables load into
+    def __init__(self, table: PackedTable, layer: str):
+        self.table = table
+        self.layer = layer
+
+    def __getitem__(self, key):
+        value = self.table.get(self.layer, *key)
+        if not value:
+            raise KeyError(key)
+        return int(value)
+
+    def __iter__(self):
+        if self.layer not in self.table.layers:
+            return
+        values = self.table.data[self.table.layers[self.layer]]
+        for i, j in zip(*np.nonzero(values)):
+            yield self.table.rows[i].decode(), self.table.columns[j].decode()
+
+    def __len__(self):
+        if self.layer not in self.table.layers:
+            return 0
+        return int(np.count_nonzero(self.table.data[self.table.layers[self.layer]]))
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Union
+
+from shipping import metrics
+from shipping.common import Rate, RateRequest
+
+Rater = Callable[[RateRequest], list[Rate]]
+
+DEFAULT_DEADLINE = 10.0
+
+
+@dataclass
+class CarrierResult:
+    carrier: str
+    rates: list[Rate] = field(default_factory=list)
+    error: Optional[str] = None
+    latency: float = 0.0
+
+    def to_dict(self):
+        return {"error": self.error, "latency": round(self.latency, 4)}
+
+
+@dataclass
+class Quote:
+    rates: list[Rate]
+    carriers: list[CarrierResult]
+
+    def to_dict(self):
+        return {
+            "rates": [i.to_dict() for i in self.rates],
+            "carriers": {i.carrier: i.to_dict() for i in self.carriers},
+        }
+
+
+def carrier_deadline(deadline: Union[float, dict[str, float]], carrier: str) -> float:
+    if isinstance(deadline, dict):
+        return deadline.get(carrier, DEFAULT_DEADLINE)
+    return deadline
+
+
+async def quote_carrier(
+    carrier: str,
+    rater: Rater,
+    rate_request: RateRequest,
+    deadline: float,
+    executor: ThreadPoolExecutor = None,
+) -> CarrierResult:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        rates = await asyncio.wait_for(
+            loop.run_in_executor(executor, rater, rate_request), deadline
+        )
+        latency = time.perf_counter() - start
+        metrics.observe("shipping_carrier_seconds", latency, carrier=carrier)
+        return CarrierResult(carrier, rates, latency=latency)
+    except asyncio.TimeoutError:
+        error = f"Timed out after {deadline}s"
+        reason = "timeout"
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        reason = type(e).__name__
+    latency = time.perf_counter() - start
+    metrics.observe("shipping_carrier_seconds", latency, carrier=carrier)
+    metrics.inc("shipping_carrier_errors_total", carrier=carrier, reason=reason)
+    return CarrierResult(carrier, error=error, latency=latency)
+
+
+async def quote_async(
+    rate_request: RateRequest,
+    raters: dict[str, Rater],
+    deadline: Union[float, dict[str, float]] = DEFAULT_DEADLINE,
+    executor: ThreadPoolExecutor = None,
+) -> Quote:
+    results = await asyncio.gather(
+        *(
+            quote_carrier(
+                carrier,
+                rater,
+                rate_request,
+                carrier_deadline(deadline, carrier),
+                executor,
+            )
+            for carrier, rater in raters.items()
+        )
+    )
+    rates = [rate for result in results for rate in result.rates]
+    return Quote(rates, list(results))
+
+
+def quote(
+    rate_request: RateRequest,
+    raters: dict[str, Rater],
+    deadline: Union[float, dict[str, float]] = DEFAULT_DEADLINE,
+) -> Quote:
+    # A private pool so a carrier past its deadline doesn't hold up asyncio.run
+    executor = ThreadPoolExecutor(max_workers=len(raters) or 1)
+    try:
+        return asyncio.run(quote_async(rate_request, raters, deadline, executor))
+    finally:
+        executor.shutdown(wait=False)
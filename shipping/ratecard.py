@@ -0,0 +1,178 @@
+import csv
+import random
+from collections import defaultdict
+from typing import Optional
+
+import numpy as np
+
+from shipping import metrics
+from shipping.common import Rate, RateRequest
+from shipping.quote import Rater
+from shipping.rates import shipment_rates
+from shipping.transport import Transport
+from shipping.ups import get_ups_zones
+from shipping.usps import get_usps_zones
+
+DIM_DIVISORS = {"ups": 139, "usps": 166}
+USPS_DIM_MIN_VOLUME = 1728  # USPS only applies dimensional weight above 1 cu ft
+
+
+def billable_pounds(carrier, ounces, length, width, height) -> np.ndarray:
+    ounces = np.asarray(ounces, dtype=np.float64)
+    volume = (
+        np.asarray(length, dtype=np.float64)
+        * np.asarray(width, dtype=np.float64)
+        * np.asarray(height, dtype=np.float64)
+    )
+    dim_pounds = np.ceil(volume / DIM_DIVISORS[carrier])
+    if carrier == "usps":
+        dim_pounds = np.where(volume > USPS_DIM_MIN_VOLUME, dim_pounds, 0)
+    pounds = np.maximum(np.ceil(ounces / 16), dim_pounds)
+    return np.maximum(pounds, 1).astype(np.intp)
+
+
+class RateCard:
+    # Prices per (carrier, service) as a [zone, billable pound] array with NaN
+    # where the service isn't offered.
+    def __init__(self, cards: dict[tuple[str, str], np.ndarray]):
+        self.cards = cards
+
+    @classmethod
+    def from_csv(cls, path: str) -> "RateCard":
+        rows = defaultdict(list)
+        with open(path, "r", newline="") as f:
+            for row in csv.DictReader(f):
+                rows[(row["carrier"], row["service"])].append(
+                    (int(row["zone"]), int(row["weight"]), float(row["price"]))
+                )
+        cards = {}
+        for key, prices in rows.items():
+            zones, weights, values = (np.array(i) for i in zip(*prices))
+            card = np.full((zones.max() + 1, weights.max() + 1), np.nan)
+            card[zones, weights] = values
+            cards[key] = card
+        return cls(cards)
+
+    def services(self, carrier: str) -> list[str]:
+        return [service for c, service in self.cards if c == carrier]
+
+    def price_batch(
+        self, carrier: str, zones, ounces, length, width, height
+    ) -> dict[str, np.ndarray]:
+        zones = np.asarray(zones, dtype=np.intp)
+        pounds = billable_pounds(carrier, ounces, length, width, height)
+        output = {}
+        for service in self.services(carrier):
+            card = self.cards[(carrier, service)]
+            valid = (zones >= 0) & (zones < card.shape[0]) & (pounds < card.shape[1])
+            prices = np.full(len(zones), np.nan)
+            prices[valid] = card[zones[valid], pounds[valid]]
+            output[service] = prices
+        return output
+
+    def rates(
+        self, carrier: str, rate_requests: list[RateRequest], zones
+    ) -> list[list[Rate]]:
+        dims = np.array(
+            [
+                (i.dimensions.length, i.dimensions.width, i.dimensions.height)
+                for i in rate_requests
+            ]
+        ).reshape(-1, 3)
+        prices = self.price_batch(
+            carrier,
+            zones,
+            [i.weight.to_ounces() for i in rate_requests],
+            dims[:, 0],
+            dims[:, 1],
+            dims[:, 2],
+        )
+        output = [[] for _ in rate_requests]
+        for service, service_prices in prices.items():
+            for i in np.flatnonzero(~np.isnan(service_prices)):
+                output[i].append(
+                    Rate(f"{service_prices[i]:.2f}", service, carrier=carrier)
+                )
+        return output
+
+
+def get_zones(
+    carrier: str,
+    rate_requests: list[RateRequest],
+    user_agent: str,
+    transport: Transport = None,
+    store=None,
+) -> np.ndarray:
+    get_carrier_zones = {"ups": get_ups_zones, "usps": get_usps_zones}[carrier]
+    by_origin = defaultdict(list)
+    for i, rate_request in enumerate(rate_requests):
+        by_origin[rate_request.origination.zip_code].append(i)
+    zones = np.zeros(len(rate_requests), dtype=np.intp)
+    for origin, indexes in by_origin.items():
+        destinations = [rate_requests[i].destination.zip_code for i in indexes]
+        zones[indexes] = get_carrier_zones(
+            origin, destinations, user_agent, transport, store=store
+        )
+    return zones
+
+
+def estimate(
+    card: RateCard,
+    carriers: list[str],
+    rate_requests: list[RateRequest],
+    user_agent: str,
+    transport: Transport = None,
+    store=None,
+) -> list[list[Rate]]:
+    output = [[] for _ in rate_requests]
+    for carrier in carriers:
+        zones = get_zones(carrier, rate_requests, user_agent, transport, store)
+        for rates, carrier_rates in zip(
+            output, card.rates(carrier, rate_requests, zones)
+        ):
+            rates.extend(carrier_rates)
+    return output
+
+
+def verify(
+    card: RateCard,
+    raters: dict[str, Rater],
+    rate_requests: list[RateRequest],
+    user_agent: str,
+    sample: int = 20,
+    store=None,
+    seed: Optional[int] = None,
+) -> dict[str, dict]:
+    # Compare offline prices with live rates for a sample of requests; a
+    # carrier that fails is counted under "errors" and the run goes on
+    sampled = random.Random(seed).sample(rate_requests, min(sample, len(rate_requests)))
+    estimates = estimate(card, list(raters), sampled, user_agent, store=store)
+    diffs = defaultdict(list)
+    errors = defaultdict(int)
+    for rate_request, offline in zip(sampled, estimates):
+        offline = {(i.carrier, i.service): float(i.price) for i in offline}
+        for carrier, rater in raters.items():
+            try:
+                live_rates = shipment_rates(rater(rate_request))
+            except Exception as e:
+                errors[carrier] += 1
+                metrics.inc(
+                    "shipping_carrier_errors_total",
+                    carrier=carrier,
+                    reason=type(e).__name__,
+                )
+                continue
+            for live in live_rates:
+                key = (carrier, live.service)
+                if key in offline:
+                    diffs[key].append(offline[key] - float(live.price))
+    output = {"errors": dict(errors)} if errors else {}
+    for (carrier, service), values in diffs.items():
+        values = np.array(values)
+        output[f"{carrier}:{service}"] = {
+            "samples": len(values),
+            "mean_diff": round(float(values.mean()), 2),
+            "mean_abs_diff": round(float(np.abs(values).mean()), 2),
+            "max_abs_diff": round(float(np.abs(values).max()), 2),
+        }
+    return output
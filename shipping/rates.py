@@ -1,15 +1,41 @@
+from shipping.business_days import as_date
 from shipping.common import Rate
 import datetime as dt
 
 
-def get_valid_rates(rates: list[Rate], arrive_by: dt.date) -> list[Rate]:
-    valid_rates = []
+def shipment_rates(rates: list[Rate]) -> list[Rate]:
+    # Rates for the whole shipment; the per-package rates of a multi-package
+    # quote only cover one box each
+    return [rate for rate in rates if rate.package is None]
+
+
+def shipment_totals(rates: list[Rate], packages: int) -> list[Rate]:
+    # One rate per carrier and service that priced every package: the summed
+    # price, arriving with the last package
+    by_service = {}
     for rate in rates:
-        if not rate.arrival:
+        if rate.package is not None:
+            by_service.setdefault((rate.carrier, rate.service), {})[rate.package] = rate
+    output = []
+    for (carrier, service), by_package in by_service.items():
+        if len(by_package) < packages:
             continue
-        elif rate.arrival.date() <= arrive_by:
-            valid_rates.append(rate)
-    return valid_rates
+        price = sum(float(i.price) for i in by_package.values())
+        arrivals = [i.arrival for i in by_package.values()]
+        arrival = None if None in arrivals else max(arrivals, key=as_date)
+        output.append(Rate(f"{price:.2f}", service, arrival, carrier))
+    return output
+
+
+def get_valid_rates(rates: list[Rate], arrive_by: dt.date) -> list[Rate]:
+    # Compared as day ordinals; arrivals and arrive_by may be dates,
+    # datetimes or ISO strings (cached rates)
+    deadline = as_date(arrive_by).toordinal()
+    return [
+        rate
+        for rate in rates
+        if rate.arrival and as_date(rate.arrival).toordinal() <= deadline
+    ]
 
 
 def get_best_rate(rates: list[Rate], arrive_by: dt.date) -> Rate:
@@ -17,4 +43,4 @@ def get_best_rate(rates: list[Rate], arrive_by: dt.date) -> Rate:
     if not valid_rates:
         raise ValueError("No valid rates for that configuration")
     else:
-        return sorted(valid_rates, key=lambda x: x.price)[0]
+        return min(valid_rates, key=lambda x: float(x.price))
@@ -0,0 +1,185 @@
+import datetime as dt
+import json
+from typing import Iterable, Optional
+
+import numpy as np
+
+from shipping.common import Rate
+
+NO_ARRIVAL = np.iinfo(np.int32).max
+
+
+def to_ordinal(value) -> int:
+    if value is None or value == "":
+        return NO_ARRIVAL
+    if isinstance(value, str):
+        value = dt.date.fromisoformat(value[:10])
+    if isinstance(value, dt.datetime):
+        value = value.date()
+    return value.toordinal()
+
+
+def to_ordinals(values) -> np.ndarray:
+    # Integer arrays are taken as ordinals already
+    array = np.asarray(values)
+    if array.dtype.kind in "iu":
+        return array.astype(np.int64)
+    if array.ndim == 0:
+        return np.asarray(to_ordinal(values), dtype=np.int64)
+    return np.array([to_ordinal(i) for i in values], dtype=np.int64)
+
+
+class RateSet:
+    # One row per quoted rate: the shipment it belongs to, a numeric price,
+    # the arrival as a day ordinal (NO_ARRIVAL when unknown) and a service code
+    # indexing into services ("carrier:service").
+    def __init__(
+        self,
+        shipment: np.ndarray,
+        price: np.ndarray,
+        arrival: np.ndarray,
+        service: np.ndarray,
+        services: list[str],
+        shipments: int,
+    ):
+        self.shipment = shipment
+        self.price = price
+        self.arrival = arrival
+        self.service = service
+        self.services = services
+        self.shipments = shipments
+
+    def __len__(self):
+        return len(self.price)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple], shipments: int = None) -> "RateSet":
+        # rows of (shipment index, carrier, service, price, arrival); rates
+        # without a price can't be compared and are left out
+        codes = {}
+        shipment, price, arrival, service = [], [], [], []
+        for index, carrier, name, value, arrives in rows:
+            if value is None:
+                continue
+            shipment.append(index)
+            price.append(float(value))
+            arrival.append(to_ordinal(arrives))
+            service.append(codes.setdefault(f"{carrier}:{name}", len(codes)))
+        shipment = np.array(shipment, dtype=np.int64)
+        return cls(
+            shipment,
+            np.array(price, dtype=np.float64),
+            np.array(arrival, dtype=np.int32),
+            np.array(service, dtype=np.int32),
+            list(codes),
+            shipments if shipments is not None else int(shipment.max(initial=-1)) + 1,
+        )
+
+    @classmethod
+    def from_rates(cls, rate_lists: list[list[Rate]]) -> "RateSet":
+        # Only whole-shipment rates; per-package ones price a single box
+        return cls.from_rows(
+            (
+                (i, rate.carrier, rate.service, rate.price, rate.arrival)
+                for i, rates in enumerate(rate_lists)
+                for rate in rates
+                if rate.package is None
+            ),
+            len(rate_lists),
+        )
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> tuple[list[str], "RateSet"]:
+        # Reads `shipping batch` output; returns the ids in shipment order
+        ids = []
+
+        def rows():
+            with open(path, "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    ids.append(str(data["id"]))
+                    for rate in data["rates"]:
+                        if rate.get("package") is not None:
+                            continue  # One box of a multi-package quote
+                        yield (
+                            len(ids) - 1,
+                            rate.get("carrier"),
+                            rate["service"],
+                            rate.get("price"),
+                            rate.get("arrival"),
+                        )
+
+        rate_set = cls.from_rows(rows())
+        rate_set.shipments = len(ids)
+        return ids, rate_set
+
+    def service_mask(self, services: Optional[list[str]]) -> np.ndarray:
+        if services is None:
+            return np.ones(len(self), dtype=bool)
+        codes = [i for i, name in enumerate(self.services) if name in services]
+        return np.isin(self.service, codes)
+
+    def keep_minimum(self, rows: np.ndarray, values: np.ndarray) -> np.ndarray:
+        # Rows whose value equals the minimum among their shipment's rows
+        best = np.full(self.shipments, np.inf)
+        np.minimum.at(best, self.shipment[rows], values)
+        return rows[values == best[self.shipment[rows]]]
+
+    def first_per_shipment(self, mask: np.ndarray, *keys: np.ndarray) -> np.ndarray:
+        # Row index of the best row (by keys, most significant first) per
+        # shipment among masked rows; -1 where a shipment has none. Narrowing
+        # by each key's minimum is O(n) where a lexsort would be O(n log n).
+        rows = np.flatnonzero(mask)
+        for key in keys:
+            rows = self.keep_minimum(rows, key[rows])
+        rows = self.keep_minimum(rows, rows)  # Earliest row breaks ties
+        output = np.full(self.shipments, -1, dtype=np.int64)
+        output[self.shipment[rows]] = rows
+        return output
+
+    def cheapest_by_deadline(self, deadline, services=None) -> np.ndarray:
+        # deadline is one date or one per shipment (dates or ordinals)
+        deadline = to_ordinals(deadline)
+        limit = deadline if deadline.ndim == 0 else deadline[self.shipment]
+        mask = self.arrival <= limit
+        mask &= self.service_mask(services)
+        return self.first_per_shipment(mask, self.price, self.arrival)
+
+    def fastest_under_budget(self, budget, services=None) -> np.ndarray:
+        budget = np.asarray(budget, dtype=np.float64)
+        limit = budget if budget.ndim == 0 else budget[self.shipment]
+        mask = (self.price <= limit) & (self.arrival != NO_ARRIVAL)
+        mask &= self.service_mask(services)
+        return self.first_per_shipment(mask, self.arrival, self.price)
+
+    def pareto_front(self, services=None) -> np.ndarray:
+        # Rows not beaten on both price and arrival within their shipment
+        rows = np.flatnonzero(self.service_mask(services))
+        rows = rows[
+            np.lexsort((self.price[rows], self.arrival[rows], self.shipment[rows]))
+        ]
+        price = self.price[rows]
+        shipment = self.shipment[rows]
+        # Offsetting each shipment below the previous one makes the running
+        # minimum restart at every shipment boundary
+        span = float(price.max() - price.min() + 1) if len(price) else 1.0
+        running = np.minimum.accumulate(price - shipment * span) + shipment * span
+        new_shipment = np.ones(len(rows), dtype=bool)
+        new_shipment[1:] = shipment[1:] != shipment[:-1]
+        previous = np.empty(len(rows))
+        previous[1:] = running[:-1]
+        mask = np.zeros(len(self), dtype=bool)
+        mask[rows[new_shipment | (price < previous)]] = True
+        return mask
+
+    def rate(self, row: int) -> Rate:
+        carrier, service = self.services[self.service[row]].split(":", 1)
+        arrival = self.arrival[row]
+        return Rate(
+            f"{self.price[row]:.2f}",
+            service,
+            None if arrival == NO_ARRIVAL else dt.date.fromordinal(int(arrival)),
+            carrier,
+        )
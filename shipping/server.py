@@ -0,0 +1,119 @@
+import json
+import signal
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from shipping import metrics
+
+Route = Callable[[dict], object]
+
+
+class ShippingServer(ThreadingHTTPServer):
+    daemon_threads = False  # server_close waits for in-flight requests
+    block_on_close = True
+
+    def __init__(self, address, routes: dict[str, Route]):
+        super().__init__(address, ShippingHandler)
+        self.routes = routes
+        self.started = time.time()
+        self.stats = defaultdict(lambda: {"requests": 0, "errors": 0, "seconds": 0.0})
+        self._lock = threading.Lock()
+
+    def record(self, path: str, seconds: float, error: bool):
+        with self._lock:
+            stats = self.stats[path]
+            stats["requests"] += 1
+            stats["errors"] += int(error)
+            stats["seconds"] += seconds
+        metrics.observe("shipping_http_request_seconds", seconds, route=path)
+        if error:
+            metrics.inc("shipping_http_request_errors_total", route=path)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "uptime": round(time.time() - self.started, 3),
+                "routes": {k: dict(v) for k, v in self.stats.items()},
+                **metrics.registry.snapshot(),
+            }
+
+
+class ShippingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive for repeat callers
+
+    def send_json(self, status: int, data):
+        self.send_body(status, json.dumps(data).encode(), "application/json")
+
+    def send_body(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        # Read in full even when the request is rejected, or the body is
+        # parsed as the next request on the kept-alive connection
+        length = self.headers.get("Content-Length") or "0"
+        if not length.isdigit():
+            self.close_connection = True  # Can't tell where the body ends
+            raise ValueError(f"Invalid Content-Length {length}")
+        return self.rfile.read(int(length))
+
+    def do_GET(self):
+        try:
+            self.read_body()
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self.send_json(200, self.server.metrics())
+        elif self.path == "/metrics/prometheus":
+            body = metrics.registry.to_prometheus().encode()
+            self.send_body(200, body, "text/plain; version=0.0.4")
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            body = self.read_body()
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        route = self.server.routes.get(self.path)
+        if route is None:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        start = time.perf_counter()
+        status = 200
+        try:
+            data = route(json.loads(body or b"{}"))
+        except (KeyError, TypeError, ValueError) as e:
+            status, data = 400, {"error": str(e)}
+        except Exception as e:
+            status, data = 500, {"error": str(e) or type(e).__name__}
+        self.server.record(self.path, time.perf_counter() - start, status != 200)
+        self.send_json(status, data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(routes: dict[str, Route], host: str = "127.0.0.1", port: int = 8080):
+    server = ShippingServer((host, port), routes)
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so not from this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from shipping import metrics
+
+T = TypeVar("T")
+
+
+class Group:
+    # Callers asking for the same key while a call for it is in flight wait
+    # for that call and share its result or exception. The key is dropped as
+    # soon as the call finishes, so nothing is cached. The shared state is a
+    # concurrent Future, so threads and coroutines on any event loop can join
+    # the same call.
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> tuple[Future, bool]:
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        metrics.inc(
+            "shipping_singleflight_calls_total",
+            group=self.name,
+            result="leader" if leader else "coalesced",
+        )
+        return future, leader
+
+    def _settle(self, key: Hashable, future: Future, result=None, error=None):
+        with self._lock:
+            del self._futures[key]
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def do(self, key: Hashable, fn: Callable[..., T], *args, **kwargs) -> T:
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def do_async(
+        self, key: Hashable, fn: Callable[..., Awaitable[T]], *args, **kwargs
+    ) -> T:
+        # The leader's loop runs fn as its own task, so cancelling any caller
+        # (a wait_for deadline, say) leaves the shared call running for the rest
+        future, leader = self._join(key)
+        if leader:
+
+            def settle(task: asyncio.Task):
+                if task.cancelled():
+                    error = ValueError(f"Shared {self.name} call was cancelled")
+                    self._settle(key, future, error=error)
+                elif task.exception() is not None:
+                    self._settle(key, future, error=task.exception())
+                else:
+                    self._settle(key, future, task.result())
+
+            try:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+            except BaseException as e:
+                # fn raised before returning or didn't return an awaitable
+                self._settle(key, future, error=e)
+                raise
+            task.add_done_callback(settle)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._futures),
+            }
@@ -0,0 +1,77 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from shipping import metrics
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CountingRetry(Retry):
+    def increment(self, method=None, url=None, response=None, error=None, **kwargs):
+        reason = str(response.status) if response is not None else "error"
+        metrics.inc("shipping_http_retries_total", method=method, reason=reason)
+        return super().increment(method, url, response, error, **kwargs)
+
+
+class Transport:
+    def __init__(
+        self,
+        connect_timeout: float = 5,
+        read_timeout: float = 30,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_maxsize: int = 10,
+        rewrites: dict = None,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        # Maps a URL prefix to a replacement, e.g. a local stand-in server
+        self.rewrites = dict(rewrites or {})
+        retry = CountingRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,  # Idempotent only
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry, pool_connections=10, pool_maxsize=pool_maxsize
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, url: str) -> str:
+        for prefix, replacement in self.rewrites.items():
+            if url.startswith(prefix):
+                return replacement + url[len(prefix) :]
+        return url
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, self.url(url), **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_transport = None
+
+
+def get_transport() -> Transport:
+    global _transport
+    if _transport is None:
+        _transport = Transport()
+    return _transport
+
+
+def set_transport(transport: Transport):
+    global _transport
+    _transport = transport
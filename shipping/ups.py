@@ -1,44 +1,175 @@
-import datetime as dt
+import io
 import os
-import pandas as pd
+import tempfile
+import threading
+import time
 import requests as r
 import json
+from typing import Iterator
 
-from shipping.common import Rate, RateRequest
+from shipping import metrics
+from shipping.business_days import arrival_date
+from shipping.cache import cache_key
+from shipping.common import Package, Rate, RateRequest
+from shipping.singleflight import Group
+from shipping.transport import Transport, get_transport
 from shipping.ups_ground import ups_ground_days
 
+rate_calls = Group("ups_rate")
 
-def get_token(client_id, client_secret):
+
+def get_token(client_id, client_secret, transport: Transport = None):
     url = "https://wwwcie.ups.com/security/v1/oauth/token"
     payload = {"grant_type": "client_credentials"}
     headers = {
         "Content-Type": "application/x-www-form-urlencoded",
     }
-    response = r.post(
+    transport = transport or get_transport()
+    response = transport.post(
         url, data=payload, headers=headers, auth=(client_id, client_secret)
     )
     data = response.json()
     return data
 
 
-def create_ups_token(client_id, client_secret):
+def write_ups_token(token: dict, path: str = ".ups_token"):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps(token))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def create_ups_token(client_id, client_secret, path: str = ".ups_token"):
     token = get_token(client_id, client_secret)
-    with open(".ups_token", "w") as f:
-        f.write(json.dumps(token))
+    if "access_token" not in token:
+        raise ValueError(token)
+    write_ups_token(token, path)
+    return token
 
 
-def get_ups_token():
-    with open(".ups_token", "r") as f:
+def get_ups_token(path: str = ".ups_token"):
+    with open(path, "r") as f:
         ups_token = json.loads(f.read())
     return ups_token
 
 
+def token_expires_at(token: dict) -> float:
+    issued_at = int(token["issued_at"]) / 1000  # Milliseconds since epoch
+    return issued_at + int(token["expires_in"])
+
+
+class UPSTokenProvider:
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        path: str = ".ups_token",
+        refresh_margin: float = 300,
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._lock = threading.Lock()
+
+    def is_fresh(self, token) -> bool:
+        try:
+            return token_expires_at(token) - self.refresh_margin > time.time()
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    def get(self) -> dict:
+        token = self._token
+        if token is not None and self.is_fresh(token):
+            return token
+        with self._lock, metrics.stage("token", carrier="ups"):
+            if self._token is None:
+                try:
+                    self._token = get_ups_token(self.path)
+                except (OSError, ValueError):
+                    pass
+            if not self.is_fresh(self._token):
+                self._token = create_ups_token(
+                    self.client_id, self.client_secret, self.path
+                )
+            return self._token
+
+    def refresh(self) -> dict:
+        with self._lock:
+            self._token = create_ups_token(
+                self.client_id, self.client_secret, self.path
+            )
+            return self._token
+
+    def access_token(self) -> str:
+        return self.get()["access_token"]
+
+
+def package_pounds(package: Package) -> float:
+    return float(package.weight.pounds) + (package.weight.ounces / 16)
+
+
+def package_payload(package: Package) -> dict:
+    weight = str(round(package_pounds(package), 2))
+    return {
+        # "SimpleRate": {
+        # "Description": "SimpleRateDescription",
+        # "Code": "XS"
+        # },
+        "PackagingType": {"Code": "00", "Description": "Packaging"},
+        "Dimensions": {
+            "UnitOfMeasurement": {"Code": "IN", "Description": "Inches"},
+            "Length": str(package.dimensions.length),
+            "Width": str(package.dimensions.width),
+            "Height": str(package.dimensions.height),
+        },
+        "PackageWeight": {
+            "UnitOfMeasurement": {"Code": "LBS", "Description": "Pounds"},
+            "Weight": weight,
+        },
+    }
+
+
 def get_rate(
-    token: str, rate_request: RateRequest, map_dir: str, ignore_ground: bool
+    token: str,
+    rate_request: RateRequest,
+    map_dir: str,
+    ignore_ground: bool,
+    transport: Transport = None,
+) -> list[Rate]:
+    # Identical quotes already in flight on the same transport share one
+    # request
+    transport = transport or get_transport()
+    key = (
+        cache_key("ups", rate_request),
+        token,
+        map_dir,
+        ignore_ground,
+        id(transport),
+    )
+    return list(
+        rate_calls.do(
+            key, fetch_rate, token, rate_request, map_dir, ignore_ground, transport
+        )
+    )
+
+
+def fetch_rate(
+    token: str,
+    rate_request: RateRequest,
+    map_dir: str,
+    ignore_ground: bool,
+    transport: Transport = None,
 ) -> list[Rate]:
     version = "v2205"
     requestoption = "shoptimeintransit"
     url = f"https://wwwcie.ups.com/api/rating/{version}/{requestoption}"
+    packages = rate_request.get_packages()
     payload = {
         "RateRequest": {
             "Request": {"TransactionReference": {"CustomerContext": "CustomerContext"}},
@@ -62,47 +193,16 @@ def get_rate(
                         "CountryCode": rate_request.destination.country,
                     },
                 },
-                "NumOfPieces": "1",
+                "NumOfPieces": str(len(packages)),
+                "ShipmentTotalWeight": {
+                    "UnitOfMeasurement": {"Code": "LBS", "Description": "Pounds"},
+                    "Weight": str(round(sum(package_pounds(i) for i in packages), 2)),
+                },
                 "DeliveryTimeInformation": {
                     "PackageBillType": "03",
-                    "Pickup": {"Date": dt.datetime.today().strftime("%Y%M%d")},
-                },
-                "Package": {
-                    # "SimpleRate": {
-                    # "Description": "SimpleRateDescription",
-                    # "Code": "XS"
-                    # },
-                    "PackagingType": {"Code": "00", "Description": "Packaging"},
-                    "Dimensions": {
-                        "UnitOfMeasurement": {"Code": "IN", "Description": "Inches"},
-                        "Length": str(rate_request.dimensions.length),
-                        "Width": str(rate_request.dimensions.width),
-                        "Height": str(rate_request.dimensions.height),
-                    },
-                    "PackageWeight": {
-                        "UnitOfMeasurement": {"Code": "LBS", "Description": "Pounds"},
-                        "Weight": str(
-                            round(
-                                float(rate_request.weight.pounds)
-                                + (rate_request.weight.ounces / 16),
-                                2,
-                            )
-                        ),
-                    },
-                    "ShipmentTotalWeight": {
-                        "UnitOfMeasurement": {
-                            "Code": "LBS",
-                            "Description": "Pounds",
-                        },
-                        "Weight": str(
-                            round(
-                                float(rate_request.weight.pounds)
-                                + (rate_request.weight.ounces / 16),
-                                2,
-                            )
-                        ),
-                    },
+                    "Pickup": {"Date": rate_request.ship_date.strftime("%Y%m%d")},
                 },
+                "Package": [package_payload(i) for i in packages],
             },
         }
     }
@@ -112,65 +212,115 @@ def get_rate(
         "transId": "string",
         "Authorization": f"Bearer {token}",
     }
-    response = r.post(url, json=payload, headers=headers)
-    return parse_rate_response(response, rate_request, map_dir, ignore_ground)
+    transport = transport or get_transport()
+    with metrics.stage("http", carrier="ups"):
+        response = transport.post(url, json=payload, headers=headers)
+    with metrics.stage("parse", carrier="ups"):
+        return parse_rate_response(response, rate_request, map_dir, ignore_ground)
+
+
+def as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def iter_rates(
+    content: bytes, rate_request: RateRequest, map_dir, ignore_ground
+) -> Iterator[Rate]:
+    # One json.loads over the bytes; the C decoder is faster than walking the
+    # entries from Python, and RatedShipment is most of the response anyway
+    data = json.loads(content)
+    shipments = data.get("RateResponse", {}).get("RatedShipment")
+    if shipments is None:
+        raise ValueError(content)
+    multi_package = len(rate_request.get_packages()) > 1
+    for rate in as_list(shipments):
+        service = rate["Service"]["Code"]
+        price = rate["TotalCharges"]["MonetaryValue"]
+        if "GuaranteedDelivery" in rate:
+            transit_days = rate["GuaranteedDelivery"]["BusinessDaysInTransit"]
+            arrival = arrival_date("ups", rate_request.ship_date, transit_days)
+        else:
+            arrival = None
+        if not ignore_ground:
+            if int(service) == 3:  # UPS Ground
+                days = ups_ground_days(
+                    rate_request.origination.zip_code,
+                    rate_request.destination.state,
+                    map_dir,
+                )
+                arrival = arrival_date("ups", rate_request.ship_date, days)
+        if multi_package:
+            # RatedPackage entries follow the order of the request's packages;
+            # ones without their own charges are left out rather than priced
+            # None
+            for i, package in enumerate(as_list(rate.get("RatedPackage", []))):
+                package_price = package.get("TotalCharges", {}).get("MonetaryValue")
+                if package_price is not None:
+                    yield Rate(package_price, service, arrival, "ups", i)
+        yield Rate(price, service, arrival, "ups")  # The whole shipment
 
 
 def parse_rate_response(
     response: r.Response, rate_request: RateRequest, map_dir, ignore_ground
 ) -> list[Rate]:
     if response.status_code == 200:
-        output = []
-        data = response.json()
-        for rate in data["RateResponse"]["RatedShipment"]:
-            service = rate["Service"]["Code"]
-            price = rate["TotalCharges"]["MonetaryValue"]
-            if "GuaranteedDelivery" in rate:
-                transit_days = rate["GuaranteedDelivery"]["BusinessDaysInTransit"]
-                arrival = dt.datetime.today() + dt.timedelta(days=int(transit_days))
-            else:
-                arrival = None
-            if not ignore_ground:
-                if int(service) == 3:  # UPS Ground
-                    days = ups_ground_days(
-                        rate_request.origination.zip_code,
-                        rate_request.destination.state,
-                        map_dir,
-                    )
-                    arrival = dt.datetime.today() + dt.timedelta(days=int(days))
-            output.append(Rate(price, service, arrival))
-        return output
+        return list(iter_rates(response.content, rate_request, map_dir, ignore_ground))
     else:
         raise ValueError(response.content)
 
 
-def get_ups_zone_df(origin: str, user_agent: str):
+def get_ups_zone_df(origin: str, user_agent: str, transport: Transport = None):
     short_origin = origin[:3]
     headers = {
         "User-Agent": user_agent,
     }
     url = f"https://www.ups.com/media/us/currentrates/zone-csv/{short_origin}.xls"
-    response = r.get(url, headers=headers)
-    if response.status_code == 200:
-        with open("temp.xls", "wb") as f:
-            f.write(response.content)
+    transport = transport or get_transport()
+    with metrics.stage("zone_http", carrier="ups"):
+        response = transport.get(url, headers=headers)
+    if response.status_code != 200:
+        raise ValueError(f"Status code {response.status_code}")
 
-    df = pd.read_excel(
-        "temp.xls",
-        sheet_name=str(short_origin),
-        header=8,
-    )
-    df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
-    df = df.loc[df["Dest. ZIP"].str.len() <= 3]
-    os.remove("temp.xls")
+    import pandas as pd
+
+    with metrics.stage("zone_parse", carrier="ups"):
+        df = pd.read_excel(
+            io.BytesIO(response.content),
+            sheet_name=str(short_origin),
+            header=8,
+        )
+        df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
+        df["Dest. ZIP"] = df["Dest. ZIP"].astype(str)
+        df = df.loc[df["Dest. ZIP"].str.fullmatch(r"\d{3}(-\d{3})?")]
     return df
 
 
-def get_ups_zones(origin: str, destinations: list[str], user_agent):
-    zone_df = get_ups_zone_df(origin, user_agent)
+def get_ups_zone_map(zone_df) -> dict[str, int]:
+    # Rows are single prefixes ("606") or inclusive ranges ("004-005")
+    output = {}
+    for dest, zone in zip(zone_df["Dest. ZIP"], zone_df["Ground"]):
+        if not str(zone).isdigit():
+            continue  # Not serviced by Ground
+        start, _, end = dest.partition("-")
+        for prefix in range(int(start), int(end or start) + 1):
+            output[f"{prefix:03d}"] = int(zone)
+    return output
+
+
+def get_ups_zones(
+    origin: str,
+    destinations: list[str],
+    user_agent,
+    transport: Transport = None,
+    store=None,
+):
+    if store is not None:
+        return store.ups_zones(origin, destinations, user_agent, transport)
+    zone_map = get_ups_zone_map(get_ups_zone_df(origin, user_agent, transport))
     output = []
     for zip_code in destinations:
         short_code = zip_code[:3]
-        zone = zone_df.loc[zone_df["Dest. ZIP"] == short_code, "Ground"].iat[0]
-        output.append(int(zone))
+        if short_code not in zone_map:
+            raise ValueError(f"No UPS Ground zone for {zip_code}")
+        output.append(zone_map[short_code])
     return output
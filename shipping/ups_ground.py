@@ -1,47 +1,155 @@
+import csv
 import datetime as dt
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from PIL import Image
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
 
+from shipping import metrics
+from shipping.transport import Transport, get_transport
 from shipping.ups_ground_boxes import BOXES, COLORS
 
+GROUND_TABLE = "ground_days.csv"
+GROUND_PACKED = "ground_days.bin"  # Same table, memory-mapped by readers
+MAP_INDEX = "map_index.csv"  # Days per state for each map file, by content hash
+MAP_FIELDS = ["file_name", "zip_code", "downloaded_at"]
+COLOR_TOLERANCE = 24  # Max R/G distance to a COLORS entry (anti-aliasing)
+MAP_FILE = re.compile(r"[0-9a-f]{16}\.\w+")  # Names given by download_file
 
-def download_file(url, user_agent):
-    local_filename = url.split("/")[-1]
+_ground_tables = {}
+_lut = None
+
+
+def download_file(url, user_agent, transport: Transport = None, map_dir: str = "."):
+    # Stored under its content hash, so identical images are kept once
+    extension = os.path.splitext(url.split("/")[-1])[1]
     headers = {"User-Agent": user_agent}
-    with requests.get(url, stream=True, headers=headers) as r:
-        r.raise_for_status()
-        with open(local_filename, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
+    transport = transport or get_transport()
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=map_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            with transport.get(url, stream=True, headers=headers) as r:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=8192):
+                    digest.update(chunk)
+                    f.write(chunk)
+        local_filename = f"{digest.hexdigest()[:16]}{extension}"
+        os.replace(tmp_path, os.path.join(map_dir, local_filename))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
     return local_filename
 
 
-def download_map(zip_code, user_agent):
+def download_map(zip_code, user_agent, transport: Transport = None, map_dir: str = "."):
     formatted_date = dt.datetime.today().strftime("%m%d%Y")
     headers = {
         "User-Agent": user_agent,
     }
     url = f"https://www.ups.com/maps/printerfriendly?loc=en_US&usmDateCalendar={formatted_date}&stype=O&zip={zip_code}"
-    response = requests.get(url, headers=headers)
+    transport = transport or get_transport()
+    response = transport.get(url, headers=headers)
     if response.status_code == 200:
+        from bs4 import BeautifulSoup
+
         soup = BeautifulSoup(response.content, features="html.parser")
         img = soup.find("img", attrs={"id": "imgMap"})
         if img:
             endpoint = img["src"]
             img_url = f"https://www.ups.com{endpoint}"
-            download_file(img_url, user_agent)
-            local_filename = endpoint.split("/")[-1]
-            return local_filename
+            return download_file(img_url, user_agent, transport, map_dir)
         else:
-            imgs = soup.find_all("img")
-            print(imgs)
-            raise ValueError("Could not find img")
+            raise ValueError(f"Could not find map image for {zip_code}")
     else:
         raise ValueError("Request error")
 
 
+def write_rows(path: str, fieldnames: list[str], rows: list[dict]):
+    with open(f"{path}.tmp", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(f"{path}.tmp", path)
+
+
+def write_maps(map_dir: str, maps: list[dict]):
+    write_rows(f"{map_dir}/maps.csv", MAP_FIELDS, maps)
+
+
+def download_maps(
+    zip_codes: list[str],
+    user_agent: str,
+    map_dir: str = ".",
+    max_age_days: float = 7,
+    concurrency: int = 8,
+    transport: Transport = None,
+    progress=None,
+    total=None,
+) -> dict[str, str]:
+    # Only maps missing from maps.csv or older than max_age_days are fetched;
+    # the manifest is rewritten after every map so an interrupted run resumes.
+    # total is called with the number of maps to fetch, progress after each.
+    os.makedirs(map_dir, exist_ok=True)
+    try:
+        maps = {i["zip_code"]: i for i in read_maps(map_dir)}
+    except FileNotFoundError:
+        maps = {}
+    cutoff = dt.datetime.now() - dt.timedelta(days=max_age_days)
+    stale = [
+        i
+        for i in dict.fromkeys(str(i) for i in zip_codes)
+        if i not in maps
+        or dt.datetime.fromisoformat(maps[i].get("downloaded_at") or "1970-01-01")
+        < cutoff
+    ]
+    if total is not None:
+        total(len(stale))
+    errors = {}
+    lock = threading.Lock()
+
+    def fetch(zip_code):
+        try:
+            file_name = download_map(zip_code, user_agent, transport, map_dir)
+        except Exception as e:
+            with lock:
+                errors[zip_code] = str(e) or type(e).__name__
+            return
+        with lock:
+            maps[zip_code] = {
+                "file_name": file_name,
+                "zip_code": zip_code,
+                "downloaded_at": dt.datetime.now().isoformat(timespec="seconds"),
+            }
+            write_maps(map_dir, list(maps.values()))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in executor.map(fetch, stale):
+            if progress is not None:
+                progress()
+    prune_maps(map_dir, {i["file_name"] for i in maps.values()})
+    return errors
+
+
+def prune_maps(map_dir: str, keep: set[str]) -> list[str]:
+    # Removes downloaded maps the manifest no longer points at, e.g. the old
+    # image after a refresh changed its hash; other files are left alone
+    removed = []
+    for file_name in os.listdir(map_dir):
+        if file_name not in keep and MAP_FILE.fullmatch(file_name):
+            try:
+                os.remove(os.path.join(map_dir, file_name))
+            except FileNotFoundError:
+                continue
+            removed.append(file_name)
+    return removed
+
+
 def crop_to_state(img, state: str):
     x, y, x_offset, y_offset = BOXES[state]
     return img.crop((x, y, x + x_offset, y + y_offset))
@@ -69,13 +177,211 @@ def color_to_days(color) -> int:
     raise ValueError(f"Could not find color {color}")
 
 
-def ups_ground_days(from_zip: str, to_state: str, map_dir: str):
-    maps = pd.read_csv(f"{map_dir}/maps.csv").to_dict(orient="records")
-    from_file = next((i for i in maps if str(i["zip_code"]) == from_zip), None)[
-        "file_name"
+def _color_lut():
+    import numpy as np
+
+    # Label for every (R, G) pair: index into sorted COLORS, or len(COLORS)
+    days = np.array(sorted(COLORS))
+    palette = np.array([COLORS[i][:2] for i in days], dtype=np.int32)  # Ignore B
+    grid = np.stack(np.meshgrid(np.arange(256), np.arange(256), indexing="ij"), -1)
+    dist = ((grid[:, :, None, :] - palette) ** 2).sum(axis=3)
+    lut = dist.argmin(axis=2).astype(np.uint8)
+    lut[dist.min(axis=2) > COLOR_TOLERANCE**2] = len(days)  # Unmatched
+    return days, lut
+
+
+def classify_map(img, states=None) -> dict:
+    import numpy as np
+
+    global _lut
+    if _lut is None:
+        _lut = _color_lut()
+    days, lut = _lut
+    states = list(states or BOXES)
+    rgb = np.asarray(img.convert("RGB"))
+    boxes = [
+        rgb[y : y + y_offset, x : x + x_offset].reshape(-1, 3)
+        for x, y, x_offset, y_offset in (BOXES[i] for i in states)
     ]
-    if from_file:
-        img = Image.open(f"{map_dir}/{from_file}")
-        cropped_img = crop_to_state(img, to_state)
-        dominant_color = get_dominant_color(cropped_img)
-        return color_to_days(dominant_color)
+    owner = np.repeat(np.arange(len(states)), [len(i) for i in boxes])
+    pixels = np.concatenate(boxes)
+    labels = lut[pixels[:, 0], pixels[:, 1]].astype(np.intp)
+    black_white = np.all(pixels == 0, axis=1) | np.all(pixels == 255, axis=1)
+    labels[black_white] = len(days) + 1
+    counts = np.bincount(
+        owner * (len(days) + 2) + labels, minlength=len(states) * (len(days) + 2)
+    ).reshape(len(states), len(days) + 2)
+    best = counts[:, : len(days)].argmax(axis=1)
+    best_counts = counts[np.arange(len(states)), best]
+    colored = counts[:, : len(days) + 1].sum(axis=1)
+    output = {}
+    for i, state in enumerate(states):
+        if best_counts[i] == 0:
+            output[state] = (None, 0.0)
+        else:
+            output[state] = (int(days[best[i]]), float(best_counts[i] / colored[i]))
+    return output
+
+
+def read_maps(map_dir: str) -> list[dict]:
+    with open(f"{map_dir}/maps.csv", "r", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def classify_file(path: str) -> list:
+    # Pool worker: days per state in BOXES order, "" where none matched
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return ["" if i is None else i for i, _ in classify_map(img).values()]
+
+
+def read_map_index(map_dir: str) -> dict[str, dict]:
+    try:
+        with open(f"{map_dir}/{MAP_INDEX}", "r", newline="") as f:
+            return {i["file_name"]: i for i in csv.DictReader(f)}
+    except FileNotFoundError:
+        return {}
+
+
+def index_maps(map_dir: str, workers: int = None, progress=None) -> dict:
+    # Classifies only map files whose content hash isn't in the index yet, one
+    # file per task across a process pool, then rebuilds the ground table
+    start = time.perf_counter()
+    maps = read_maps(map_dir)
+    states = list(BOXES)
+    index = read_map_index(map_dir)
+    digests = {}
+    for m in maps:
+        if m["file_name"] not in digests:
+            digests[m["file_name"]] = file_digest(f"{map_dir}/{m['file_name']}")
+    stale = [
+        file_name
+        for file_name, digest in digests.items()
+        if file_name not in index
+        or index[file_name]["sha256"] != digest
+        or any(i not in index[file_name] for i in states)
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(stale) or 1)
+    paths = [f"{map_dir}/{i}" for i in stale]
+    classify_start = time.perf_counter()
+    with ProcessPoolExecutor(workers) if workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+        for file_name, days in zip(stale, run(classify_file, paths)):
+            index[file_name] = {
+                "file_name": file_name,
+                "sha256": digests[file_name],
+                **dict(zip(states, days)),
+            }
+            if progress is not None:
+                progress()
+    classify_seconds = time.perf_counter() - classify_start
+    index = {k: v for k, v in index.items() if k in digests}
+    write_rows(
+        f"{map_dir}/{MAP_INDEX}", ["file_name", "sha256"] + states, list(index.values())
+    )
+    rows = [
+        {"zip_code": m["zip_code"], "state": state, "days": days}
+        for m in maps
+        for state in states
+        if (days := index[m["file_name"]][state]) != ""
+    ]
+    write_rows(f"{map_dir}/{GROUND_TABLE}", ["zip_code", "state", "days"], rows)
+    write_ground_packed(map_dir, rows)
+    elapsed = time.perf_counter() - start
+    return {
+        "maps": len(maps),
+        "files": len(digests),
+        "classified": len(stale),
+        "unchanged": len(digests) - len(stale),
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "maps_per_second": round(len(stale) / classify_seconds, 2) if stale else None,
+    }
+
+
+def write_ground_packed(map_dir: str, rows: list[dict]):
+    import numpy as np
+
+    from shipping.packed import GROUND_DAYS, write_packed
+
+    origins = sorted({i["zip_code"] for i in rows})
+    states = sorted(BOXES)
+    data = np.zeros((1, len(origins), len(states)), dtype=np.uint8)
+    origin_index = {k: i for i, k in enumerate(origins)}
+    state_index = {k: i for i, k in enumerate(states)}
+    for row in rows:
+        data[0, origin_index[row["zip_code"]], state_index[row["state"]]] = int(
+            row["days"]
+        )
+    write_packed(
+        f"{map_dir}/{GROUND_PACKED}", GROUND_DAYS, ["ups"], origins, states, data
+    )
+
+
+def load_ground_table(map_dir: str):
+    # The packed table is mapped rather than parsed, so it costs nothing to
+    # open and worker processes share it; the CSV covers older map sets and
+    # packed files that are older than it or don't open
+    mtimes = {}
+    for name in (GROUND_PACKED, GROUND_TABLE):
+        try:
+            mtimes[name] = os.path.getmtime(f"{map_dir}/{name}")
+        except OSError:
+            continue
+    for name, mtime in mtimes.items():
+        path = f"{map_dir}/{name}"
+        if mtimes.get(GROUND_TABLE, mtime) > mtime:
+            continue  # The CSV was rebuilt after this packed file
+        try:
+            if os.path.getmtime(f"{map_dir}/maps.csv") > mtime:
+                return None  # Maps were downloaded after the table was built
+        except OSError:
+            continue
+        cached = _ground_tables.get(map_dir)
+        if cached and cached[0] == (path, mtime):
+            return cached[1]
+        if name == GROUND_PACKED:
+            from shipping.packed import GROUND_DAYS, PackedMapping, PackedTable
+
+            try:
+                table = PackedMapping(PackedTable(path, GROUND_DAYS), "ups")
+            except ValueError:
+                continue  # Truncated or from another format version
+        else:
+            with open(path, "r", newline="") as f:
+                table = {
+                    (i["zip_code"], i["state"]): int(i["days"])
+                    for i in csv.DictReader(f)
+                }
+        _ground_tables[map_dir] = ((path, mtime), table)
+        return table
+    return None
+
+
+def ups_ground_days(from_zip: str, to_state: str, map_dir: str):
+    with metrics.stage("ground_days", carrier="ups"):
+        table = load_ground_table(map_dir)
+        if table is not None and (from_zip, to_state) in table:
+            return table[(from_zip, to_state)]
+        from_map = next(
+            (i for i in read_maps(map_dir) if i["zip_code"] == from_zip), None
+        )
+        if from_map:
+            from PIL import Image
+
+            img = Image.open(f"{map_dir}/{from_map['file_name']}")
+            days, _ = classify_map(img, [to_state])[to_state]
+            if days is None:
+                raise ValueError(
+                    f"Could not classify {to_state} in {from_map['file_name']}"
+                )
+            return days
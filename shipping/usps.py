@@ -1,66 +1,163 @@
 import datetime as dt
+import io
+from typing import Iterator
+from xml.etree import ElementTree
+
 import requests as r
-import xmltodict
 
-from shipping.common import Rate, RateRequest
+from shipping import metrics
+from shipping.business_days import arrival_date
+from shipping.cache import cache_key
+from shipping.common import Package, Rate, RateRequest
+from shipping.rates import shipment_totals
+from shipping.singleflight import Group
+from shipping.transport import Transport, get_transport
 
 BASE_URL = "https://secure.shippingapis.com/ShippingAPI.dll?API=RateV4&XML="
 
 
-def rate_request_to_xml(user_id: str, password: str, rate_request: RateRequest) -> str:
+MAX_PACKAGES = 25  # Per RateV4 request
+
+rate_calls = Group("usps_rate")
+zone_calls = Group("usps_zone")
+
+
+def package_to_xml(package_id: int, package: Package, rate_request: RateRequest) -> str:
     formatted_date = rate_request.ship_date.strftime("%Y-%m-%d")
     return f"""
-<RateV4Request USERID="{user_id}" PASSWORD="{password}">
-    <Revision>2</Revision>
-    <Package ID="1ST">
+    <Package ID="{package_id}">
         <Service>ALL</Service>
         <ZipOrigination>{rate_request.origination.zip_code}</ZipOrigination>
         <ZipDestination>{rate_request.destination.zip_code}</ZipDestination>
-        <Pounds>{rate_request.weight.pounds}</Pounds>
-        <Ounces>{rate_request.weight.ounces}</Ounces>
+        <Pounds>{package.weight.pounds}</Pounds>
+        <Ounces>{package.weight.ounces}</Ounces>
         <Container>VARIABLE</Container>
-        <Width>{rate_request.dimensions.width}</Width>
-        <Length>{rate_request.dimensions.length}</Length>
-        <Height>{rate_request.dimensions.height}</Height>
+        <Width>{package.dimensions.width}</Width>
+        <Length>{package.dimensions.length}</Length>
+        <Height>{package.dimensions.height}</Height>
         <Machinable>False</Machinable>
         <DropOffTime></DropOffTime>
         <ShipDate>{formatted_date}</ShipDate>
         <SortationLevel></SortationLevel>
         <DestinationEntryFacilityType></DestinationEntryFacilityType>
         <ReturnFees>true</ReturnFees>
-    </Package>
+    </Package>"""
+
+
+def rate_request_to_xml(
+    user_id: str, password: str, rate_request: RateRequest, start: int = 0
+) -> str:
+    packages = rate_request.get_packages()[start : start + MAX_PACKAGES]
+    package_xml = "".join(
+        package_to_xml(start + i, package, rate_request)
+        for i, package in enumerate(packages)
+    )
+    return f"""
+<RateV4Request USERID="{user_id}" PASSWORD="{password}">
+    <Revision>2</Revision>{package_xml}
 </RateV4Request>"""
 
 
-def parse_rate_response(response: r.Response) -> list[Rate]:
+def service_name(mail_service: str) -> str:
+    # "Priority Mail 2-Day&lt;sup&gt;&#8482;&lt;/sup&gt;" -> "Priority Mail 2-Day"
+    if ";" in mail_service:
+        return mail_service.split("&")[0] + mail_service.split(";")[-1]
+    return mail_service
+
+
+def iter_rates(content: bytes, rate_request: RateRequest = None) -> Iterator[Rate]:
+    # Streams Postage elements out of the RateV4 response and frees each one
+    # once its Rate is built, so memory stays flat on large responses
+    errors = []
+    rated = False
+    package_id = None
+    single = rate_request is None or len(rate_request.get_packages()) == 1
+    root = None
+    events = ElementTree.iterparse(io.BytesIO(content), events=("start", "end"))
+    for event, elem in events:
+        if event == "start":
+            if root is None:
+                root = elem
+            elif elem.tag == "Package":
+                package_id = int(elem.get("ID"))
+            continue
+        if elem.tag == "Postage":
+            arrival = None
+            commitment = (elem.findtext("CommitmentName") or "").split("-")[0]
+            if elem.findtext("CommitmentDate"):
+                arrival = dt.date.fromisoformat(elem.findtext("CommitmentDate"))
+            elif commitment.isdigit() and rate_request is not None:
+                # "2-Day" without a date: count service days from ship date
+                arrival = arrival_date("usps", rate_request.ship_date, commitment)
+            rated = True
+            yield Rate(
+                price=elem.findtext("Rate"),
+                service=service_name(elem.findtext("MailService") or ""),
+                arrival=arrival,
+                carrier="usps",
+                package=None if single else package_id,
+            )
+            elem.clear()
+        elif elem.tag == "Error":
+            # A package that fails gets no rates (and so no shipment total);
+            # the quote only fails when nothing was rated
+            errors.append(elem.findtext("Description"))
+            metrics.inc(
+                "shipping_carrier_errors_total", carrier="usps", reason="PackageError"
+            )
+            elem.clear()
+        elif elem.tag == "Package":
+            root.clear()  # Drops the finished Package from the tree
+    if errors and not rated:
+        raise ValueError(errors[0])
+
+
+def parse_rate_response(
+    response: r.Response, rate_request: RateRequest = None
+) -> list[Rate]:
     if response.status_code == 200:
-        output = []
-        data = xmltodict.parse(response.content)
-        for temp_rate in data["RateV4Response"]["Package"]["Postage"]:
-            if ";" in temp_rate["MailService"]:
-                service = temp_rate["MailService"].split("&")[0]
-                service_modifier = temp_rate["MailService"].split(";")[-1]
-                service += service_modifier
-            else:
-                service = temp_rate["MailService"]
-            rate = Rate(price=temp_rate["Rate"], service=service)
-            if "CommitmentDate" in temp_rate:
-                if temp_rate["CommitmentDate"]:
-                    rate.arrival = dt.datetime.strptime(
-                        temp_rate["CommitmentDate"], "%Y-%m-%d"
-                    )
-            output.append(rate)
-        return output
+        return list(iter_rates(response.content, rate_request))
     else:
         raise ValueError(response.content)
 
 
-def get_rate(user_id: str, password: str, rate_request: RateRequest) -> list[Rate]:
+def get_rate(
+    user_id: str,
+    password: str,
+    rate_request: RateRequest,
+    transport: Transport = None,
+) -> list[Rate]:
+    # Identical quotes already in flight on the same transport share one
+    # request
+    transport = transport or get_transport()
+    key = (cache_key("usps", rate_request), user_id, id(transport))
+    return list(
+        rate_calls.do(key, fetch_rate, user_id, password, rate_request, transport)
+    )
+
+
+def fetch_rate(
+    user_id: str,
+    password: str,
+    rate_request: RateRequest,
+    transport: Transport = None,
+) -> list[Rate]:
+    # RateV4 prices each package on its own; multi-package quotes get a
+    # summed rate per service for the whole shipment as well
     headers = {"Content-Type": "application/xml"}
-    xml = rate_request_to_xml(user_id, password, rate_request)
-    url = BASE_URL + xml
-    response = r.get(url, headers=headers)
-    return parse_rate_response(response)
+    transport = transport or get_transport()
+    packages = len(rate_request.get_packages())
+    output = []
+    for start in range(0, packages, MAX_PACKAGES):
+        xml = rate_request_to_xml(user_id, password, rate_request, start)
+        url = BASE_URL + xml
+        with metrics.stage("http", carrier="usps"):
+            response = transport.get(url, headers=headers)
+        with metrics.stage("parse", carrier="usps"):
+            output.extend(parse_rate_response(response, rate_request))
+    if packages > 1:
+        output.extend(shipment_totals(output, packages))
+    return output
 
 
 def parse_usps_zone(response):
@@ -74,7 +171,23 @@ def parse_usps_zone(response):
         raise ValueError(f"Status code {response.status_code}")
 
 
-def get_usps_zone(origination: str, destination: str, user_agent: str):
+def get_usps_zone(
+    origination: str, destination: str, user_agent: str, transport: Transport = None
+):
+    transport = transport or get_transport()
+    return zone_calls.do(
+        (origination, destination, id(transport)),
+        fetch_usps_zone,
+        origination,
+        destination,
+        user_agent,
+        transport,
+    )
+
+
+def fetch_usps_zone(
+    origination: str, destination: str, user_agent: str, transport: Transport = None
+):
     today = dt.datetime.now().date()
     today_formatted = today.strftime("%m/%d/%Y")
     headers = {
@@ -82,13 +195,23 @@ def get_usps_zone(origination: str, destination: str, user_agent: str):
         "X-Requested-With": "XMLHttpRequest",
     }
     url = f"https://postcalc.usps.com/DomesticZoneChart/GetZone?origin={origination}&destination={destination}&shippingDate={today_formatted}"
-    response = r.get(url, headers=headers)
+    transport = transport or get_transport()
+    with metrics.stage("zone_http", carrier="usps"):
+        response = transport.get(url, headers=headers)
     return parse_usps_zone(response)
 
 
-def get_usps_zones(origin: str, destinations: list[str], user_agent):
+def get_usps_zones(
+    origin: str,
+    destinations: list[str],
+    user_agent,
+    transport: Transport = None,
+    store=None,
+):
+    if store is not None:
+        return store.usps_zones(origin, destinations, user_agent, transport)
     output = []
     for zip_code in destinations:
-        zone = get_usps_zone(origin, zip_code, user_agent)
+        zone = get_usps_zone(origin, zip_code, user_agent, transport)
         output.append(zone)
     return output
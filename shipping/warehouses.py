@@ -0,0 +1,298 @@
+import csv
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import numpy as np
+
+from shipping.business_days import arrival_ordinals
+from shipping.common import Location, Rate, RateRequest
+from shipping.quote import DEFAULT_DEADLINE, Rater, quote
+from shipping.ratecard import RateCard
+from shipping.rates import shipment_rates
+from shipping.selection import NO_ARRIVAL, RateSet, to_ordinals
+from shipping.transport import Transport
+from shipping.ups_ground import load_ground_table
+from shipping.zones import ZoneStore, prefixes, zone_matrix
+
+UPS_GROUND = "03"
+UNKNOWN = np.iinfo(np.int16).max  # Missing zone or ground days; never better
+PRUNE_CHUNK = 1024  # Orders compared at once when pruning
+# Business days in transit for rate card services other than UPS Ground.
+# UPS day-definite services are guaranteed; USPS services use the longest
+# published commitment, so an estimate never arrives earlier than a quote.
+UPS_TRANSIT_DAYS = {"01": 1, "02": 2, "12": 3, "13": 1, "14": 1, "59": 2}
+USPS_TRANSIT_DAYS = {
+    "Priority Mail Express": 2,
+    "Priority Mail": 3,
+    "USPS Ground Advantage": 5,
+    "Media Mail Parcel": 8,
+    "Library Mail Parcel": 8,
+}
+
+
+def transit_days(carrier: str, service: str) -> Optional[int]:
+    # None when unknown; "Priority Mail 2-Day" names carry their own days
+    if carrier == "ups":
+        return UPS_TRANSIT_DAYS.get(service)
+    if carrier == "usps":
+        match = re.search(r"(\d+)-Day", service)
+        if match:
+            return int(match.group(1))
+        return USPS_TRANSIT_DAYS.get(service)
+    return None
+
+
+@dataclass(frozen=True, slots=True)
+class Warehouse:
+    name: str
+    location: Location
+
+
+@dataclass(frozen=True, slots=True)
+class Assignment:
+    warehouse: Warehouse
+    rate: Rate
+
+    def to_dict(self):
+        return {
+            "warehouse": self.warehouse.name,
+            "from_zip": self.warehouse.location.zip_code,
+            **self.rate.to_dict(),
+        }
+
+
+def load_warehouses(path: str) -> list[Warehouse]:
+    # CSV with name,zip_code,state
+    with open(path, "r", newline="") as f:
+        return [
+            Warehouse(
+                row["name"],
+                Location(zip_code=row["zip_code"].zfill(5), state=row.get("state")),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+class WarehouseSelector:
+    # Zones and ground days per warehouse are loaded once into the zone store
+    # and the ground table, then shared by every order in every batch.
+    def __init__(
+        self,
+        warehouses: list[Warehouse],
+        store: ZoneStore,
+        user_agent: str,
+        carriers: tuple[str, ...] = ("ups", "usps"),
+        map_dir: Optional[str] = None,
+        card: Optional[RateCard] = None,
+        concurrency: int = 8,
+        transport: Transport = None,
+    ):
+        if not warehouses:
+            raise ValueError("No warehouses")
+        self.warehouses = warehouses
+        self.store = store
+        self.user_agent = user_agent
+        self.carriers = list(carriers)
+        self.map_dir = map_dir
+        self.card = card
+        self.concurrency = concurrency
+        self.transport = transport
+        self.errors = {}
+        self.stats = {"orders": 0, "pairs": 0, "candidates": 0, "quoted": 0}
+
+    def load(self, destinations: list[str]):
+        # Fetches whatever the store is missing for every warehouse and
+        # destination prefix, in parallel; nothing is written out
+        origins = [i.location.zip_code for i in self.warehouses]
+        self.errors.update(
+            zone_matrix(
+                origins,
+                destinations,
+                self.user_agent,
+                self.store,
+                lambda chunk: None,
+                self.carriers,
+                self.concurrency,
+                self.transport,
+            )
+        )
+
+    def features(self, rate_requests: list[RateRequest]):
+        # Per carrier zones and UPS ground days as [order, warehouse] arrays
+        dest3 = prefixes([i.destination.zip_code for i in rate_requests])
+        zones = {}
+        for carrier in self.carriers:
+            zones[carrier] = np.stack(
+                [
+                    self.store.table(carrier, i.location.zip_code[:3])[dest3]
+                    for i in self.warehouses
+                ],
+                axis=1,
+            )
+        ground = np.full((len(rate_requests), len(self.warehouses)), UNKNOWN)
+        table = load_ground_table(self.map_dir) if self.map_dir else None
+        if table:
+            for j, warehouse in enumerate(self.warehouses):
+                origin = warehouse.location.zip_code
+                for i, rate_request in enumerate(rate_requests):
+                    days = table.get((origin, rate_request.destination.state))
+                    if days is not None:
+                        ground[i, j] = days
+        return zones, ground
+
+    def candidates(self, zones: dict, ground: np.ndarray) -> np.ndarray:
+        # A warehouse is dropped for an order when another one is no worse on
+        # every carrier's zone and on ground days, and better on one (equal
+        # ties go to the earlier warehouse). Prices and transit grow with
+        # zone, so a dominated warehouse can't win.
+        features = [np.where(i == 0, UNKNOWN, i) for i in zones.values()] + [ground]
+        features = np.stack(features, axis=-1)
+        earlier = np.triu(np.ones((len(self.warehouses),) * 2, dtype=bool), 1)
+        keep = np.ones(features.shape[:2], dtype=bool)
+        for start in range(0, len(features), PRUNE_CHUNK):
+            chunk = features[start : start + PRUNE_CHUNK]
+            a, b = chunk[:, :, None, :], chunk[:, None, :, :]
+            no_worse = (a <= b).all(axis=-1)
+            better = (a < b).any(axis=-1)
+            dominated = (no_worse & (better | earlier)).any(axis=1)
+            keep[start : start + PRUNE_CHUNK] = ~dominated
+        return keep
+
+    def estimate(self, rate_requests, pairs, zones, ground):
+        # Rate card prices for each (order, warehouse) pair. UPS Ground
+        # arrives by the ground maps, other services by transit_days; services
+        # without either get no arrival and only win without a deadline.
+        requests = [rate_requests[i] for i in pairs[:, 0]]
+        ounces = [i.weight.to_ounces() for i in requests]
+        dims = np.array(
+            [
+                (i.dimensions.length, i.dimensions.width, i.dimensions.height)
+                for i in requests
+            ]
+        ).reshape(-1, 3)
+        ship_dates = to_ordinals([i.ship_date for i in requests])
+        days = ground[pairs[:, 0], pairs[:, 1]]
+        known = days != UNKNOWN
+        ground_arrival = np.full(len(pairs), NO_ARRIVAL, dtype=np.int64)
+        ground_arrival[known] = arrival_ordinals("ups", ship_dates[known], days[known])
+        columns = {"pair": [], "price": [], "arrival": [], "service": []}
+        services = []
+        for carrier in self.carriers:
+            carrier_zones = zones[carrier][pairs[:, 0], pairs[:, 1]]
+            prices = self.card.price_batch(
+                carrier, carrier_zones, ounces, dims[:, 0], dims[:, 1], dims[:, 2]
+            )
+            for service, service_prices in prices.items():
+                rows = np.flatnonzero(~np.isnan(service_prices) & (carrier_zones > 0))
+                days = transit_days(carrier, service)
+                if carrier == "ups" and service == UPS_GROUND:
+                    arrival = ground_arrival[rows]
+                elif days is not None:
+                    arrival = arrival_ordinals(
+                        carrier, ship_dates[rows], np.full(len(rows), days)
+                    )
+                else:
+                    arrival = np.full(len(rows), NO_ARRIVAL, dtype=np.int64)
+                columns["pair"].append(rows)
+                columns["price"].append(service_prices[rows])
+                columns["arrival"].append(arrival)
+                columns["service"].append(np.full(len(rows), len(services)))
+                services.append(f"{carrier}:{service}")
+        pair = np.concatenate(columns["pair"] or [np.zeros(0, dtype=np.int64)])
+        return pair, RateSet(
+            pairs[pair, 0],
+            np.concatenate(columns["price"] or [np.zeros(0)]),
+            np.concatenate(columns["arrival"] or [np.zeros(0)]).astype(np.int32),
+            np.concatenate(columns["service"] or [np.zeros(0)]).astype(np.int32),
+            services,
+            len(rate_requests),
+        )
+
+    def shortlist(self, pairs, estimates, limits, top: int) -> np.ndarray:
+        # The top pairs per order by cheapest estimate meeting the deadline
+        pair, rate_set = estimates
+        best = np.full(len(pairs), np.inf)
+        feasible = rate_set.arrival <= limits[rate_set.shipment]
+        np.minimum.at(best, pair[feasible], rate_set.price[feasible])
+        order = np.lexsort((best, pairs[:, 0]))
+        rank = np.zeros(len(pairs), dtype=np.int64)
+        starts = np.ones(len(order), dtype=bool)
+        starts[1:] = pairs[order[1:], 0] != pairs[order[:-1], 0]
+        group_start = np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))
+        rank[order] = np.arange(len(order)) - group_start
+        return pairs[rank < top]
+
+    def quote_pairs(self, rate_requests, pairs, raters, deadline):
+        def quote_pair(pair):
+            order, warehouse = pair
+            rate_request = replace(
+                rate_requests[order], origination=self.warehouses[warehouse].location
+            )
+            return quote(rate_request, raters, deadline)
+
+        rows, pair_index = [], []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for i, result in enumerate(executor.map(quote_pair, pairs.tolist())):
+                for carrier in result.carriers:
+                    if carrier.error:
+                        warehouse = self.warehouses[pairs[i, 1]].name
+                        key = f"{carrier.carrier}:{warehouse}:{pairs[i, 0]}"
+                        self.errors[key] = carrier.error
+                for rate in shipment_rates(result.rates):
+                    rows.append(
+                        (
+                            pairs[i, 0],
+                            rate.carrier,
+                            rate.service,
+                            rate.price,
+                            rate.arrival,
+                        )
+                    )
+                    pair_index.append(i)
+        self.stats["quoted"] += len(pairs)
+        return np.array(pair_index, dtype=np.int64), RateSet.from_rows(
+            rows, len(rate_requests)
+        )
+
+    def select(
+        self,
+        rate_requests: list[RateRequest],
+        arrive_by=None,
+        raters: Optional[dict[str, Rater]] = None,
+        deadline: float = DEFAULT_DEADLINE,
+        top: Optional[int] = None,
+    ) -> list[Optional[Assignment]]:
+        # Requests need no origination (it is set per warehouse); arrive_by is
+        # one date, one per order, or None for the cheapest regardless of arrival
+        if self.card is None and raters is None:
+            raise ValueError("Need a rate card or raters")
+        if arrive_by is None:
+            limits = np.full(len(rate_requests), NO_ARRIVAL, dtype=np.int64)
+        else:
+            limits = np.broadcast_to(to_ordinals(arrive_by), (len(rate_requests),))
+        zones, ground = self.features(rate_requests)
+        pairs = np.argwhere(self.candidates(zones, ground))
+        self.stats["orders"] += len(rate_requests)
+        self.stats["pairs"] += len(rate_requests) * len(self.warehouses)
+        self.stats["candidates"] += len(pairs)
+        if raters is None:
+            pair, rate_set = self.estimate(rate_requests, pairs, zones, ground)
+        else:
+            if self.card is not None and top is not None:
+                # Rate card estimates are only needed to pick the shortlist
+                estimates = self.estimate(rate_requests, pairs, zones, ground)
+                pairs = self.shortlist(pairs, estimates, limits, top)
+            pair, rate_set = self.quote_pairs(rate_requests, pairs, raters, deadline)
+        rows = rate_set.cheapest_by_deadline(limits)
+        return [
+            (
+                None
+                if row < 0
+                else Assignment(
+                    self.warehouses[pairs[pair[row], 1]], rate_set.rate(row)
+                )
+            )
+            for row in rows
+        ]
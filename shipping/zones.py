@@ -0,0 +1,374 @@
+import csv
+import datetime as dt
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from shipping import metrics
+from shipping.packed import ZONES, PackedTable, write_packed
+from shipping.transport import Transport
+from shipping.ups import get_ups_zone_df, get_ups_zone_map
+from shipping.usps import get_usps_zone
+
+
+def prefixes(zip_codes: list[str]) -> np.ndarray:
+    return np.array([int(i[:3]) for i in zip_codes], dtype=np.intp)
+
+
+class ZoneStore:
+    # Zones per (carrier, origin3) are held as a 1000-entry array indexed by
+    # the destination prefix; 0 means unknown. Origins in the snapshot (a
+    # packed file from export) are read-only views into its mapping, copied
+    # only when new zones are saved for them. "effective" is the date zones
+    # were fetched, not the date printed on the carrier's sheet, so
+    # max_age_days counts from the fetch.
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_age_days: int = 30,
+        snapshot: Optional[str] = None,
+    ):
+        self.max_age = dt.timedelta(days=max_age_days)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._tables = {}
+        self.snapshot = None
+        if snapshot is not None:
+            packed = PackedTable(snapshot, ZONES)
+            if dt.date.fromtimestamp(packed.created).isoformat() >= self._cutoff():
+                self.snapshot = packed
+        with self._lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS zones (carrier TEXT, origin3 TEXT, "
+                "dest3 TEXT, zone INTEGER, effective TEXT, "
+                "PRIMARY KEY (carrier, origin3, dest3))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS origins (carrier TEXT, origin3 TEXT, "
+                "effective TEXT, PRIMARY KEY (carrier, origin3))"
+            )
+
+    def _cutoff(self) -> str:
+        return (dt.date.today() - self.max_age).isoformat()
+
+    def _packed(self, carrier: str, origin3: str) -> Optional[np.ndarray]:
+        # Origins share rows across carriers, so a row can be all unknown
+        if self.snapshot is None:
+            return None
+        row = self.snapshot.row(carrier, origin3)
+        return row if row is not None and row.any() else None
+
+    def table(self, carrier: str, origin3: str) -> np.ndarray:
+        key = (carrier, origin3)
+        with self._lock:
+            packed = None if key in self._tables else self._packed(*key)
+            if packed is not None:
+                self._tables[key] = packed
+            if key not in self._tables:
+                table = np.zeros(1000, dtype=np.int16)
+                rows = self.conn.execute(
+                    "SELECT dest3, zone FROM zones WHERE carrier = ? "
+                    "AND origin3 = ? AND effective >= ?",
+                    (carrier, origin3, self._cutoff()),
+                )
+                for dest3, zone in rows:
+                    table[int(dest3)] = zone
+                self._tables[key] = table
+            return self._tables[key]
+
+    def is_loaded(self, carrier: str, origin3: str) -> bool:
+        # Only complete origins are exported, so the snapshot counts
+        if self._packed(carrier, origin3) is not None:
+            return True
+        row = self.conn.execute(
+            "SELECT 1 FROM origins WHERE carrier = ? AND origin3 = ? "
+            "AND effective >= ?",
+            (carrier, origin3, self._cutoff()),
+        ).fetchone()
+        return row is not None
+
+    def save(self, carrier: str, origin3: str, zones: dict[str, int], complete=False):
+        effective = dt.date.today().isoformat()
+        with self._lock, self.conn:
+            table = self.table(carrier, origin3)
+            if not table.flags.writeable:
+                table = self._tables[(carrier, origin3)] = table.copy()
+            if complete:
+                table[:] = 0
+                self.conn.execute(
+                    "DELETE FROM zones WHERE carrier = ? AND origin3 = ?",
+                    (carrier, origin3),
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO origins VALUES (?, ?, ?)",
+                    (carrier, origin3, effective),
+                )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO zones VALUES (?, ?, ?, ?, ?)",
+                [(carrier, origin3, k, v, effective) for k, v in zones.items()],
+            )
+            for dest3, zone in zones.items():
+                table[int(dest3)] = zone
+
+    def export(self, path: str) -> int:
+        # Packs every complete UPS origin and every USPS origin into one file
+        # for ZoneStore(snapshot=path); dated by its oldest zones
+        cutoff = self._cutoff()
+        with self._lock:
+            keys = {
+                i
+                for i in (self.snapshot.keys() if self.snapshot is not None else [])
+                if self._packed(*i) is not None
+            }
+            keys.update(
+                self.conn.execute(
+                    "SELECT carrier, origin3 FROM origins WHERE effective >= ?",
+                    (cutoff,),
+                )
+            )
+            keys.update(
+                self.conn.execute(
+                    "SELECT DISTINCT carrier, origin3 FROM zones "
+                    "WHERE carrier != 'ups' AND effective >= ?",
+                    (cutoff,),
+                )
+            )
+            (oldest,) = self.conn.execute(
+                "SELECT MIN(effective) FROM zones WHERE effective >= ?", (cutoff,)
+            ).fetchone()
+            carriers = sorted({i for i, _ in keys})
+            origins = sorted({i for _, i in keys})
+            data = np.zeros((len(carriers), len(origins), 1000), dtype=np.int16)
+            for carrier, origin3 in keys:
+                data[carriers.index(carrier), origins.index(origin3)] = self.table(
+                    carrier, origin3
+                )
+        created = dt.datetime.fromisoformat(oldest).timestamp() if oldest else None
+        if self.snapshot is not None:
+            created = min(created or self.snapshot.created, self.snapshot.created)
+        write_packed(
+            path,
+            ZONES,
+            carriers,
+            origins,
+            [f"{i:03d}" for i in range(1000)],
+            data,
+            created,
+        )
+        return len(origins)
+
+    def lookup(self, carrier: str, origin: str, destinations: list[str]) -> list[int]:
+        zones = self.table(carrier, origin[:3])[prefixes(destinations)]
+        if not zones.all():
+            missing = destinations[int(np.argmin(zones != 0))]
+            raise ValueError(f"No {carrier.upper()} zone for {missing}")
+        return zones.tolist()
+
+    def ups_zones(
+        self,
+        origin: str,
+        destinations: list[str],
+        user_agent: str,
+        transport: Transport = None,
+    ) -> list[int]:
+        self.load_ups(origin, user_agent, transport)
+        return self.lookup("ups", origin, destinations)
+
+    def load_ups(self, origin: str, user_agent: str, transport: Transport = None):
+        # The sheet is fetched outside the lock so origins load in parallel
+        origin3 = origin[:3]
+        with self._lock:
+            loaded = self.is_loaded("ups", origin3)
+        metrics.inc(
+            "shipping_zone_store_requests_total",
+            carrier="ups",
+            result="hit" if loaded else "miss",
+        )
+        if not loaded:
+            zone_df = get_ups_zone_df(origin, user_agent, transport)
+            self.save("ups", origin3, get_ups_zone_map(zone_df), complete=True)
+
+    def usps_zones(
+        self,
+        origin: str,
+        destinations: list[str],
+        user_agent: str,
+        transport: Transport = None,
+    ) -> list[int]:
+        # Hits and misses are both counted per destination; one call is made
+        # per missing prefix
+        table = self.table("usps", origin[:3])
+        missing = {}
+        misses = 0
+        for zip_code, zone in zip(destinations, table[prefixes(destinations)]):
+            if not zone:
+                missing.setdefault(zip_code[:3], zip_code)
+                misses += 1
+        metrics.inc(
+            "shipping_zone_store_requests_total",
+            len(destinations) - misses,
+            carrier="usps",
+            result="hit",
+        )
+        metrics.inc(
+            "shipping_zone_store_requests_total",
+            misses,
+            carrier="usps",
+            result="miss",
+        )
+        for dest3, zip_code in missing.items():
+            zone = get_usps_zone(origin, zip_code, user_agent, transport)
+            self.save("usps", origin[:3], {dest3: zone})
+        return self.lookup("usps", origin, destinations)
+
+
+MATRIX_COLUMNS = ["origin", "origin3", "dest3", "ups_zone", "usps_zone"]
+
+
+def read_zip_codes(path: str) -> list[str]:
+    # One ZIP per line, or a CSV with a zip_code/zip column (else the first)
+    with open(path, "r", newline="") as f:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(f)
+            columns = reader.fieldnames or []
+            column = next((i for i in ("zip_code", "zip") if i in columns), None)
+            values = [row[column or columns[0]] for row in reader]
+        else:
+            values = list(f)
+    # Spreadsheets drop leading zeros
+    return [i.strip().zfill(5) for i in values if i.strip()]
+
+
+def representatives(zip_codes: Iterable[str]) -> dict[str, str]:
+    # First ZIP seen for each 3-digit prefix; zones only depend on the prefix
+    output = {}
+    for zip_code in zip_codes:
+        if zip_code[:3].isdigit():
+            output.setdefault(zip_code[:3], zip_code)
+    return output
+
+
+def zone_matrix(
+    origins: Iterable[str],
+    destinations: Iterable[str],
+    user_agent: str,
+    store: ZoneStore,
+    write: Callable[[dict], None],
+    carriers: Iterable[str] = ("ups", "usps"),
+    concurrency: int = 8,
+    transport: Transport = None,
+) -> dict[str, str]:
+    # Writes one chunk per origin prefix (every destination prefix) and
+    # returns fetch errors; zones that could not be fetched are 0
+    carriers = list(carriers)
+    unknown = set(carriers) - {"ups", "usps"}
+    if unknown:
+        raise ValueError(f"Unknown carriers {sorted(unknown)}")
+    origins = representatives(origins)
+    destinations = representatives(destinations)
+    dest3 = sorted(destinations)
+    index = prefixes(dest3)
+    errors = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Everything is queued up front so later origins fetch while earlier
+        # ones are written
+        ups_sheets = {}
+        usps_calls = {}
+        for origin3, origin in origins.items():
+            if "ups" in carriers:
+                ups_sheets[origin3] = executor.submit(
+                    store.load_ups, origin, user_agent, transport
+                )
+            if "usps" in carriers:
+                table = store.table("usps", origin3)
+                usps_calls[origin3] = {
+                    executor.submit(
+                        get_usps_zone, origin, destinations[i], user_agent, transport
+                    ): i
+                    for i in dest3
+                    if not table[int(i)]
+                }
+        for origin3, origin in origins.items():
+            chunk = {
+                "origin": [origin] * len(dest3),
+                "origin3": [origin3] * len(dest3),
+                "dest3": dest3,
+            }
+            if "ups" in carriers:
+                try:
+                    ups_sheets[origin3].result()
+                except Exception as e:
+                    errors[f"ups:{origin3}"] = str(e) or type(e).__name__
+                chunk["ups_zone"] = store.table("ups", origin3)[index]
+            if "usps" in carriers:
+                zones = {}
+                for future, dest in usps_calls[origin3].items():
+                    try:
+                        zones[dest] = future.result()
+                    except Exception as e:
+                        errors[f"usps:{origin3}-{dest}"] = str(e) or type(e).__name__
+                if zones:
+                    store.save("usps", origin3, zones)
+                chunk["usps_zone"] = store.table("usps", origin3)[index]
+            write(chunk)
+    return errors
+
+
+class CSVMatrixWriter:
+    def __init__(self, path: str, columns: list[str]):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.columns = columns
+        self.writer.writerow(columns)
+
+    def write(self, chunk: dict):
+        columns = [
+            [int(i) or "" for i in chunk[k]] if k.endswith("_zone") else chunk[k]
+            for k in self.columns
+        ]
+        self.writer.writerows(zip(*columns))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetMatrixWriter:
+    def __init__(self, path: str, columns: list[str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError(
+                'Parquet output needs pyarrow (pip install "shipping[parquet]")'
+            )
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema(
+            [(k, pa.int16() if k.endswith("_zone") else pa.string()) for k in columns]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, chunk: dict):
+        arrays = []
+        for k in self.columns:
+            if k.endswith("_zone"):
+                zones = np.asarray(chunk[k], dtype=np.int16)
+                arrays.append(self.pa.array(zones, mask=zones == 0))
+            else:
+                arrays.append(self.pa.array(chunk[k], type=self.pa.string()))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_matrix_writer(path: str, carriers: Iterable[str] = ("ups", "usps")):
+    columns = [i for i in MATRIX_COLUMNS if not i.endswith("_zone")]
+    columns += [f"{i}_zone" for i in carriers]
+    if path.endswith(".parquet"):
+        return ParquetMatrixWriter(path, columns)
+    return CSVMatrixWriter(path, columns)
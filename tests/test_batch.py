@@ -0,0 +1,64 @@
+import asyncio
+import io
+import json
+
+from shipping.batch import completed_ids, rate_batch, rate_batch_async
+from shipping.common import Rate
+
+
+def rows(count, **values):
+    row = {"from_zip": "60602", "to_zip": "10001", "ounces": 12, "size": "8x4x4"}
+    return [{**row, **values, "id": str(i)} for i in range(count)]
+
+
+def test_bad_rows_are_reported_without_stopping_workers():
+    output = io.StringIO()
+    summary = asyncio.run(
+        asyncio.wait_for(
+            rate_batch_async(
+                iter(rows(20, ounces=None)), output, {"ups": lambda _: []}, 2
+            ),
+            5,
+        )
+    )
+    assert summary.failed == 20
+    results = [json.loads(i) for i in output.getvalue().splitlines()]
+    assert all("request" in i["errors"] for i in results)
+
+
+def test_worker_failure_stops_the_producer():
+    class Full(io.StringIO):
+        def write(self, text):
+            raise OSError("disk full")
+
+    try:
+        asyncio.run(
+            asyncio.wait_for(
+                rate_batch_async(iter(rows(20)), Full(), {"ups": lambda _: []}, 2),
+                5,
+            )
+        )
+    except OSError as e:
+        assert str(e) == "disk full"
+    else:
+        raise AssertionError("expected the worker's error")
+
+
+def test_resume_skips_partial_lines_and_retries_failures(tmp_path):
+    output = tmp_path / "rates.jsonl"
+    output.write_text(
+        '{"id": "0", "rates": [], "errors": {}}\n'
+        '{"id": "1", "rates": [], "errors": {"ups": "Timed out"}}\n'
+        '{"id": "2", "ra'
+    )
+    assert completed_ids(str(output)) == {"0"}
+    shipments = tmp_path / "shipments.csv"
+    shipments.write_text(
+        "id,from_zip,to_zip,ounces,size\n"
+        + "".join(f"{i},60602,10001,12,8x4x4\n" for i in range(3))
+    )
+    rater = {"ups": lambda _: [Rate("9.10", "03", None, "ups")]}
+    summary = rate_batch(str(shipments), str(output), rater, resume=True)
+    assert (summary.skipped, summary.succeeded) == (1, 2)
+    results = [json.loads(i) for i in output.read_text().splitlines()]
+    assert [i["id"] for i in results] == ["0", "1", "1", "2"]
@@ -0,0 +1,54 @@
+import datetime as dt
+
+import pytest
+
+from shipping.boxes import Box, pick_box
+from shipping.common import Dimensions, Location, Rate, RateRequest, Weight
+
+ARRIVAL = dt.date(2026, 10, 22)
+RATE_REQUEST = RateRequest(
+    origination=Location(zip_code="60602", state="IL"),
+    destination=Location(zip_code="10001", state="NY"),
+    weight=Weight(1, 0),
+    dimensions=Dimensions(6, 4, 2),
+    ship_date=dt.date(2026, 10, 19),
+)
+BOXES = [Box("small", Dimensions(8, 6, 4)), Box("large", Dimensions(12, 10, 8))]
+
+
+def flat_rater(price: str):
+    def rater(rate_request):
+        packages = rate_request.get_packages()
+        if len(packages) == 1:
+            return [Rate(price, "1", ARRIVAL, "usps")]
+        return [Rate(price, "1", ARRIVAL, "usps", i) for i in range(len(packages))]
+
+    return rater
+
+
+def failing_rater(rate_request):
+    raise TypeError("bad response")
+
+
+def test_failing_carrier_is_skipped():
+    box_rate = pick_box(
+        RATE_REQUEST,
+        Dimensions(6, 4, 2),
+        Weight(1, 0),
+        BOXES,
+        {"ups": failing_rater, "usps": flat_rater("5.00")},
+        ARRIVAL,
+    )
+    assert (box_rate.box.name, box_rate.rate.carrier) == ("small", "usps")
+
+
+def test_errors_are_reported_when_no_carrier_rates():
+    with pytest.raises(ValueError, match="bad response"):
+        pick_box(
+            RATE_REQUEST,
+            Dimensions(6, 4, 2),
+            Weight(1, 0),
+            BOXES,
+            {"ups": failing_rater},
+            ARRIVAL,
+        )
@@ -0,0 +1,69 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from shipping.business_days import (
+    BusinessCalendar,
+    arrival_date,
+    arrival_ordinals,
+    carrier_holidays,
+)
+
+
+def test_weekends():
+    friday = dt.date(2026, 10, 23)
+    assert arrival_date("ups", friday, 1) == dt.date(2026, 10, 26)
+    assert arrival_date("usps", friday, 1) == dt.date(2026, 10, 24)  # Saturday
+    assert arrival_date("ups", friday, 5) == dt.date(2026, 10, 30)
+
+
+def test_ship_date_off_a_service_day_waits_for_the_next_pickup():
+    saturday = dt.date(2026, 10, 24)
+    assert arrival_date("ups", saturday, 1) == dt.date(2026, 10, 27)
+    assert arrival_date("ups", saturday, 0) == dt.date(2026, 10, 26)
+    assert arrival_date("ups", dt.datetime(2026, 10, 24, 18, 30), 1) == dt.date(
+        2026, 10, 27
+    )
+    assert arrival_date("ups", "2026-10-24", 1) == dt.date(2026, 10, 27)
+
+
+def test_holidays():
+    # Thanksgiving
+    assert arrival_date("ups", dt.date(2026, 11, 25), 1) == dt.date(2026, 11, 27)
+    # Christmas on a Sunday is observed on Monday
+    assert arrival_date("ups", dt.date(2022, 12, 23), 1) == dt.date(2022, 12, 27)
+    # Independence Day on a Saturday: UPS closes Friday, USPS on the day
+    assert dt.date(2026, 7, 3) in carrier_holidays("ups", 2026)
+    assert dt.date(2026, 7, 4) in carrier_holidays("usps", 2026)
+    assert arrival_date("ups", dt.date(2026, 7, 2), 1) == dt.date(2026, 7, 6)
+    assert arrival_date("usps", dt.date(2026, 7, 2), 1) == dt.date(2026, 7, 3)
+    assert arrival_date("usps", dt.date(2026, 7, 3), 1) == dt.date(2026, 7, 6)
+    # Columbus Day is a USPS holiday only
+    assert arrival_date("usps", dt.date(2026, 10, 10), 1) == dt.date(2026, 10, 13)
+    assert arrival_date("ups", dt.date(2026, 10, 9), 1) == dt.date(2026, 10, 12)
+
+
+def test_dates_outside_the_cached_calendar():
+    assert arrival_date("ups", dt.date(2040, 12, 24), 1) == dt.date(2040, 12, 26)
+    assert arrival_date("ups", dt.date(2001, 1, 1), 1) == dt.date(2001, 1, 3)
+
+
+def test_calendar_range_is_checked():
+    calendar = BusinessCalendar(range(5), [], dt.date(2026, 1, 1), dt.date(2026, 1, 31))
+    with pytest.raises(ValueError):
+        calendar.add_business_days(dt.date(2025, 12, 31), 1)
+    with pytest.raises(ValueError):
+        calendar.add_business_days(dt.date(2026, 1, 29), 5)
+
+
+def test_batch_matches_single_dates():
+    start = dt.date(2026, 11, 20)
+    ships = [start + dt.timedelta(days=i) for i in range(45)]
+    days = [i % 6 for i in range(45)]
+    for carrier in ("ups", "usps"):
+        batch = arrival_ordinals(carrier, [i.toordinal() for i in ships], days)
+        expected = [
+            arrival_date(carrier, i, j).toordinal() for i, j in zip(ships, days)
+        ]
+        assert np.array_equal(batch, expected)
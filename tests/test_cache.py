@@ -0,0 +1,70 @@
+import datetime as dt
+
+from shipping.cache import CachedRater, SQLiteCache, cache_key, rates_from_json
+from shipping.common import Dimensions, Location, Package, Rate, RateRequest, Weight
+
+RATE_REQUEST = RateRequest(
+    origination=Location(zip_code="60602", state="IL"),
+    destination=Location(zip_code="10001", state="NY"),
+    weight=Weight(0, 12),
+    dimensions=Dimensions(8, 4, 4),
+    ship_date=dt.datetime.now() + dt.timedelta(days=1),
+)
+
+
+def test_rater_options_are_part_of_the_key():
+    assert cache_key("ups", RATE_REQUEST, ("maps", True)) != cache_key(
+        "ups", RATE_REQUEST, ("maps", False)
+    )
+
+
+def test_differently_configured_raters_do_not_share_entries(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "rates.db"))
+    ground = Rate("9.10", "03", dt.date(2026, 10, 22), "ups")
+    no_ground = Rate("9.10", "03", None, "ups")
+    with_days = CachedRater("ups", lambda _: [ground], cache, options=("m", False))
+    without = CachedRater("ups", lambda _: [no_ground], cache, options=("m", True))
+    assert with_days(RATE_REQUEST) == [ground]
+    assert without(RATE_REQUEST) == [no_ground]
+    assert with_days(RATE_REQUEST) == [ground]
+
+
+def test_hits_do_not_write_until_flushed(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "rates.db"))
+    cache.set("key", [], dt.datetime.now().timestamp() + 60)
+    for _ in range(cache.TOUCH_EVERY - 1):
+        assert cache.get("key") == []
+    assert cache._used
+    cache.get("key")
+    assert not cache._used
+
+
+def test_sqlite_round_trip_keeps_packages(tmp_path):
+    packages = (
+        Package(Weight(1, 0), Dimensions(8, 6, 4)),
+        Package(Weight(2, 0), Dimensions(12, 10, 8)),
+    )
+    rate_request = RateRequest(
+        RATE_REQUEST.origination,
+        RATE_REQUEST.destination,
+        packages[0].weight,
+        packages[0].dimensions,
+        RATE_REQUEST.ship_date,
+        packages,
+    )
+    rates = [
+        Rate("7.10", "03", dt.date(2026, 10, 22), "ups", 0),
+        Rate("9.40", "03", dt.date(2026, 10, 22), "ups", 1),
+        Rate("16.50", "03", dt.date(2026, 10, 22), "ups", None),
+    ]
+    calls = []
+    cache = SQLiteCache(str(tmp_path / "rates.db"))
+    rater = CachedRater("ups", lambda i: calls.append(i) or rates, cache)
+    assert rater(rate_request) == rates
+    assert rater(rate_request) == rates
+    assert len(calls) == 1
+
+
+def test_rows_without_package_still_load():
+    (rate,) = rates_from_json('[["7.10", "03", "2026-10-22", "ups"]]')
+    assert rate == Rate("7.10", "03", dt.date(2026, 10, 22), "ups")
@@ -0,0 +1,20 @@
+from shipping.columnar import RequestBatch
+
+ROW = {
+    "from_zip": "60602",
+    "from_state": "IL",
+    "to_state": "NY",
+    "ounces": "12",
+    "size": "8x4x4",
+    "date": "2026-10-19",
+}
+
+
+def test_long_ids_and_zip_plus_four_are_kept(tmp_path):
+    long_id = "order-" + "x" * 60
+    batch = RequestBatch.from_rows([{**ROW, "id": long_id, "to_zip": "10001-2345"}])
+    assert batch.id[0] == long_id
+    assert batch.request(0).destination.zip_code == "10001-2345"
+    path = tmp_path / "requests.jsonl"
+    batch.to_jsonl(str(path))
+    assert RequestBatch.from_file(str(path)).id[0] == long_id
@@ -0,0 +1,23 @@
+import json
+import os
+import subprocess
+import sys
+
+BENCH_IMPORT = os.path.join(
+    os.path.dirname(__file__), "..", "benchmarks", "bench_import.py"
+)
+
+
+def test_core_modules_import_no_heavy_dependencies():
+    # The timing limit is loose here; shared runners are too noisy for the
+    # benchmark's default, while a heavy import fails either way
+    out = subprocess.run(
+        [sys.executable, BENCH_IMPORT, "--repeat", "1", "--max-seconds", "5"],
+        capture_output=True,
+        text=True,
+    )
+    results = json.loads(out.stdout)
+    heavy = {k: v["heavy_imports"] for k, v in results["modules"].items()}
+    assert heavy == {k: [] for k in heavy}
+    assert "shipping.main" in heavy
+    assert out.returncode == 0, out.stdout
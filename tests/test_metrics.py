@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from shipping import metrics, zones
+from shipping.zones import ZoneStore
+
+
+@pytest.fixture
+def registry():
+    metrics.enable()
+    metrics.registry.reset()
+    yield metrics.registry
+    metrics.registry.enabled = False
+    metrics.registry.reset()
+
+
+def stage_totals(registry) -> dict:
+    return {row["stage"]: row["total_ms"] for row in registry.profile()}
+
+
+def test_nested_stages_are_disjoint(registry):
+    with metrics.stage("parse", carrier="ups"):
+        time.sleep(0.02)
+        with metrics.stage("ground_days", carrier="ups"):
+            time.sleep(0.05)
+    totals = stage_totals(registry)
+    assert totals["ground_days"] >= 50
+    assert 20 <= totals["parse"] < 50
+
+
+def test_usps_zone_hits_and_misses_are_per_destination(registry, monkeypatch):
+    calls = []
+
+    def get_usps_zone(origin, destination, user_agent, transport=None):
+        calls.append(destination)
+        return 5
+
+    monkeypatch.setattr(zones, "get_usps_zone", get_usps_zone)
+    store = ZoneStore()
+    destinations = ["10001", "10002", "10003", "90001"]
+    assert store.usps_zones("60602", destinations, "agent") == [5, 5, 5, 5]
+    assert calls == ["10001", "90001"]
+    assert store.usps_zones("60602", destinations[:3], "agent") == [5, 5, 5]
+    counts = {
+        row["labels"]["result"]: row["value"]
+        for row in registry.snapshot()["counters"]
+        if row["name"] == "shipping_zone_store_requests_total"
+    }
+    assert counts == {"hit": 3, "miss": 4}
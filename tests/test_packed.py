@@ -0,0 +1,160 @@
+import csv
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from shipping import packed
+from shipping.packed import (
+    GROUND_DAYS,
+    HEADER,
+    ZONES,
+    PackedMapping,
+    PackedTable,
+    write_packed,
+)
+from shipping.ups_ground import (
+    GROUND_PACKED,
+    GROUND_TABLE,
+    load_ground_table,
+    write_ground_packed,
+)
+
+
+def write_zones(path, created=None):
+    data = np.array([[[2, 0, 8], [3, 4, 0]], [[1, 0, 0], [0, 0, 7]]], np.uint8)
+    write_packed(
+        str(path),
+        ZONES,
+        ["ups", "usps"],
+        ["100", "900"],
+        ["005", "100", "995"],
+        data,
+        created,
+    )
+    return data
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "zones.bin"
+    data = write_zones(path, created=1_700_000_000)
+    table = PackedTable(str(path), ZONES)
+    assert (table.kind, table.created) == (ZONES, 1_700_000_000)
+    assert table.layers == {"ups": 0, "usps": 1}
+    assert np.array_equal(table.data, data)
+    assert table.row("usps", "900").tolist() == [0, 0, 7]
+    assert table.get("ups", "100", "995") == 8
+    assert table.keys() == [
+        ("ups", "100"),
+        ("ups", "900"),
+        ("usps", "100"),
+        ("usps", "900"),
+    ]
+    assert not table.data.flags.writeable
+
+
+def test_missing_keys(tmp_path):
+    path = tmp_path / "zones.bin"
+    write_zones(path)
+    table = PackedTable(str(path))
+    assert table.row("fedex", "100") is None
+    assert table.row("ups", "500") is None
+    assert table.get("ups", "500", "100") == 0
+    assert table.get("ups", "100", "500") == 0
+    mapping = PackedMapping(table, "ups")
+    assert mapping[("100", "005")] == 2
+    with pytest.raises(KeyError):
+        mapping[("100", "100")]  # Zero is missing
+    assert ("900", "005") in mapping and ("500", "005") not in mapping
+    assert sorted(mapping) == [
+        ("100", "005"),
+        ("100", "995"),
+        ("900", "005"),
+        ("900", "100"),
+    ]
+    assert len(mapping) == 4
+    assert (
+        len(PackedMapping(table, "fedex")) == 0
+        and list(PackedMapping(table, "fedex")) == []
+    )
+
+
+def test_keys_must_be_sorted_and_match_the_data(tmp_path):
+    data = np.zeros((1, 2, 1), np.uint8)
+    with pytest.raises(ValueError, match="sorted"):
+        write_packed(str(tmp_path / "x.bin"), ZONES, ["ups"], ["9", "1"], ["a"], data)
+    with pytest.raises(ValueError, match="shape"):
+        write_packed(str(tmp_path / "x.bin"), ZONES, ["ups"], ["1"], ["a"], data)
+
+
+def test_bad_files_are_rejected(tmp_path):
+    path = tmp_path / "zones.bin"
+    write_zones(path)
+    content = path.read_bytes()
+    with pytest.raises(ValueError, match="expected"):
+        PackedTable(str(path), GROUND_DAYS)
+    bad = tmp_path / "bad.bin"
+    bad.write_bytes(b"XXXX" + content[4:])
+    with pytest.raises(ValueError, match="not a packed table"):
+        PackedTable(str(bad))
+    version = struct.pack("<H", packed.VERSION + 1)
+    bad.write_bytes(content[:4] + version + content[6:])
+    with pytest.raises(ValueError, match="version"):
+        PackedTable(str(bad))
+    bad.write_bytes(content[:-1])
+    with pytest.raises(ValueError, match="truncated"):
+        PackedTable(str(bad))
+    bad.write_bytes(content[: HEADER.size - 1])
+    with pytest.raises(ValueError, match="not a packed table"):
+        PackedTable(str(bad))
+
+
+def write_ground(map_dir, days: int, packed_days: int):
+    rows = [{"zip_code": "60602", "state": "NY", "days": days}]
+    with open(map_dir / "maps.csv", "w") as f:
+        f.write("file_name,zip_code,downloaded_at\n")
+    with open(map_dir / GROUND_TABLE, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["zip_code", "state", "days"])
+        writer.writeheader()
+        writer.writerows(rows)
+    write_ground_packed(str(map_dir), [{**rows[0], "days": packed_days}])
+
+
+def set_mtime(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+def test_ground_table_prefers_a_fresh_packed_file(tmp_path):
+    write_ground(tmp_path, 3, 3)
+    set_mtime(tmp_path / "maps.csv", 1000)
+    set_mtime(tmp_path / GROUND_TABLE, 2000)
+    set_mtime(tmp_path / GROUND_PACKED, 2000)
+    table = load_ground_table(str(tmp_path))
+    assert isinstance(table, PackedMapping)
+    assert table[("60602", "NY")] == 3
+
+
+def test_ground_table_falls_back_to_a_newer_csv(tmp_path):
+    write_ground(tmp_path, 4, 2)
+    set_mtime(tmp_path / "maps.csv", 1000)
+    set_mtime(tmp_path / GROUND_PACKED, 2000)
+    set_mtime(tmp_path / GROUND_TABLE, 3000)
+    assert load_ground_table(str(tmp_path)) == {("60602", "NY"): 4}
+
+
+def test_ground_table_falls_back_when_the_packed_file_is_broken(tmp_path):
+    write_ground(tmp_path, 4, 2)
+    (tmp_path / GROUND_PACKED).write_bytes(b"SHPK")
+    set_mtime(tmp_path / "maps.csv", 1000)
+    set_mtime(tmp_path / GROUND_TABLE, 2000)
+    set_mtime(tmp_path / GROUND_PACKED, 2000)
+    assert load_ground_table(str(tmp_path)) == {("60602", "NY"): 4}
+
+
+def test_ground_table_is_stale_after_new_maps(tmp_path):
+    write_ground(tmp_path, 4, 4)
+    set_mtime(tmp_path / GROUND_TABLE, 1000)
+    set_mtime(tmp_path / GROUND_PACKED, 1000)
+    set_mtime(tmp_path / "maps.csv", 2000)
+    assert load_ground_table(str(tmp_path)) is None
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from shipping import metrics
+from shipping.common import Rate
+from shipping.quote import quote
+
+
+@pytest.fixture
+def registry():
+    metrics.enable()
+    metrics.registry.reset()
+    yield metrics.registry
+    metrics.registry.enabled = False
+    metrics.registry.reset()
+
+
+@pytest.fixture
+def release():
+    # Holds slow raters until the test is done, so no thread outlives it
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def fast(rate_request):
+    return [Rate(9.5, "Ground", carrier="ups")]
+
+
+def test_slow_carrier_times_out_without_holding_up_the_other(registry, release):
+    def slow(rate_request):
+        release.wait(5)
+        return [Rate(1.0, "Priority", carrier="usps")]
+
+    start = time.perf_counter()
+    result = quote(None, {"ups": fast, "usps": slow}, deadline=0.2)
+    elapsed = time.perf_counter() - start
+    assert elapsed < 1
+    assert result.rates == [Rate(9.5, "Ground", carrier="ups")]
+    carriers = {i.carrier: i for i in result.carriers}
+    assert carriers["ups"].error is None
+    assert carriers["ups"].latency < 0.2
+    assert carriers["usps"].error == "Timed out after 0.2s"
+    assert 0.2 <= carriers["usps"].latency < 1
+    counters = {
+        (i["name"], i["labels"]["carrier"]): i["labels"]
+        for i in registry.snapshot()["counters"]
+    }
+    assert counters == {
+        ("shipping_carrier_errors_total", "usps"): {
+            "carrier": "usps",
+            "reason": "timeout",
+        }
+    }
+    histograms = {
+        i["labels"]["carrier"]: i["count"] for i in registry.snapshot()["histograms"]
+    }
+    assert histograms == {"ups": 1, "usps": 1}
+
+
+def test_per_carrier_deadlines(release):
+    def slow(rate_request):
+        release.wait(0.3)
+        return [Rate(1.0, "Priority", carrier="usps")]
+
+    result = quote(None, {"ups": fast, "usps": slow}, deadline={"usps": 2, "ups": 1})
+    assert [i.error for i in result.carriers] == [None, None]
+    assert len(result.rates) == 2
+
+
+def test_rater_errors_are_captured(registry):
+    def broken(rate_request):
+        raise ValueError("Invalid destination")
+
+    result = quote(None, {"ups": fast, "usps": broken})
+    assert result.to_dict()["carriers"]["usps"]["error"] == "Invalid destination"
+    assert result.to_dict()["carriers"]["ups"]["error"] is None
+    assert [i.carrier for i in result.rates] == ["ups"]
+    reasons = [
+        i["labels"]["reason"]
+        for i in registry.snapshot()["counters"]
+        if i["name"] == "shipping_carrier_errors_total"
+    ]
+    assert reasons == ["ValueError"]
@@ -0,0 +1,85 @@
+import datetime as dt
+
+import numpy as np
+
+from shipping.common import Dimensions, Location, Rate, RateRequest, Weight
+from shipping.ratecard import RateCard, billable_pounds, verify
+from shipping.zones import ZoneStore
+
+
+def test_ups_dimensional_weight():
+    # 12x12x12 = 1728 cu in / 139 = 12.4 -> 13 lb, whatever the actual weight
+    assert billable_pounds("ups", 16, 12, 12, 12) == 13
+    assert billable_pounds("ups", 16 * 20, 12, 12, 12) == 20
+    assert billable_pounds("ups", 8, 4, 4, 4) == 1
+
+
+def test_usps_dimensional_weight_above_one_cubic_foot():
+    assert billable_pounds("usps", 16, 12, 12, 12) == 1  # Exactly 1728 cu in
+    # 12x12x13 = 1872 cu in / 166 = 11.3 -> 12 lb
+    assert billable_pounds("usps", 16, 12, 12, 13) == 12
+    assert billable_pounds("usps", 16 * 15, 12, 12, 13) == 15
+
+
+def test_weight_rolls_up_to_whole_pounds():
+    assert billable_pounds("usps", [1, 16, 17, 33], 4, 4, 4).tolist() == [1, 1, 2, 3]
+
+
+def card() -> RateCard:
+    # Zones 1-2, up to 3 lb; zone 2 has no 3 lb price
+    prices = np.full((3, 4), np.nan)
+    prices[1, 1:] = [5.0, 6.0, 7.0]
+    prices[2, 1:3] = [8.0, 9.0]
+    return RateCard({("usps", "Priority Mail"): prices})
+
+
+def test_prices_outside_the_card_are_missing():
+    zones = [1, 1, 2, 2, 3, 0, -1]
+    ounces = [16, 48, 32, 48, 16, 16, 16]
+    prices = card().price_batch("usps", zones, ounces, 4, 4, 4)["Priority Mail"]
+    assert prices[:3].tolist() == [5.0, 7.0, 9.0]
+    assert np.isnan(prices[3:]).all()
+    too_heavy = card().price_batch("usps", [1], [16 * 4], 4, 4, 4)
+    assert np.isnan(too_heavy["Priority Mail"]).all()
+
+
+def test_from_csv(tmp_path):
+    path = tmp_path / "card.csv"
+    path.write_text(
+        "carrier,service,zone,weight,price\n"
+        "ups,03,2,1,9.50\nups,03,2,2,10.25\nusps,Priority Mail,2,1,8.00\n"
+    )
+    rate_card = RateCard.from_csv(str(path))
+    assert rate_card.services("ups") == ["03"]
+    prices = rate_card.price_batch("ups", [2, 2], [16, 32], 4, 4, 4)["03"]
+    assert prices.tolist() == [9.5, 10.25]
+
+
+def test_verify_survives_a_failing_carrier():
+    store = ZoneStore()
+    store.save("usps", "606", {"100": 1}, complete=True)
+    store.save("ups", "606", {"100": 1}, complete=True)
+    rate_request = RateRequest(
+        origination=Location(zip_code="60602"),
+        destination=Location(zip_code="10001"),
+        weight=Weight(1, 0),
+        dimensions=Dimensions(4, 4, 4),
+        ship_date=dt.date(2026, 10, 19),
+    )
+
+    def failing(rate_request):
+        raise ValueError("down")
+
+    def usps(rate_request):
+        return [Rate("5.50", "Priority Mail", carrier="usps")]
+
+    output = verify(
+        card(), {"ups": failing, "usps": usps}, [rate_request] * 3, "agent", store=store
+    )
+    assert output["errors"] == {"ups": 3}
+    assert output["usps:Priority Mail"] == {
+        "samples": 3,
+        "mean_diff": -0.5,
+        "mean_abs_diff": 0.5,
+        "max_abs_diff": 0.5,
+    }
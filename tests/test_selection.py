@@ -0,0 +1,74 @@
+import datetime as dt
+import json
+
+import numpy as np
+
+from shipping.common import Rate
+from shipping.selection import RateSet
+
+MONDAY = dt.date(2026, 10, 19)
+
+
+def day(offset: int) -> dt.date:
+    return MONDAY + dt.timedelta(days=offset)
+
+
+def rate_set() -> RateSet:
+    return RateSet.from_rows(
+        [
+            (0, "ups", "03", "9.00", day(4)),
+            (0, "ups", "02", "15.00", day(2)),
+            (0, "ups", "01", "30.00", day(1)),
+            (0, "usps", "1", "16.00", day(2)),  # Beaten by ups:02
+            (0, "usps", "0", "8.00", None),
+            (1, "usps", "1", "7.00", day(3)),
+            (1, "ups", "03", "7.00", day(3)),  # Tie: earliest row wins
+        ]
+    )
+
+
+def test_cheapest_by_deadline():
+    rates = rate_set()
+    assert rates.cheapest_by_deadline(day(2)).tolist() == [1, -1]
+    assert rates.cheapest_by_deadline(day(5)).tolist() == [0, 5]
+    assert rates.cheapest_by_deadline([day(1), day(3)]).tolist() == [2, 5]
+    assert rates.cheapest_by_deadline(day(5), services=["ups:03"]).tolist() == [0, 6]
+
+
+def test_pareto_front():
+    rates = rate_set()
+    assert np.flatnonzero(rates.pareto_front()).tolist() == [0, 1, 2, 4, 5]
+    assert np.flatnonzero(rates.pareto_front(["usps:1"])).tolist() == [3, 5]
+
+
+def test_from_jsonl_skips_rates_without_a_price(tmp_path):
+    path = tmp_path / "rates.jsonl"
+    rows = [
+        {"id": 1, "rates": [{"carrier": "ups", "service": "03", "price": None}]},
+        {
+            "id": 2,
+            "rates": [
+                {"carrier": "ups", "service": "03", "price": None},
+                {"carrier": "usps", "service": "1", "price": "5.10"},
+            ],
+        },
+    ]
+    path.write_text("".join(json.dumps(i) + "\n" for i in rows))
+    ids, rates = RateSet.from_jsonl(str(path))
+    assert ids == ["1", "2"]
+    assert (len(rates), rates.shipments) == (1, 2)
+    assert rates.cheapest_by_deadline(day(30)).tolist() == [-1, -1]
+    assert rates.pareto_front().tolist() == [True]
+
+
+def test_per_package_rates_are_not_compared_as_shipments():
+    rates = RateSet.from_rates(
+        [
+            [
+                Rate("4.00", "03", day(2), "ups", 0),
+                Rate("5.00", "03", day(2), "ups", 1),
+                Rate("9.00", "03", day(2), "ups"),
+            ]
+        ]
+    )
+    assert rates.price.tolist() == [9.0]
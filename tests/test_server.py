@@ -0,0 +1,36 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from shipping.server import ShippingServer
+
+
+@pytest.fixture
+def server():
+    server = ShippingServer(("127.0.0.1", 0), {"/echo": lambda data: data})
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_rejected_bodies_are_drained_on_keep_alive(server):
+    conn = http.client.HTTPConnection(*server.server_address[:2])
+    body = json.dumps({"path": "GET /health HTTP/1.1"})
+    conn.request("POST", "/missing", body=body)
+    response = conn.getresponse()
+    assert response.status == 404
+    response.read()
+    conn.request("POST", "/echo", body=json.dumps({"a": 1}))
+    response = conn.getresponse()
+    assert (response.status, json.loads(response.read())) == (200, {"a": 1})
+
+
+def test_invalid_content_length_is_rejected(server):
+    conn = http.client.HTTPConnection(*server.server_address[:2])
+    conn.putrequest("POST", "/echo")
+    conn.putheader("Content-Length", "-1")
+    conn.endheaders()
+    assert conn.getresponse().status == 400
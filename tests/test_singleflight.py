@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from shipping.singleflight import Group
+
+
+def test_followers_share_the_leaders_result():
+    group = Group("test")
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do("k", fn)))
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(group.do("k", fn)))
+        for _ in range(3)
+    ]
+    for i in followers:
+        i.start()
+    deadline = time.monotonic() + 5
+    while group.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    coalesced = group.stats()["coalesced"]
+    release.set()
+    for i in [leader, *followers]:
+        i.join(5)
+    assert coalesced == 3
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    assert group.stats() == {"calls": 1, "coalesced": 3, "in_flight": 0}
+
+
+def test_exceptions_are_shared_and_the_key_is_released():
+    group = Group("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            *(group.do_async("k", fail) for _ in range(3)), return_exceptions=True
+        )
+
+    errors = asyncio.run(main())
+    assert [str(i) for i in errors] == ["boom"] * 3
+    assert group.stats() == {"calls": 1, "coalesced": 2, "in_flight": 0}
+    with pytest.raises(KeyError):
+        group.do("k", lambda: {}["missing"])
+    assert group.stats()["in_flight"] == 0
+
+
+def test_synchronous_failures_release_the_key():
+    group = Group("test")
+
+    def raises():
+        raise TypeError("not a coroutine function")
+
+    async def main():
+        with pytest.raises(TypeError):
+            await group.do_async("k", raises)
+        with pytest.raises(TypeError):
+            await group.do_async("k", lambda: "not awaitable")
+        return await group.do_async("k", asyncio.sleep, 0, "ok")
+
+    assert asyncio.run(main()) == "ok"
+    assert group.stats()["in_flight"] == 0
+
+
+def test_cancelling_a_caller_leaves_the_shared_call_running():
+    group = Group("test")
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        impatient = asyncio.ensure_future(group.do_async("k", slow))
+        patient = asyncio.ensure_future(group.do_async("k", slow))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        return await patient, impatient.cancelled()
+
+    assert asyncio.run(main()) == ("done", True)
+    assert group.stats()["in_flight"] == 0
+
+
+def test_cancelled_shared_call_fails_every_caller():
+    group = Group("test")
+
+    async def main():
+        task = None
+
+        async def fn():
+            nonlocal task
+            task = asyncio.current_task()
+            await asyncio.sleep(1)
+
+        callers = [asyncio.ensure_future(group.do_async("k", fn)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        task.cancel()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(i, ValueError) for i in errors)
+    assert group.stats()["in_flight"] == 0
@@ -0,0 +1,88 @@
+import datetime as dt
+import os
+import sys
+
+import pytest
+
+from shipping import ups, ups_ground, usps
+from shipping.common import Dimensions, Location, Package, RateRequest, Weight
+from shipping.transport import Transport
+
+# The stand-in is a script next to the benchmarks, not part of the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from standin import days_for, start, standin_rewrites, zone_for  # noqa: E402
+
+RATE_REQUEST = RateRequest(
+    origination=Location(zip_code="60602", state="IL"),
+    destination=Location(zip_code="90210", state="CA"),
+    weight=Weight(1, 8),
+    dimensions=Dimensions(8, 4, 4),
+    ship_date=dt.date(2026, 10, 20),
+    packages=(
+        Package(Weight(1, 8), Dimensions(8, 4, 4)),
+        Package(Weight(2, 4), Dimensions(10, 6, 4)),
+    ),
+)
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def transport(server):
+    transport = Transport(rewrites=standin_rewrites(server.base_url), retries=0)
+    yield transport
+    transport.close()
+
+
+def test_ups_rates_cover_every_package(transport):
+    rates = ups.get_rate("token", RATE_REQUEST, "", True, transport)
+    assert {i.package for i in rates} == {0, 1, None}
+    assert all(i.carrier == "ups" for i in rates)
+
+
+def test_usps_rates_cover_every_package(transport):
+    rates = usps.get_rate("user", "password", RATE_REQUEST, transport)
+    assert {i.package for i in rates} == {0, 1, None}
+    assert all(i.carrier == "usps" for i in rates)
+
+
+def test_usps_zones_are_stable(transport):
+    assert usps.get_usps_zone("60602", "90210", "agent", transport) == zone_for(
+        "60602", "90210"
+    )
+
+
+def test_generated_maps_classify_to_their_days(transport, tmp_path):
+    errors = ups_ground.download_maps(
+        ["60602"], "agent", str(tmp_path), transport=transport
+    )
+    assert errors == {}
+    ups_ground.index_maps(str(tmp_path), workers=1)
+    for state in ("CA", "NY", "TX"):
+        assert ups_ground.ups_ground_days("60602", state, str(tmp_path)) == days_for(
+            "60602", state
+        )
+
+
+def test_injected_errors_and_unknown_paths(server, transport):
+    before = server.stats()
+    assert transport.get(server.base_url + "/unknown").status_code == 404
+    server.error_rate = 1.0
+    try:
+        response = transport.get(
+            "https://postcalc.usps.com/DomesticZoneChart/GetZone?origin=1&destination=2"
+        )
+    finally:
+        server.error_rate = 0.0
+    assert response.status_code == server.error_status
+    after = server.stats()
+    assert (
+        after["errors"].get("usps_zone", 0) == before["errors"].get("usps_zone", 0) + 1
+    )
+    assert after["requests"]["usps_zone"] == before["requests"].get("usps_zone", 0) + 1
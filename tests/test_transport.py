@@ -0,0 +1,93 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from shipping import metrics
+from shipping.transport import Transport
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Answers each request with the next scripted (status, headers) pair
+    def respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.server.requests.append(self.command)
+        status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    do_GET = do_POST = respond
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = []
+    server.script = []
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def registry():
+    metrics.enable()
+    metrics.registry.reset()
+    yield metrics.registry
+    metrics.registry.enabled = False
+    metrics.registry.reset()
+
+
+def test_get_is_retried_and_counted(server, registry):
+    server.script = [(503, {}), (502, {})]
+    response = Transport(backoff_factor=0).get(server.url + "/zone")
+    assert response.status_code == 200
+    assert server.requests == ["GET"] * 3
+    counters = {
+        i["labels"]["reason"]: i["value"]
+        for i in registry.snapshot()["counters"]
+        if i["name"] == "shipping_http_retries_total"
+    }
+    assert counters == {"503": 1, "502": 1}
+
+
+def test_post_is_not_replayed(server, registry):
+    server.script = [(503, {})]
+    response = Transport(backoff_factor=0).post(server.url + "/rate", json={})
+    assert response.status_code == 503
+    assert server.requests == ["POST"]
+
+
+def test_retry_after_is_honoured(server):
+    server.script = [(429, {"Retry-After": "1"})]
+    start = time.perf_counter()
+    response = Transport(backoff_factor=0).get(server.url + "/zone")
+    assert response.status_code == 200
+    assert time.perf_counter() - start >= 1
+    assert server.requests == ["GET"] * 2
+
+
+def test_retries_give_up_with_the_last_response(server):
+    server.script = [(500, {})] * 5
+    response = Transport(retries=2, backoff_factor=0).get(server.url)
+    assert response.status_code == 500
+    assert len(server.requests) == 3
+
+
+def test_rewrites_replace_the_prefix(server):
+    transport = Transport(rewrites={"https://onlinetools.ups.com": server.url})
+    assert transport.url("https://onlinetools.ups.com/api") == server.url + "/api"
+    assert transport.url("https://other.example/api") == "https://other.example/api"
+    assert transport.get("https://onlinetools.ups.com/api").status_code == 200
@@ -0,0 +1,118 @@
+import dataclasses
+import datetime as dt
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from shipping import ups
+from shipping.common import Dimensions, Location, Package, RateRequest, Weight
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures")
+PACKAGES = (
+    Package(Weight(1, 8), Dimensions(8, 4, 4)),
+    Package(Weight(2, 4), Dimensions(10, 6, 4)),
+)
+RATE_REQUEST = RateRequest(
+    origination=Location(zip_code="60602", state="IL"),
+    destination=Location(zip_code="10001", state="NY"),
+    weight=Weight(0, 0),
+    dimensions=Dimensions(0, 0, 0),
+    ship_date=dt.date(2026, 10, 19),
+    packages=PACKAGES,
+)
+
+
+class FakeTransport:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.payloads = []
+
+    def post(self, url, json=None, headers=None):
+        self.payloads.append(json)
+        return SimpleNamespace(status_code=200, content=self.content)
+
+
+def rate_response(charged: int) -> bytes:
+    with open(os.path.join(FIXTURES, "ups_rate.json"), "r") as f:
+        data = json.load(f)
+    for shipment in data["RateResponse"]["RatedShipment"]:
+        rated = dict(shipment["RatedPackage"][0])
+        uncharged = {k: v for k, v in rated.items() if k != "TotalCharges"}
+        shipment["RatedPackage"] = [rated] * charged + [uncharged]
+    return json.dumps(data).encode()
+
+
+def test_total_weight_is_sent_once_per_shipment():
+    transport = FakeTransport(rate_response(1))
+    ups.fetch_rate("token", RATE_REQUEST, "maps", True, transport)
+    shipment = transport.payloads[0]["RateRequest"]["Shipment"]
+    assert shipment["ShipmentTotalWeight"]["Weight"] == "3.75"
+    assert [i["PackageWeight"]["Weight"] for i in shipment["Package"]] == [
+        "1.5",
+        "2.25",
+    ]
+    assert all("ShipmentTotalWeight" not in i for i in shipment["Package"])
+
+
+def test_packages_without_charges_are_skipped():
+    rates = ups.fetch_rate(
+        "token", RATE_REQUEST, "maps", True, FakeTransport(rate_response(1))
+    )
+    assert {i.package for i in rates} == {0, None}
+    assert all(i.price is not None for i in rates)
+
+
+def test_multi_package_quotes_include_the_shipment_total():
+    with open(os.path.join(FIXTURES, "ups_rate.json"), "r") as f:
+        shipments = json.load(f)["RateResponse"]["RatedShipment"]
+    totals = {
+        i["Service"]["Code"]: i["TotalCharges"]["MonetaryValue"] for i in shipments
+    }
+    rates = ups.fetch_rate(
+        "token", RATE_REQUEST, "maps", True, FakeTransport(rate_response(2))
+    )
+    assert {i.service: i.price for i in rates if i.package is None} == totals
+    assert sorted(
+        i.package for i in rates if i.service == "03" and i.package is not None
+    ) == [0, 1]
+
+
+def shipment(code: str, total: str, packages) -> dict:
+    return {
+        "Service": {"Code": code},
+        "TotalCharges": {"MonetaryValue": total},
+        "GuaranteedDelivery": {"BusinessDaysInTransit": "2"},
+        "RatedPackage": packages,
+    }
+
+
+def parse(rated_shipment, rate_request=RATE_REQUEST) -> list:
+    content = json.dumps({"RateResponse": {"RatedShipment": rated_shipment}})
+    return list(ups.iter_rates(content.encode(), rate_request, "maps", True))
+
+
+def test_single_rated_shipment_object():
+    single = dataclasses.replace(RATE_REQUEST, packages=())
+    rates = parse(shipment("02", "20.00", {"TotalCharges": {}}), single)
+    assert [(i.service, i.price, i.package) for i in rates] == [("02", "20.00", None)]
+    assert rates[0].arrival == dt.date(2026, 10, 21)
+
+
+def test_rated_package_as_dict_or_list():
+    one = {"TotalCharges": {"MonetaryValue": "8.00"}}
+    two = {"TotalCharges": {"MonetaryValue": "9.00"}}
+    as_dict = parse([shipment("03", "17.00", one)])
+    as_list = parse([shipment("03", "17.00", [one, two])])
+    assert [(i.price, i.package) for i in as_dict] == [("8.00", 0), ("17.00", None)]
+    assert [(i.price, i.package) for i in as_list] == [
+        ("8.00", 0),
+        ("9.00", 1),
+        ("17.00", None),
+    ]
+
+
+def test_missing_rated_shipment_raises():
+    with pytest.raises(ValueError):
+        list(ups.iter_rates(b'{"response": {"errors": []}}', RATE_REQUEST, "m", True))
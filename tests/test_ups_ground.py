@@ -0,0 +1,101 @@
+import datetime as dt
+import os
+
+import pytest
+
+from shipping import ups_ground
+from shipping.ups_ground import download_file, download_maps, write_maps
+
+
+class FailingTransport:
+    def get(self, url, stream=False, headers=None):
+        raise ConnectionError("unreachable")
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="Needs /proc")
+def test_failed_download_leaves_no_temp_file_or_fd(tmp_path):
+    before = len(os.listdir("/proc/self/fd"))
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            download_file(
+                "https://example.com/map.gif",
+                "agent",
+                FailingTransport(),
+                str(tmp_path),
+            )
+    assert os.listdir(tmp_path) == []
+    assert len(os.listdir("/proc/self/fd")) == before
+
+
+def test_download_maps_prunes_superseded_maps(tmp_path, monkeypatch):
+    now = dt.datetime.now().isoformat(timespec="seconds")
+    old = "2000-01-01T00:00:00"
+    write_maps(
+        str(tmp_path),
+        [
+            {
+                "file_name": "0123456789abcdef.gif",
+                "zip_code": "60602",
+                "downloaded_at": old,
+            },
+            {
+                "file_name": "fedcba9876543210.gif",
+                "zip_code": "10001",
+                "downloaded_at": now,
+            },
+            {
+                "file_name": "1111111111111111.gif",
+                "zip_code": "30301",
+                "downloaded_at": old,
+            },
+        ],
+    )
+    for name in [
+        "0123456789abcdef.gif",
+        "fedcba9876543210.gif",
+        "1111111111111111.gif",
+    ]:
+        (tmp_path / name).write_bytes(b"old")
+    (tmp_path / "notes.txt").write_text("keep")
+    (tmp_path / "ground_days.csv").write_text("zip_code,state,days\n")
+    # Refreshed 60602 now has the image 30301 had; 30301 gets a new one
+    refreshed = {"60602": "1111111111111111.gif", "30301": "2222222222222222.gif"}
+
+    def download_map(zip_code, user_agent, transport, map_dir):
+        (tmp_path / refreshed[zip_code]).write_bytes(b"new")
+        return refreshed[zip_code]
+
+    monkeypatch.setattr(ups_ground, "download_map", download_map)
+    errors = download_maps(["60602", "10001", "30301"], "agent", str(tmp_path))
+    assert errors == {}
+    assert sorted(os.listdir(tmp_path)) == [
+        "1111111111111111.gif",
+        "2222222222222222.gif",
+        "fedcba9876543210.gif",
+        "ground_days.csv",
+        "maps.csv",
+        "notes.txt",
+    ]
+
+
+def test_failed_refresh_keeps_the_old_map(tmp_path, monkeypatch):
+    write_maps(
+        str(tmp_path),
+        [
+            {
+                "file_name": "0123456789abcdef.gif",
+                "zip_code": "60602",
+                "downloaded_at": "",
+            }
+        ],
+    )
+    (tmp_path / "0123456789abcdef.gif").write_bytes(b"old")
+
+    def download_map(zip_code, user_agent, transport, map_dir):
+        raise ValueError("Request error")
+
+    monkeypatch.setattr(ups_ground, "download_map", download_map)
+    assert download_maps(["60602"], "agent", str(tmp_path)) == {
+        "60602": "Request error"
+    }
+    assert (tmp_path / "0123456789abcdef.gif").exists()
@@ -0,0 +1,130 @@
+from PIL import Image, ImageDraw
+
+from shipping import ups_ground
+from shipping.ups_ground import (
+    BOXES,
+    COLORS,
+    GROUND_TABLE,
+    classify_map,
+    color_to_days,
+    crop_to_state,
+    get_dominant_color,
+    index_maps,
+    read_map_index,
+    ups_ground_days,
+    write_maps,
+)
+
+
+def synthetic_map() -> tuple[Image.Image, dict]:
+    # Every state box filled with its own transit color and a black outline,
+    # like the printer-friendly maps; later boxes paint over overlaps
+    img = Image.new("RGB", (560, 360), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    expected = {}
+    for i, (state, (x, y, width, height)) in enumerate(BOXES.items()):
+        days = i % len(COLORS) + 1
+        draw.rectangle([x, y, x + width - 1, y + height - 1], fill=COLORS[days])
+        draw.rectangle([x, y, x + width - 1, y + height - 1], outline=(0, 0, 0))
+        expected[state] = days
+    return img, expected
+
+
+def test_matches_the_per_pixel_classifier():
+    img, _ = synthetic_map()
+    result = classify_map(img)
+    assert list(result) == list(BOXES)
+    for state, (days, confidence) in result.items():
+        reference = color_to_days(get_dominant_color(crop_to_state(img, state)))
+        assert days == reference, state
+        assert 0 < confidence <= 1
+
+
+def test_unoverlapped_states_get_their_own_days():
+    img, expected = synthetic_map()
+    result = classify_map(img, ["CA", "FL", "TX"])
+    assert {k: v for k, (v, _) in result.items()} == {
+        k: expected[k] for k in ("CA", "FL", "TX")
+    }
+    assert all(i[1] > 0.5 for i in result.values())
+
+
+def test_anti_aliased_colors_are_matched():
+    x, y, width, height = BOXES["CA"]
+    img = Image.new("RGB", (560, 360), (255, 255, 255))
+    red, green, blue = COLORS[3]
+    ImageDraw.Draw(img).rectangle(
+        [x, y, x + width, y + height], fill=(red + 10, green - 10, blue)
+    )
+    assert classify_map(img, ["CA"]) == {"CA": (3, 1.0)}
+
+
+def test_low_confidence_and_unmatched_states():
+    x, y, width, height = BOXES["CA"]
+    img = Image.new("RGB", (560, 360), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    # Mostly a color outside the palette with a strip of 2-day color
+    draw.rectangle([x, y, x + width, y + height], fill=(10, 250, 250))
+    draw.rectangle([x, y, x + width - 1, y + height // 4 - 1], fill=COLORS[2])
+    days, confidence = classify_map(img, ["CA"])["CA"]
+    assert days == 2
+    assert 0.2 < confidence < 0.3
+    # Nothing but white and black
+    draw.rectangle([x, y, x + width, y + height], fill=(255, 255, 255))
+    draw.line([x, y, x + width, y + height], fill=(0, 0, 0))
+    assert classify_map(img, ["CA"]) == {"CA": (None, 0.0)}
+
+
+def test_index_maps_reclassifies_only_changed_files(tmp_path, monkeypatch):
+    img, expected = synthetic_map()
+    img.save(tmp_path / "a.png")
+    img.save(tmp_path / "b.png")
+    write_maps(
+        str(tmp_path),
+        [
+            {"file_name": "a.png", "zip_code": "60602", "downloaded_at": "0"},
+            {"file_name": "b.png", "zip_code": "10001", "downloaded_at": "0"},
+            {"file_name": "b.png", "zip_code": "10002", "downloaded_at": "0"},
+        ],
+    )
+    classified = []
+    classify_file = ups_ground.classify_file
+    monkeypatch.setattr(
+        ups_ground,
+        "classify_file",
+        lambda path: classified.append(path) or classify_file(path),
+    )
+    stats = index_maps(str(tmp_path), workers=1)
+    assert (stats["maps"], stats["files"], stats["classified"]) == (3, 2, 2)
+    assert index_maps(str(tmp_path), workers=1)["unchanged"] == 2
+    assert len(classified) == 2
+    # Repaint one map: only its hash changes, so only it is classified again
+    x, y, width, height = BOXES["CA"]
+    days = 7 if expected["CA"] != 7 else 6
+    ImageDraw.Draw(img).rectangle(
+        [x, y, x + width - 1, y + height - 1], fill=COLORS[days]
+    )
+    img.save(tmp_path / "b.png")
+    stats = index_maps(str(tmp_path), workers=1)
+    assert (stats["classified"], stats["unchanged"]) == (1, 1)
+    assert classified[2:] == [f"{tmp_path}/b.png"]
+    index = read_map_index(str(tmp_path))
+    assert index["a.png"]["CA"] == str(expected["CA"])
+    assert index["b.png"]["CA"] == str(days)
+    table = (tmp_path / GROUND_TABLE).read_text().splitlines()
+    assert f"10002,CA,{days}" in table
+    assert f"60602,CA,{expected['CA']}" in table
+
+
+def test_ground_days_use_the_table_then_the_map(tmp_path):
+    img, expected = synthetic_map()
+    img.save(tmp_path / "a.png")
+    maps = [{"file_name": "a.png", "zip_code": "60602", "downloaded_at": "0"}]
+    write_maps(str(tmp_path), maps)
+    # No table yet: the state is classified from the origin's map
+    assert ups_ground_days("60602", "CA", str(tmp_path)) == expected["CA"]
+    assert ups_ground_days("10001", "CA", str(tmp_path)) is None
+    index_maps(str(tmp_path), workers=1)
+    # Once indexed, the table answers without opening the map
+    (tmp_path / "a.png").unlink()
+    assert ups_ground_days("60602", "TX", str(tmp_path)) == expected["TX"]
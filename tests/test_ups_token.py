@@ -0,0 +1,86 @@
+import json
+import threading
+import time
+
+import pytest
+
+from shipping import ups
+from shipping.ups import UPSTokenProvider, get_ups_token, write_ups_token
+
+
+def token(expires_in: float, access_token="new") -> dict:
+    return {
+        "access_token": access_token,
+        "issued_at": str(int(time.time() * 1000)),
+        "expires_in": str(int(expires_in)),
+    }
+
+
+@pytest.fixture
+def issued(monkeypatch):
+    calls = []
+
+    def get_token(client_id, client_secret, transport=None):
+        calls.append(client_id)
+        time.sleep(0.05)  # Lets every other thread reach the lock
+        return token(3600)
+
+    monkeypatch.setattr(ups, "get_token", get_token)
+    return calls
+
+
+def test_concurrent_gets_create_one_token(tmp_path, issued):
+    provider = UPSTokenProvider("id", "secret", str(tmp_path / "token"))
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(provider.access_token()))
+        for _ in range(8)
+    ]
+    for i in threads:
+        i.start()
+    for i in threads:
+        i.join(5)
+    assert results == ["new"] * 8
+    assert issued == ["id"]
+    assert get_ups_token(str(tmp_path / "token"))["access_token"] == "new"
+
+
+def test_fresh_token_file_is_reused(tmp_path, issued):
+    path = str(tmp_path / "token")
+    write_ups_token(token(3600, "cached"), path)
+    assert UPSTokenProvider("id", "secret", path).access_token() == "cached"
+    assert issued == []
+
+
+def test_token_inside_the_refresh_margin_is_replaced(tmp_path, issued):
+    path = str(tmp_path / "token")
+    write_ups_token(token(200, "old"), path)
+    provider = UPSTokenProvider("id", "secret", path, refresh_margin=300)
+    assert provider.access_token() == "new"
+    assert issued == ["id"]
+    assert provider.access_token() == "new"  # Now fresh in memory
+    assert issued == ["id"]
+
+
+@pytest.mark.parametrize("content", ["{not json", "[]", '{"access_token": "x"}'])
+def test_corrupt_token_file_is_replaced(tmp_path, issued, content):
+    path = tmp_path / "token"
+    path.write_text(content)
+    assert UPSTokenProvider("id", "secret", str(path)).access_token() == "new"
+    assert json.loads(path.read_text())["access_token"] == "new"
+
+
+def test_failed_token_request_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(ups, "get_token", lambda *args: {"error": "denied"})
+    with pytest.raises(ValueError):
+        UPSTokenProvider("id", "secret", str(tmp_path / "token")).get()
+    assert not (tmp_path / "token").exists()
+
+
+def test_write_is_atomic(tmp_path):
+    path = tmp_path / "token"
+    write_ups_token(token(3600, "first"), str(path))
+    with pytest.raises(TypeError):
+        write_ups_token({"access_token": object()}, str(path))
+    assert get_ups_token(str(path))["access_token"] == "first"
+    assert [i.name for i in tmp_path.iterdir()] == ["token"]
@@ -0,0 +1,72 @@
+import datetime as dt
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from shipping import usps
+from shipping.common import Dimensions, Location, Package, Rate, RateRequest, Weight
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures")
+
+
+def rate_request(packages: int) -> RateRequest:
+    return RateRequest(
+        origination=Location(zip_code="60602"),
+        destination=Location(zip_code="10001"),
+        weight=Weight(1, 0),
+        dimensions=Dimensions(8, 6, 4),
+        ship_date=dt.date(2026, 10, 19),
+        packages=(Package(Weight(1, 0), Dimensions(8, 6, 4)),) * packages,
+    )
+
+
+class FakeTransport:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def get(self, url, headers=None):
+        return SimpleNamespace(status_code=200, content=self.content)
+
+
+def fixture(packages: int) -> bytes:
+    with open(os.path.join(FIXTURES, "usps_rate.xml"), "r") as f:
+        xml = f.read()
+    end = xml.find(f'<Package ID="{packages}">')
+    if end >= 0:
+        xml = xml[:end] + "</RateV4Response>"
+    return xml.encode()
+
+
+def test_multi_package_quotes_include_summed_totals():
+    rates = usps.fetch_rate("user", "", rate_request(2), FakeTransport(fixture(2)))
+    assert [i for i in rates if i.package is None] == [
+        Rate("26.35", "Priority Mail 2-Day", dt.date(2026, 10, 22), "usps")
+    ]
+    assert len([i for i in rates if i.package == 0]) == 5
+
+
+def test_single_package_rates_cover_the_shipment():
+    rates = usps.fetch_rate("user", "", rate_request(1), FakeTransport(fixture(1)))
+    assert len(rates) == 5
+    assert all(i.package is None for i in rates)
+
+
+def test_package_errors_drop_only_that_package():
+    rates = list(usps.iter_rates(fixture(3), rate_request(3)))
+    assert {i.package for i in rates} == {0, 1}
+
+
+def test_errors_raise_when_nothing_is_rated():
+    content = (
+        b'<RateV4Response><Package ID="0"><Error><Description>Please enter the '
+        b"package weight.</Description></Error></Package></RateV4Response>"
+    )
+    with pytest.raises(ValueError, match="package weight"):
+        list(usps.iter_rates(content, rate_request(1)))
+    with pytest.raises(ValueError, match="Authorization failure"):
+        list(
+            usps.iter_rates(
+                b"<Error><Description>Authorization failure</Description></Error>"
+            )
+        )
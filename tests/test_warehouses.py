@@ -0,0 +1,156 @@
+import datetime as dt
+import json
+
+import numpy as np
+from click.testing import CliRunner
+
+from shipping.common import Dimensions, Location, Rate, RateRequest, Weight
+from shipping.ratecard import RateCard
+from shipping.warehouses import Warehouse, WarehouseSelector, transit_days
+from shipping.main import cli
+from shipping.zones import ZoneStore
+
+MONDAY = dt.date(2026, 10, 19)
+WAREHOUSES = [
+    Warehouse("east", Location(zip_code="10001", state="NY")),
+    Warehouse("west", Location(zip_code="90001", state="CA")),
+]
+
+
+def card(carrier: str, prices: dict[str, float]) -> dict:
+    # Flat price per service over zones 1-8 and up to 10 lb
+    return {(carrier, k): np.full((9, 11), v) for k, v in prices.items()}
+
+
+def selector(carriers=("ups", "usps")) -> WarehouseSelector:
+    store = ZoneStore()
+    for carrier in carriers:
+        store.save(carrier, "100", {"100": 1, "900": 8})
+        store.save(carrier, "900", {"100": 8, "900": 1})
+    rate_card = RateCard(
+        {
+            **card("ups", {"03": 8.0, "02": 20.0, "01": 40.0}),
+            **card("usps", {"Priority Mail 2-Day": 12.0, "Unlisted": 1.0}),
+        }
+    )
+    return WarehouseSelector(WAREHOUSES, store, "agent", carriers, card=rate_card)
+
+
+def rate_request(to_zip: str) -> RateRequest:
+    return RateRequest(
+        origination=None,
+        destination=Location(zip_code=to_zip, state="NY"),
+        weight=Weight(1, 0),
+        dimensions=Dimensions(6, 4, 2),
+        ship_date=MONDAY,
+    )
+
+
+def test_transit_days():
+    assert transit_days("ups", "02") == 2
+    assert transit_days("ups", "03") is None  # From the ground maps
+    assert transit_days("usps", "Priority Mail 2-Day") == 2
+    assert transit_days("usps", "USPS Ground Advantage") == 5
+    assert transit_days("usps", "Unknown") is None
+
+
+def test_offline_deadlines_use_every_service_with_known_transit():
+    requests = [rate_request("10005")]
+    # No ground maps: UPS Ground and unknown services have no arrival
+    (cheapest,) = selector().select(requests)
+    assert (cheapest.rate.carrier, cheapest.rate.service) == ("usps", "Unlisted")
+    (two_day,) = selector().select(requests, MONDAY + dt.timedelta(days=2))
+    assert two_day.warehouse.name == "east"
+    assert (two_day.rate.carrier, two_day.rate.service) == (
+        "usps",
+        "Priority Mail 2-Day",
+    )
+    assert two_day.rate.arrival == MONDAY + dt.timedelta(days=2)
+    (next_day,) = selector().select(requests, MONDAY + dt.timedelta(days=1))
+    assert (next_day.rate.carrier, next_day.rate.service) == ("ups", "01")
+
+
+def test_quote_errors_are_kept_per_warehouse():
+    def failing(rate_request):
+        raise ValueError(f"failed from {rate_request.origination.zip_code}")
+
+    # Neither warehouse dominates the other, so both are quoted
+    store = ZoneStore()
+    store.save("ups", "100", {"500": 2})
+    store.save("ups", "900", {"500": 6})
+    store.save("usps", "100", {"500": 6})
+    store.save("usps", "900", {"500": 2})
+    selector_ = WarehouseSelector(WAREHOUSES, store, "agent")
+    raters = {"ups": failing}
+    assert selector_.select([rate_request("50001")], raters=raters) == [None]
+    assert selector_.errors == {
+        "ups:east:0": "failed from 10001",
+        "ups:west:0": "failed from 90001",
+    }
+
+
+def test_live_quotes_skip_the_estimate_without_a_shortlist(monkeypatch):
+    def rater(rate_request):
+        zip_code = rate_request.origination.zip_code
+        return [Rate("5.00" if zip_code == "90001" else "9.00", "03", carrier="ups")]
+
+    selector_ = selector()
+    estimate = selector_.estimate
+    calls = []
+    monkeypatch.setattr(
+        selector_, "estimate", lambda *args: calls.append(1) or estimate(*args)
+    )
+    # Zones make east dominate, so only it is quoted either way
+    (assignment,) = selector_.select([rate_request("10005")], raters={"ups": rater})
+    assert (assignment.warehouse.name, assignment.rate.price) == ("east", "9.00")
+    assert calls == []
+    selector_.select([rate_request("10005")], raters={"ups": rater}, top=1)
+    assert calls == [1]
+
+
+def test_cli_reports_duplicate_order_ids(tmp_path):
+    store = ZoneStore(str(tmp_path / "zones.db"))
+    store.save("usps", "100", {"100": 1, "900": 8})
+    store.save("usps", "900", {"100": 8, "900": 1})
+    (tmp_path / "warehouses.csv").write_text(
+        "name,zip_code,state\neast,10001,NY\nwest,90001,CA\n"
+    )
+    (tmp_path / "card.csv").write_text(
+        "carrier,service,zone,weight,price\n"
+        + "".join(f"usps,Priority Mail,{z},1,{z + 5}\n" for z in range(1, 9))
+    )
+    (tmp_path / "orders.csv").write_text(
+        "id,to_zip,to_state,ounces,size\n"
+        "a,10005,NY,8,6x4x2\n"
+        "b,90005,CA,8,6x4x2\n"
+        "a,90005,CA,8,6x4x2\n"
+        "c,10005,NY,8,bad\n"
+    )
+    result = CliRunner().invoke(
+        cli,
+        [
+            "warehouses",
+            str(tmp_path / "orders.csv"),
+            "-w",
+            str(tmp_path / "warehouses.csv"),
+            "-o",
+            str(tmp_path / "out.jsonl"),
+            "--rate-card",
+            str(tmp_path / "card.csv"),
+            "-c",
+            "usps",
+            "--zone-db",
+            str(tmp_path / "zones.db"),
+            "--map-dir",
+            str(tmp_path),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    rows = [json.loads(i) for i in (tmp_path / "out.jsonl").read_text().splitlines()]
+    assert [(i["id"], i.get("warehouse"), i.get("error")) for i in rows] == [
+        ("a", "east", None),
+        ("b", "west", None),
+        ("a", None, "Duplicate order id"),
+        ("c", None, rows[3]["error"]),
+    ]
+    assert rows[3]["error"]
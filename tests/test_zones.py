@@ -0,0 +1,76 @@
+import datetime as dt
+
+import pytest
+
+from shipping import zones
+from shipping.zones import ZoneStore, open_matrix_writer
+
+CHUNK = {
+    "origin": ["10001", "10001"],
+    "origin3": ["100", "100"],
+    "dest3": ["606", "900"],
+    "ups_zone": [5, 0],
+    "usps_zone": [4, 8],
+}
+
+
+def test_csv_matrix_leaves_unknown_zones_blank(tmp_path):
+    writer = open_matrix_writer(str(tmp_path / "matrix.csv"))
+    writer.write(CHUNK)
+    writer.close()
+    assert (tmp_path / "matrix.csv").read_text().splitlines()[1:] == [
+        "10001,100,606,5,4",
+        "10001,100,900,,8",
+    ]
+
+
+def test_parquet_matrix_marks_unknown_zones_null(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    writer = open_matrix_writer(str(tmp_path / "matrix.parquet"))
+    writer.write(CHUNK)
+    writer.close()
+    table = pq.read_table(tmp_path / "matrix.parquet").to_pydict()
+    assert table["ups_zone"] == [5, None]
+    assert table["usps_zone"] == [4, 8]
+    assert table["dest3"] == ["606", "900"]
+
+
+def test_store_round_trips_through_sqlite(tmp_path):
+    path = str(tmp_path / "zones.db")
+    store = ZoneStore(path)
+    store.save("ups", "100", {"606": 5, "900": 8}, complete=True)
+    store.save("usps", "100", {"606": 4})
+    reopened = ZoneStore(path)
+    assert reopened.is_loaded("ups", "100")
+    assert not reopened.is_loaded("usps", "100")  # Saved a prefix at a time
+    assert reopened.lookup("ups", "10001", ["60602", "90001"]) == [5, 8]
+    assert reopened.lookup("usps", "10001", ["60602"]) == [4]
+    with pytest.raises(ValueError, match="No USPS zone for 90001"):
+        reopened.lookup("usps", "10001", ["60602", "90001"])
+    # A complete save replaces every zone for the origin
+    reopened.save("ups", "100", {"606": 6}, complete=True)
+    assert ZoneStore(path).table("ups", "100")[[606, 900]].tolist() == [6, 0]
+
+
+def test_store_expires_zones_by_fetch_date(tmp_path, monkeypatch):
+    path = str(tmp_path / "zones.db")
+    store = ZoneStore(path, max_age_days=30)
+    store.save("ups", "100", {"606": 5}, complete=True)
+    fetched = (dt.date.today() - dt.timedelta(days=31)).isoformat()
+    with store.conn:
+        store.conn.execute("UPDATE zones SET effective = ?", (fetched,))
+        store.conn.execute("UPDATE origins SET effective = ?", (fetched,))
+    assert ZoneStore(path, max_age_days=60).is_loaded("ups", "100")
+    expired = ZoneStore(path, max_age_days=30)
+    assert not expired.is_loaded("ups", "100")
+    assert not expired.table("ups", "100").any()
+    sheets = []
+    monkeypatch.setattr(
+        zones,
+        "get_ups_zone_df",
+        lambda origin, user_agent, transport: sheets.append(origin) or "sheet",
+    )
+    monkeypatch.setattr(zones, "get_ups_zone_map", lambda sheet: {"606": 7})
+    assert expired.ups_zones("10001", ["60602"], "agent") == [7]
+    assert expired.ups_zones("10001", ["60602"], "agent") == [7]
+    assert sheets == ["10001"]